@@ -0,0 +1,80 @@
+"""
+Bytes on the wire against client CPU for each response compression mode.
+
+    python benchmarks/bench_compression.py [--size 10000] [--requests 20]
+
+The fake server runs in its own process and serves pre-compressed bodies,
+so CPU time is the client's alone: receiving, decompressing and decoding.
+Transfer times are estimated for the given link bandwidths, as loopback
+hides the cost of moving bytes between regions.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from nomad_alt import base, std  # noqa: E402
+
+from server import FakeNomad  # noqa: E402
+
+
+class WireBytes(base.Hook):
+    def __init__(self):
+        self.bytes_in = 0
+
+    def after(self, event):
+        self.bytes_in += event.bytes_in
+
+
+def run(port, path, compression, stream, requests):
+    nomad = std.Nomad(port=port, compression=compression)
+    wire = WireBytes()
+    nomad.http.add_hook(wire)
+    endpoint = getattr(nomad, path.rsplit('/', 1)[1])
+    wall, cpu = time.time(), time.process_time()
+    for _ in range(requests):
+        if stream:
+            for _ in endpoint.list(stream=True):
+                pass
+        else:
+            endpoint.list()
+    return {
+        'wall': (time.time() - wall) / requests,
+        'cpu': (time.process_time() - cpu) / requests,
+        'bytes': wire.bytes_in // requests,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--size', type=int, default=10000,
+                        help='objects per list response')
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--mbits', type=float, nargs='+', default=[100, 1000],
+                        help='link bandwidths to estimate transfer time for')
+    args = parser.parse_args()
+
+    process, port = FakeNomad.spawn(size=args.size)
+    try:
+        print('%-16s %-6s %-7s %12s %9s %9s %s' % (
+            'path', 'mode', 'decode', 'bytes/req', 'cpu ms', 'wall ms',
+            ' '.join('%6dMb ms' % m for m in args.mbits)))
+        for path in sorted(FakeNomad.PATHS):
+            for compression in (None, 'gzip'):
+                for stream in (False, True):
+                    r = run(port, path, compression, stream, args.requests)
+                    transfer = ' '.join(
+                        '%11.1f' % (r['bytes'] * 8 / (m * 1e6) * 1000)
+                        for m in args.mbits)
+                    print('%-16s %-6s %-7s %12d %9.1f %9.1f %s' % (
+                        path, compression or 'none',
+                        'stream' if stream else 'body', r['bytes'],
+                        r['cpu'] * 1000, r['wall'] * 1000, transfer))
+    finally:
+        process.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Time taken by import nomad_alt, and by the modules it imports.
+
+    python benchmarks/bench_import.py [--repeat 5] [--top 10]
+
+Each import runs in a fresh interpreter with -X importtime (Python 3.7+),
+bytecode caches warm from a first run. The heaviest modules are listed by
+their cumulative time in the fastest run.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def importtime():
+    """Returns {module: cumulative microseconds} of one import nomad_alt,
+    for it and the modules it imports, leaving out the interpreter's own
+    start up."""
+    output = subprocess.check_output(
+        [sys.executable, '-X', 'importtime', '-c', 'import nomad_alt'],
+        stderr=subprocess.STDOUT, universal_newlines=True, cwd=ROOT)
+    # import time: self [us] | cumulative | imported package, each module
+    # listed after those it imports, indented by depth
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line.split('|')
+        depth = len(module) - len(module.lstrip())
+        entries.append((depth, module.strip(), int(cumulative)))
+    times = {}
+    top = None
+    for depth, module, cumulative in reversed(entries):
+        if times and depth <= top:
+            break
+        if not times:
+            if module != 'nomad_alt':
+                continue
+            top = depth
+        times[module] = max(times.get(module, 0), cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10,
+                        help='heaviest modules to list')
+    args = parser.parse_args()
+
+    importtime()
+    runs = [importtime() for _ in range(args.repeat)]
+    best = min(runs, key=lambda times: times['nomad_alt'])
+    print('import nomad_alt: %.1f ms (best of %d), %d modules' % (
+        best['nomad_alt'] / 1000.0, args.repeat, len(best)))
+    heaviest = sorted(best.items(), key=lambda item: -item[1])
+    for module, cumulative in heaviest[:args.top]:
+        print('%10.1f ms  %s' % (cumulative / 1000.0, module))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Decode and encode speed of each installed JSON backend.
+
+    python benchmarks/bench_json.py [--size 10000] [--requests 20]
+
+Bodies are decoded straight from bytes, as the client does: the body of
+/v1/allocations and a batch of job specifications, which are also encoded
+as for registration. The projected column decodes only the fields a typical
+caller of allocations.list(fields=...) asks for. The end to end column is the client CPU per
+/v1/allocations request against a fake server in its own process.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from nomad_alt import codec, std  # noqa: E402
+from nomad_alt.projection import Projection  # noqa: E402
+
+from server import FakeNomad, allocation_stub, job_spec  # noqa: E402
+
+FIELDS = ['ID', 'NodeID', 'ClientStatus', 'ModifyIndex', 'TaskStates.*.State']
+
+
+def best(function, repeat):
+    """Returns the fastest of *repeat* runs of *function*, in seconds."""
+    times = []
+    for _ in range(repeat):
+        started = time.process_time()
+        function()
+        times.append(time.process_time() - started)
+    return min(times)
+
+
+def end_to_end(port, name, requests):
+    nomad = std.Nomad(port=port, codec=name, compression=None)
+    cpu = time.process_time()
+    for _ in range(requests):
+        nomad.allocations.list()
+    return (time.process_time() - cpu) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--size', type=int, default=10000,
+                        help='allocations per list response')
+    parser.add_argument('--jobs', type=int, default=500,
+                        help='job specifications to encode and decode')
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    allocations = json.dumps(
+        [allocation_stub(i) for i in range(args.size)]).encode('utf-8')
+    jobs = [job_spec(i) for i in range(args.jobs)]
+    encoded = [json.dumps(job).encode('utf-8') for job in jobs]
+    job_bytes = sum(len(body) for body in encoded)
+
+    process, port = FakeNomad.spawn(size=args.size)
+    try:
+        projection = Projection(FIELDS)
+        print('%-8s %14s %14s %14s %14s %14s' % (
+            'backend', 'allocs MB/s', 'projected MB/s', 'job dec MB/s',
+            'job enc MB/s', 'e2e cpu ms'))
+        for name in codec.available():
+            c = codec.json_codec(name)
+            decode = best(lambda: c.loads(allocations), args.repeat)
+            projected = best(
+                lambda: projection.loads(allocations, c), args.repeat)
+            job_decode = best(
+                lambda: [c.loads(body) for body in encoded], args.repeat)
+            job_encode = best(
+                lambda: [c.dumps(job) for job in jobs], args.repeat)
+            print('%-8s %14.1f %14.1f %14.1f %14.1f %14.2f' % (
+                name, len(allocations) / decode / 1e6,
+                len(allocations) / projected / 1e6,
+                job_bytes / job_decode / 1e6, job_bytes / job_encode / 1e6,
+                end_to_end(port, name, args.requests) * 1000))
+    finally:
+        process.terminate()
+
+
+if __name__ == '__main__':
+    main()
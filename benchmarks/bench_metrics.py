@@ -0,0 +1,71 @@
+"""
+Memory held, and time taken, to decode a scrape of /v1/metrics as the dicts
+of the JSON format and as the columnar Frames of nomad_alt.telemetry.
+
+    python benchmarks/bench_metrics.py [--size 20000]
+
+*size* is the number of series, each a gauge labelled as Nomad labels the
+allocation metrics of a client. The second scrape of each format reuses the
+Parser of the first, as a Sampler does. Times are taken with tracemalloc
+tracing, so are slower than they otherwise would be.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from nomad_alt.codec import json_codec  # noqa: E402
+from nomad_alt.telemetry import Parser  # noqa: E402
+
+from bench_models import measure  # noqa: E402
+
+
+def labels(i):
+    return {'alloc_id': '%08x-0000-4000-8000-%012x' % (i // 3, i // 3),
+            'host': 'client-%d' % (i % 50), 'task': 'task-%d' % (i % 3),
+            'namespace': 'default', 'job': 'job-%d' % (i % 200)}
+
+
+def scrape(size):
+    gauges = [{'Name': 'nomad.client.allocs.cpu.total_ticks', 'Value': i * 1.5,
+               'Labels': labels(i)} for i in range(size)]
+    body = json.dumps({'Gauges': gauges, 'Counters': [], 'Samples': []})
+    lines = ['# TYPE nomad_client_allocs_cpu_total_ticks gauge']
+    for gauge in gauges:
+        lines.append('nomad_client_allocs_cpu_total_ticks{%s} %s' % (
+            ','.join('%s="%s"' % pair for pair in sorted(
+                gauge['Labels'].items())), gauge['Value']))
+    return body.encode('utf-8'), '\n'.join(lines).encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--size', type=int, default=20000,
+                        help='series per scrape')
+    args = parser.parse_args()
+
+    codec = json_codec()
+    body, text = scrape(args.size)
+    print('codec %s, %d series' % (codec.name, args.size))
+    print('%-24s %12s %12s %12s' % ('as', 'MB', 'bytes/series', 'ms'))
+
+    def report(name, build):
+        result, held, elapsed = measure(build)
+        print('%-24s %12.1f %12d %12.0f' % (
+            name, held / 1e6, held // args.size, elapsed * 1000))
+        return result
+
+    report('json dicts', lambda: codec.loads(body))
+    frames = Parser()
+    report('json frame', lambda: frames.json(codec.loads(body)))
+    report('json frame, again', lambda: frames.json(codec.loads(body)))
+    frames = Parser()
+    first = report('prometheus frame', lambda: frames.prometheus(text))
+    report('prometheus frame, again', lambda: frames.prometheus(text))
+    del first
+
+
+if __name__ == '__main__':
+    main()
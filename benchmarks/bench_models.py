@@ -0,0 +1,71 @@
+"""
+Memory held, and time taken to build, a list response as dicts and as the
+compact models of nomad_alt.models.
+
+    python benchmarks/bench_models.py [--size 100000]
+
+Both are built from the same decoded body, as list(model=True) does, and
+the memory is what is still allocated once the body and the decoded dicts
+no longer are. Reading a field the model keeps encoded (here TaskStates)
+expands it, after which that object is about as large as its dict.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from nomad_alt import models  # noqa: E402
+from nomad_alt.codec import json_codec  # noqa: E402
+
+from server import allocation_stub, evaluation  # noqa: E402
+
+KINDS = [
+    ('allocations', allocation_stub, models.AllocationStub),
+    ('evaluations', evaluation, models.Evaluation),
+]
+
+
+def measure(build):
+    """Returns the result of *build*, the bytes it holds, and the seconds it
+    took."""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, held, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--size', type=int, default=100000,
+                        help='objects per list')
+    args = parser.parse_args()
+
+    codec = json_codec()
+    print('codec %s, %d objects' % (codec.name, args.size))
+    print('%-12s %-6s %12s %12s %12s' % (
+        'kind', 'as', 'MB', 'bytes/obj', 'build ms'))
+    for kind, make, klass in KINDS:
+        body = json.dumps([make(i) for i in range(args.size)]).encode('utf-8')
+        dicts, held, elapsed = measure(lambda: codec.loads(body))
+        print('%-12s %-6s %12.1f %12d %12.0f' % (
+            kind, 'dict', held / 1e6, held // args.size, elapsed * 1000))
+        del dicts
+        objects, held, elapsed = measure(
+            lambda: klass.from_list(codec.loads(body)))
+        print('%-12s %-6s %12.1f %12d %12.0f' % (
+            kind, 'model', held / 1e6, held // args.size, elapsed * 1000))
+        del objects
+
+
+if __name__ == '__main__':
+    main()
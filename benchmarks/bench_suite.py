@@ -0,0 +1,298 @@
+"""
+Requests per second, latency percentiles, client CPU per request and peak
+memory of each scenario, for the std and tornado transports, against a fake
+Nomad in its own process. Results are written as JSON to be compared between
+commits.
+
+    python benchmarks/bench_suite.py [--size 100000] [--output after.json]
+    python benchmarks/bench_suite.py --compare before.json after.json
+
+Each scenario and transport runs in a fresh child process, so that its peak
+memory (the maximum resident set size) and CPU time are its own: the fake
+server's work is done in another process. The cb_json scenario decodes the
+allocation list with CB.json alone, without any transport. Latency is the
+wall time of each call, measured with *concurrency* calls in flight.
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from nomad_alt import base, codec  # noqa: E402
+
+from server import FakeNomad, allocation_stub, job_spec  # noqa: E402
+
+TRANSPORTS = ('std', 'tornado')
+
+# the server's index, at which blocking queries block
+INDEX = 1000
+
+JOB = job_spec(1, groups=10)
+
+
+def allocations(nomad):
+    return nomad.allocations.list()
+
+
+def job_read(nomad):
+    return nomad.jobs.read('service-000')
+
+
+def job_register(nomad):
+    return nomad.jobs.create(JOB)
+
+
+def blocking(nomad):
+    return nomad.evaluations.list(index=INDEX, wait='5s')
+
+
+# scenario: (call, requests made by default, transports it runs on)
+SCENARIOS = {
+    'allocations': (allocations, 5, TRANSPORTS),
+    'job_read': (job_read, 200, TRANSPORTS),
+    'job_register': (job_register, 200, TRANSPORTS),
+    'blocking': (blocking, 20, TRANSPORTS),
+    'cb_json': (None, 5, ('none',)),
+}
+
+# metric: (its name in a comparison, whether more is better)
+METRICS = [
+    ('rps', 'req/s', True),
+    ('p50_ms', 'p50 ms', False),
+    ('p99_ms', 'p99 ms', False),
+    ('cpu_ms', 'cpu ms/req', False),
+    ('peak_mb', 'peak MB', False),
+]
+
+
+def percentile(ordered, q):
+    """Returns the *q* quantile of the sorted *ordered*, interpolating
+    between the closest ranks."""
+    position = q * (len(ordered) - 1)
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def peak_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes, but bytes on macOS
+    return peak / (1e6 if sys.platform == 'darwin' else 1e3)
+
+
+def run_std(call, port, requests, concurrency):
+    from nomad_alt import std
+    nomad = std.Nomad(port=port)
+    call(nomad)
+    latencies = []
+
+    def timed(_):
+        started = time.perf_counter()
+        call(nomad)
+        latencies.append(time.perf_counter() - started)
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    if concurrency == 1:
+        for i in range(requests):
+            timed(i)
+    else:
+        from concurrent import futures
+        with futures.ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(timed, range(requests)))
+    return latencies, time.perf_counter() - wall, time.process_time() - cpu
+
+
+def run_tornado(call, port, requests, concurrency):
+    from tornado import gen, ioloop
+    from nomad_alt import tornado
+    nomad = tornado.Nomad(port=port)
+    latencies = []
+    remaining = [requests]
+
+    @gen.coroutine
+    def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            started = time.perf_counter()
+            yield call(nomad)
+            latencies.append(time.perf_counter() - started)
+
+    @gen.coroutine
+    def run():
+        yield call(nomad)
+        wall, cpu = time.perf_counter(), time.process_time()
+        yield [worker() for _ in range(concurrency)]
+        raise gen.Return(
+            (time.perf_counter() - wall, time.process_time() - cpu))
+
+    wall, cpu = ioloop.IOLoop.current().run_sync(run)
+    return latencies, wall, cpu
+
+
+def run_cb_json(size, requests):
+    body = json.dumps(
+        [allocation_stub(i) for i in range(size)]).encode('utf-8')
+    response = base.Response(200, {}, body, codec.json_codec())
+    callback = base.CB.json()
+    latencies = []
+    wall, cpu = time.perf_counter(), time.process_time()
+    for _ in range(requests):
+        started = time.perf_counter()
+        callback(response)
+        latencies.append(time.perf_counter() - started)
+    return latencies, time.perf_counter() - wall, time.process_time() - cpu
+
+
+def measure(pipe, scenario, transport, port, size, requests, concurrency):
+    """Runs in a child process, sending back the result of one
+    scenario."""
+    call = SCENARIOS[scenario][0]
+    if transport == 'none':
+        latencies, wall, cpu = run_cb_json(size, requests)
+    elif transport == 'std':
+        latencies, wall, cpu = run_std(call, port, requests, concurrency)
+    else:
+        latencies, wall, cpu = run_tornado(call, port, requests, concurrency)
+    latencies.sort()
+    pipe.send({
+        'scenario': scenario,
+        'transport': transport,
+        'requests': requests,
+        'concurrency': concurrency,
+        'rps': requests / wall,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p90_ms': percentile(latencies, 0.9) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': latencies[-1] * 1000,
+        'cpu_ms': cpu / requests * 1000,
+        'peak_mb': peak_mb(),
+    })
+
+
+def run(scenario, transport, port, size, requests, concurrency):
+    spawn = multiprocessing.get_context('spawn')
+    parent, child = spawn.Pipe()
+    process = spawn.Process(target=measure, args=(
+        child, scenario, transport, port, size, requests, concurrency))
+    process.start()
+    result = parent.recv()
+    process.join()
+    return result
+
+
+def commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'describe', '--always', '--dirty'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def header():
+    print('%-14s %-9s %10s %10s %10s %10s %12s %10s' % (
+        'scenario', 'transport', 'req/s', 'p50 ms', 'p90 ms', 'p99 ms',
+        'cpu ms/req', 'peak MB'))
+
+
+def row(r):
+    print('%-14s %-9s %10.1f %10.2f %10.2f %10.2f %12.2f %10.1f' % (
+        r['scenario'], r['transport'], r['rps'], r['p50_ms'],
+        r['p90_ms'], r['p99_ms'], r['cpu_ms'], r['peak_mb']))
+
+
+def compare(before, after):
+    """Prints the change of each metric from the results *before* to those
+    *after*, better or worse."""
+    with open(before) as f:
+        before = json.load(f)
+    with open(after) as f:
+        after = json.load(f)
+    print('%s -> %s' % (before['meta'].get('commit'),
+                        after['meta'].get('commit')))
+    old = dict(((r['scenario'], r['transport']), r)
+               for r in before['results'])
+    print('%-14s %-9s %-11s %12s %12s %9s' % (
+        'scenario', 'transport', 'metric', 'before', 'after', 'change'))
+    for r in after['results']:
+        key = (r['scenario'], r['transport'])
+        if key not in old:
+            continue
+        for metric, name, more_is_better in METRICS:
+            a, b = old[key][metric], r[metric]
+            change = (b - a) / a * 100 if a else 0.0
+            better = change > 0 if more_is_better else change < 0
+            print('%-14s %-9s %-11s %12.2f %12.2f %+8.1f%% %s' % (
+                key[0], key[1], name, a, b, change,
+                '' if abs(change) < 5 else 'better' if better else 'worse'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--size', type=int, default=100000,
+                        help='allocations per list response')
+    parser.add_argument('--job-groups', type=int, default=20,
+                        help='task groups of the job read')
+    parser.add_argument('--block', type=float, default=0.05,
+                        help='seconds a blocking query blocks for')
+    parser.add_argument('--requests', type=int, default=None,
+                        help='requests per scenario, instead of its own')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--scenario', action='append',
+                        choices=sorted(SCENARIOS),
+                        help='scenarios to run, by default all of them')
+    parser.add_argument('--transport', action='append', choices=TRANSPORTS,
+                        help='transports to run, by default all of them')
+    parser.add_argument('--output', help='file to write the results to')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='compare two results files and exit')
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    process, port = FakeNomad.spawn(
+        size=args.size, sizes={'/v1/evaluations': 10},
+        job_groups=args.job_groups, block=args.block)
+    results = []
+    header()
+    try:
+        for scenario in args.scenario or sorted(SCENARIOS):
+            _, requests, transports = SCENARIOS[scenario]
+            for transport in transports:
+                if transport != 'none' and args.transport and \
+                        transport not in args.transport:
+                    continue
+                results.append(run(
+                    scenario, transport, port, args.size,
+                    args.requests or requests, args.concurrency))
+                row(results[-1])
+    finally:
+        process.terminate()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'commit': commit(),
+                    'time': datetime.datetime.utcnow().isoformat() + 'Z',
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'codec': codec.json_codec().name,
+                    'args': dict(vars(args), compare=None),
+                },
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""
+A stand-in for the Nomad HTTP API serving synthetic, realistically shaped
+payloads, for benchmarking the client without a cluster.
+
+Run it in-process with FakeNomad().start(), or in a separate process with
+FakeNomad.spawn() so that the client's CPU time can be measured on its own.
+"""
+import gzip
+import json
+import multiprocessing
+import threading
+import time
+
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib.parse import parse_qs, urlparse
+
+
+def allocation_stub(i, nodes=500, jobs=200):
+    job = 'service-%03d' % (i % jobs)
+    return {
+        'ID': '%08x-62bc-7a3a-4c1e-%012x' % (i, i),
+        'EvalID': '%08x-1f6a-3c2a-8d5e-%012x' % (i * 7, i),
+        'Name': '%s.web[%d]' % (job, i % 10),
+        'Namespace': 'default',
+        'NodeID': '%08x-0a5c-4b7e-9f1d-3e2b1c0d9a8f' % (i % nodes),
+        'NodeName': 'node-%04d' % (i % nodes),
+        'JobID': job,
+        'JobType': 'service',
+        'JobVersion': i % 5,
+        'TaskGroup': 'web',
+        'DesiredStatus': 'run',
+        'DesiredDescription': '',
+        'ClientStatus': 'running' if i % 10 else 'complete',
+        'ClientDescription': 'Tasks are running',
+        'DeploymentStatus': {'Healthy': True, 'Canary': False,
+                             'Timestamp': '2019-05-01T10:00:00.000000Z',
+                             'ModifyIndex': 1000 + i},
+        'FollowupEvalID': '',
+        'RescheduleTracker': None,
+        'PreemptedAllocations': None,
+        'PreemptedByAllocation': '',
+        'TaskStates': {
+            'server': {
+                'State': 'running',
+                'Failed': False,
+                'Restarts': i % 3,
+                'LastRestart': '0001-01-01T00:00:00Z',
+                'StartedAt': '2019-05-01T10:00:00.000000Z',
+                'FinishedAt': '0001-01-01T00:00:00Z',
+                'Events': [
+                    {'Type': 'Received', 'Time': 1556704800000000000 + i,
+                     'DisplayMessage': 'Task received by client'},
+                    {'Type': 'Task Setup', 'Time': 1556704800100000000 + i,
+                     'DisplayMessage': 'Building Task Directory'},
+                    {'Type': 'Started', 'Time': 1556704801000000000 + i,
+                     'DisplayMessage': 'Task started by client'},
+                ],
+            },
+        },
+        'CreateIndex': 1000 + i,
+        'ModifyIndex': 1000 + i,
+        'AllocModifyIndex': 1000 + i,
+        'CreateTime': 1556704800000000000 + i,
+        'ModifyTime': 1556704801000000000 + i,
+    }
+
+
+def evaluation(i, jobs=200):
+    return {
+        'ID': '%08x-1f6a-3c2a-8d5e-%012x' % (i, i),
+        'Namespace': 'default',
+        'Priority': 50,
+        'Type': 'service',
+        'TriggeredBy': 'job-register',
+        'JobID': 'service-%03d' % (i % jobs),
+        'JobModifyIndex': 900 + i,
+        'Status': 'complete',
+        'StatusDescription': '',
+        'NextEval': '',
+        'PreviousEval': '',
+        'BlockedEval': '',
+        'QueuedAllocations': {'web': 0},
+        'SnapshotIndex': 1000 + i,
+        'CreateIndex': 1000 + i,
+        'ModifyIndex': 1001 + i,
+    }
+
+
+def job_spec(i, groups=3, tasks=2):
+    """A job specification as submitted to /v1/jobs."""
+    job = 'service-%03d' % i
+    return {'Job': {
+        'ID': job,
+        'Name': job,
+        'Type': 'service',
+        'Priority': 50,
+        'Datacenters': ['dc1', 'dc2'],
+        'Meta': {'team': 'team-%d' % (i % 7), 'owner': 'ops'},
+        'Update': {'MaxParallel': 2, 'MinHealthyTime': 10000000000,
+                   'HealthyDeadline': 300000000000, 'AutoRevert': True},
+        'TaskGroups': [{
+            'Name': 'group-%d' % g,
+            'Count': 3,
+            'RestartPolicy': {'Attempts': 2, 'Interval': 1800000000000,
+                              'Delay': 15000000000, 'Mode': 'fail'},
+            'EphemeralDisk': {'SizeMB': 300},
+            'Tasks': [{
+                'Name': 'task-%d' % t,
+                'Driver': 'docker',
+                'Config': {
+                    'image': 'registry.local/%s:%d' % (job, i),
+                    'args': ['--port', '${NOMAD_PORT_http}', '--verbose'],
+                    'port_map': [{'http': 8080}],
+                },
+                'Env': dict(('VAR_%d' % v, 'value-%d' % v) for v in range(8)),
+                'Services': [{
+                    'Name': '%s-%d-%d' % (job, g, t),
+                    'PortLabel': 'http',
+                    'Tags': ['urlprefix-/%s' % job, 'v%d' % i],
+                    'Checks': [{'Type': 'http', 'Path': '/health',
+                                'Interval': 10000000000,
+                                'Timeout': 2000000000}],
+                }],
+                'Resources': {
+                    'CPU': 500, 'MemoryMB': 256,
+                    'Networks': [{'MBits': 10,
+                                  'DynamicPorts': [{'Label': 'http'}]}],
+                },
+                'LogConfig': {'MaxFiles': 10, 'MaxFileSizeMB': 10},
+            } for t in range(tasks)],
+        } for g in range(groups)],
+    }}
+
+
+PAYLOADS = {
+    '/v1/allocations': allocation_stub,
+    '/v1/evaluations': evaluation,
+}
+
+# every /v1/job/<id> is served this specification
+JOB = '/v1/job/'
+
+
+def seconds(wait):
+    """The seconds of a blocking query's wait parameter, e.g. 5000ms."""
+    if not wait:
+        return 300.0
+    if wait.endswith('ms'):
+        return float(wait[:-2]) / 1000
+    if wait.endswith('s'):
+        return float(wait[:-1])
+    return float(wait)
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, with Nagle's algorithm the
+    # body of a small response waits on the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = JOB if url.path.startswith(JOB) else url.path
+        query = parse_qs(url.query)
+        if 'index' in query and self.server.block and \
+                int(query['index'][0]) >= self.server.index:
+            # nothing changes until the next update, every *block* seconds
+            time.sleep(min(self.server.block,
+                           seconds(query.get('wait', [''])[0])))
+        if path not in self.server.bodies:
+            self.respond(404, b'not found')
+            return
+        gzipped = 'gzip' in self.headers.get('Accept-Encoding', '')
+        if gzipped:
+            self.respond(200, self.server.gzipped[path], 'gzip')
+        else:
+            self.respond(200, self.server.bodies[path])
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        self.server.bytes_in += length
+        path = urlparse(self.path).path
+        if path != '/v1/jobs' and not path.startswith(JOB):
+            self.respond(404, b'not found')
+            return
+        self.server.index += 1
+        self.respond(200, json.dumps({
+            'EvalID': '%08x-1f6a-3c2a-8d5e-000000000000' % self.server.index,
+            'EvalCreateIndex': self.server.index,
+            'JobModifyIndex': self.server.index,
+            'Warnings': '',
+            'Index': self.server.index,
+        }).encode('utf-8'))
+
+    do_PUT = do_POST
+
+    def respond(self, code, body, encoding=None):
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('X-Nomad-Index', str(self.server.index))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.bytes_out += len(body)
+
+
+class _Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class FakeNomad(object):
+    """
+    Serves each path in PAYLOADS as a list of *size* synthetic objects (or
+    the number *sizes* gives for the path), and every job as a specification
+    of *job_groups* task groups, gzipped when the client asks for it. Bodies
+    are rendered and compressed once up front, so the server's own cost
+    stays out of the measurements.
+
+    A blocking query at the current index waits *block* seconds (or its own
+    wait, if shorter) before it is answered, as if an update arrived that
+    often, and returns at once without. Jobs POSTed to /v1/jobs or
+    /v1/job/<id> are read, counted in bytes_in and acknowledged.
+    """
+
+    PATHS = sorted(PAYLOADS)
+
+    def __init__(self, size=1000, port=0, compresslevel=6, sizes=None,
+                 job_groups=3, block=0.0):
+        self.server = _Server(('127.0.0.1', port), Handler)
+        self.server.index = 1000
+        self.server.block = block
+        self.server.bytes_in = 0
+        self.server.bytes_out = 0
+        self.server.bodies = {}
+        self.server.gzipped = {}
+        sizes = sizes or {}
+        for path, make in PAYLOADS.items():
+            body = json.dumps([make(i) for i in range(sizes.get(path, size))])
+            self.server.bodies[path] = body.encode('utf-8')
+        self.server.bodies[JOB] = json.dumps(
+            job_spec(0, groups=job_groups)['Job']).encode('utf-8')
+        for path, body in self.server.bodies.items():
+            self.server.gzipped[path] = gzip.compress(body, compresslevel)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @classmethod
+    def spawn(klass, **kwargs):
+        """
+        Runs a FakeNomad in a child process, returning the process and the
+        port it listens on.
+        """
+        parent, child = multiprocessing.Pipe()
+        process = multiprocessing.Process(
+            target=klass._serve, args=(child, kwargs))
+        process.daemon = True
+        process.start()
+        return process, parent.recv()
+
+    @classmethod
+    def _serve(klass, pipe, kwargs):
+        fake = klass(**kwargs)
+        pipe.send(fake.port)
+        fake.server.serve_forever()
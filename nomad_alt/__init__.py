@@ -1,8 +1,24 @@
+import sys
+
 from nomad_alt.exceptions import NomadException, ACLDisabled, ACLPermissionDenied, NotFound, BadRequest
 
-from nomad_alt.nomad_version import __version__
+try:
+    from nomad_alt.nomad_version import __version__
+except ImportError:
+    # the version module is generated when a release is built
+    __version__ = '0.0.0'
 
 from nomad_alt.base import Check
-from nomad_alt.std import Nomad
-
 
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        # the blocking client, and with it requests, is only imported once
+        # asked for
+        if name == 'Nomad':
+            from nomad_alt.std import Nomad
+            globals()['Nomad'] = Nomad
+            return Nomad
+        raise AttributeError(
+            'module %r has no attribute %r' % (__name__, name))
+else:
+    from nomad_alt.std import Nomad
@@ -0,0 +1,381 @@
+from __future__ import absolute_import
+import asyncio
+import logging
+import ssl
+import warnings
+from timeit import default_timer
+
+import aiohttp
+
+import nomad_alt.exceptions
+from nomad_alt import base
+from nomad_alt.exceptions import NomadException
+from nomad_alt.servers import resuming
+
+__all__ = ['Nomad']
+
+
+class HTTPClient(base.HTTPClient):
+    """
+    Asyncio adapter for python-nomad-alt using the aiohttp library.
+
+    Requests share one aiohttp session whose connector keeps connections
+    alive between requests. The pool is bounded to *limit* connections in
+    total and *limit_per_host* connections to any one Nomad agent; requests
+    beyond that wait for a connection to be released rather than opening
+    new sockets.
+
+    A request may take up to *request_timeout* seconds, or, for a blocking
+    query, as long as its wait allows (see timeout).
+    """
+
+    logger = logging.getLogger('nomad_alt.aio.HTTPClient')
+
+    def __init__(self, *args, limit=100, limit_per_host=0,
+                 keepalive_timeout=15, request_timeout=60, **kwargs):
+        super(HTTPClient, self).__init__(*args, **kwargs)
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.request_timeout = request_timeout
+        self._session = None
+
+    def _ssl(self):
+        if self.scheme != 'https':
+            return None
+        if not self.verify:
+            return False
+        context = ssl.create_default_context(cafile=self.ca)
+        if self.cert is not None:
+            context.load_cert_chain(self.cert, self.key)
+        return context
+
+    @property
+    def session(self):
+        # the session is created on first use so that it is bound to the
+        # event loop the requests are actually made from
+        if self._session is None:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ssl=self._ssl())
+            headers = {'Accept-Encoding': self.accept_encoding}
+            if self.token is not None:
+                headers['X-Nomad-Token'] = self.token
+            self._session = aiohttp.ClientSession(
+                connector=connector, headers=headers)
+        return self._session
+
+    async def _send(self, method, path, params, **kwargs):
+        """
+        Sends the request to the healthiest server, or for a stale read any
+        server, retrying and failing over to other servers as self.retry
+        allows. Returns the response, whose body has yet to be read.
+        """
+        params, stale = self.query(method, params)
+        timed = not params or 'index' not in params
+        attempts = self.attempts(method, stale)
+        last = len(attempts) - 1
+        for i, (server, delay) in enumerate(attempts):
+            if delay:
+                await asyncio.sleep(delay)
+            started = default_timer()
+            try:
+                resp = await self.session.request(
+                    method, self.uri(path, params, server), **kwargs)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if isinstance(e, aiohttp.ClientConnectionError):
+                    self.servers.failed(server)
+                sent = not isinstance(e, aiohttp.ClientConnectorError)
+                if i == last or not self.retryable(method, sent):
+                    raise
+                continue
+            if (i < last and resp.status >= 500 and
+                    self.retryable(method, status=resp.status)):
+                self.servers.failed(server)
+                resp.release()
+                continue
+            self.servers.succeeded(
+                server, default_timer() - started if timed else None)
+            return resp
+
+    async def _request(self, callback, method, path, params=None, data=None):
+        timeout = aiohttp.ClientTimeout(
+            total=self.timeout(params, default=self.request_timeout))
+        hooked = bool(self.hooks)
+        if hooked:
+            request = self.before_request(method, path, data)
+            sent = default_timer()
+        try:
+            resp = await self._send(
+                method, path, params, data=data, timeout=timeout)
+            async with resp:
+                if hooked:
+                    first_byte = default_timer() - sent
+                raw = await resp.read()
+        except asyncio.TimeoutError:
+            raise nomad_alt.exceptions.Timeout
+        response = base.Response(resp.status, resp.headers, raw, self.codec)
+        if not hooked:
+            return callback(response)
+        return self.after_request(
+            request, callback, response, len(raw), {'first_byte': first_byte})
+
+    async def stream(self, callback, path, params=None, read_timeout=None,
+                     chunk_size=64 * 1024):
+        """
+        Async generator of the items decoded from the response as they are
+        read off the socket, up to *chunk_size* bytes at a time.
+        """
+        # a stream lasts as long as it is followed, even one with an index,
+        # only its reads are timed
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=read_timeout)
+        hooked = bool(self.hooks)
+        if hooked:
+            request = self.before_request('GET', path)
+            sent = default_timer()
+            timings = {'decode': 0.0}
+            bytes_in = 0
+        status = None
+        try:
+            # a failed attempt is retried before any of the body has been read
+            resp = await self._send('GET', path, params, timeout=timeout)
+            async with resp:
+                status = resp.status
+                if hooked:
+                    timings['first_byte'] = default_timer() - sent
+                if resp.status != 200:
+                    body = await resp.text(encoding='utf-8')
+                    decoder = callback(
+                        base.Response(resp.status, resp.headers, body))
+                else:
+                    decoder = callback(
+                        base.Response(resp.status, resp.headers, None,
+                                      self.codec))
+                if decoder is None:
+                    return
+                async for chunk in resp.content.iter_chunked(chunk_size):
+                    if hooked:
+                        bytes_in += len(chunk)
+                        started = default_timer()
+                        items = decoder.feed(chunk)
+                        timings['decode'] += default_timer() - started
+                    else:
+                        items = decoder.feed(chunk)
+                    for item in items:
+                        yield item
+                for item in decoder.close():
+                    yield item
+        except asyncio.TimeoutError:
+            raise nomad_alt.exceptions.Timeout
+        finally:
+            if hooked:
+                self.emit(request, status, bytes_in, timings)
+
+    async def follow(self, callback, path, params=None, advance=None,
+                     heartbeat=30, retry=None):
+        """
+        Async generator of the items of a stream, resuming the stream
+        whenever it is interrupted. It ends should the server end the stream
+        as many times in a row as *retry* allows attempts.
+        """
+        params = dict(params or {})
+        retry = retry or resuming()
+        failures = 0
+        while True:
+            try:
+                async for item in self.stream(
+                        callback, path, params, read_timeout=heartbeat):
+                    failures = 0
+                    for entry in advance(params, item):
+                        yield entry
+            except (aiohttp.ClientError, NomadException, ValueError) as e:
+                if not self.resumable(e):
+                    raise
+                failures += 1
+                if failures >= retry.attempts:
+                    raise
+            else:
+                # the server ended the stream, e.g. as it shut down
+                failures += 1
+                if failures >= retry.attempts:
+                    return
+            await asyncio.sleep(retry.delay(failures))
+
+    async def paginate(self, callback, path, params=None, per_page=100,
+                       prefetch=True):
+        """
+        Async generator of the items of a paginated list. With *prefetch* the
+        next page is requested as a separate task while the current page is
+        being iterated over.
+        """
+        token, items = await self.get(
+            callback, path, self.page_params(params, per_page, None))
+        while True:
+            fetch = None
+            if token is not None and prefetch:
+                fetch = asyncio.ensure_future(self.get(
+                    callback, path, self.page_params(params, per_page, token)))
+            try:
+                for item in items:
+                    yield item
+            except BaseException:
+                # the caller stopped iterating early
+                if fetch is not None:
+                    fetch.cancel()
+                raise
+            if token is None:
+                return
+            if fetch is None:
+                fetch = self.get(
+                    callback, path, self.page_params(params, per_page, token))
+            token, items = await fetch
+
+    async def many(self, calls, concurrency=8, ordered=True):
+        """
+        Async generator of the Results of *calls*, made by *concurrency* tasks
+        taking turns at the next call. The connector's limit also applies. No
+        more than twice *concurrency* calls are taken from *calls* ahead of
+        the Results the caller has been handed.
+        """
+        calls = enumerate(calls)
+        queue = asyncio.Queue()
+        ahead = asyncio.Semaphore(2 * concurrency)
+        running = [concurrency]
+
+        async def worker():
+            try:
+                while True:
+                    await ahead.acquire()
+                    taken = next(calls, None)
+                    if taken is None:
+                        break
+                    i, call = taken
+                    call = base.Call(*call)
+                    try:
+                        data = await self.chain(call)
+                        result = base.Result(call.id, data, None)
+                    except NomadException as e:
+                        result = base.Result(call.id, None, e)
+                    queue.put_nowait((i, result))
+            except Exception as e:
+                # aborts the batch
+                queue.put_nowait((None, e))
+            finally:
+                running[0] -= 1
+                if not running[0]:
+                    queue.put_nowait(None)
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+        done = {}
+        order = 0
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                i, result = item
+                if i is None:
+                    raise result
+                if not ordered:
+                    ahead.release()
+                    yield result
+                    continue
+                done[i] = result
+                while order in done:
+                    ahead.release()
+                    yield done.pop(order)
+                    order += 1
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    def __del__(self):
+        if self._session is not None and not self._session.closed:
+            warnings.warn(
+                'Unclosed session in nomad_alt.aio.HTTPClient', ResourceWarning)
+
+    async def _respond(self, callback, response):
+        return callback(response)
+
+    async def resolve(self, value):
+        return value
+
+    async def chain(self, call):
+        data = await self.send(call)
+        while isinstance(data, base.Call):
+            data = await self.send(data)
+        return data
+
+    def get(self, callback, path, params=None):
+        if self.cache is not None:
+            return self.cache.get(self, callback, path, params)
+        return self._request(callback, 'GET', path, params)
+
+    def put(self, callback, path, params=None, data=''):
+        if self.cache is not None:
+            callback = self.cache.invalidating(callback, path)
+        return self._request(callback, 'PUT', path, params, data)
+
+    def delete(self, callback, path, params=None):
+        if self.cache is not None:
+            callback = self.cache.invalidating(callback, path)
+        return self._request(callback, 'DELETE', path, params)
+
+    def post(self, callback, path, params=None, data=''):
+        if self.cache is not None:
+            callback = self.cache.invalidating(callback, path)
+        return self._request(callback, 'POST', path, params, data)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class Nomad(base.Nomad):
+    """
+    Asyncio Nomad client. Every endpoint method returns a coroutine.
+
+    :param limit: Maximum number of open connections (default 100, 0 is unbounded)
+    :param limit_per_host: Maximum number of open connections to the same Nomad agent (default 0, unbounded)
+    :param keepalive_timeout: Seconds an idle connection is kept open for reuse (default 15)
+    :param request_timeout: Seconds a request other than a blocking query may take (default 60, None for no limit)
+
+    The remaining parameters are those of :class:`nomad_alt.base.Nomad`.
+
+    The client should be closed when no longer needed, either with
+    ``await nomad.close()`` or by using it as an async context manager::
+
+        async with nomad_alt.aio.Nomad() as nomad:
+            jobs = await nomad.jobs.list()
+    """
+
+    logger = logging.getLogger('nomad_alt.aio.Nomad')
+
+    def __init__(self, *args, limit=100, limit_per_host=0,
+                 keepalive_timeout=15, request_timeout=60, **kwargs):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.request_timeout = request_timeout
+        super(Nomad, self).__init__(*args, **kwargs)
+
+    def connect(self, host, port, scheme, verify=True, cert=None, token=None, key=None, ca=None):
+        return HTTPClient(host, port, scheme, verify, cert, token=token, key=key, ca=ca,
+                          limit=self.limit,
+                          limit_per_host=self.limit_per_host,
+                          keepalive_timeout=self.keepalive_timeout,
+                          request_timeout=self.request_timeout)
+
+    async def close(self):
+        """Close all open HTTP connections"""
+        await self.http.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
@@ -1,5 +1,4 @@
-from json import dumps
-from nomad_alt.base import CB
+from nomad_alt.base import CB, blocking, Path
 
 
 class Policies(object):
@@ -11,15 +10,20 @@ For more details about ACLs, please see the ACL Guide.
     def __init__(self, agent):
         self.agent = agent
 
-    def list(self):
+    def list(self, index=None, wait=None, stale=None):
         """
         This endpoint lists all ACL policies. This lists the policies that have been replicated to the region, and may lag behind the authoritative region.
 
+        :param: index (int: <optional>) - Specifies the last seen X-Nomad-Index. When given the request blocks until the index changes or wait expires and a tuple of (index, data) is returned. Use 0 for the first request of a watch loop.
+        :param: wait (string|int: <optional>) - Specifies the maximum time to block when index is given, as a duration ("5m") or in seconds.
+        :param: stale (bool: <optional>) - Specifies whether any server may answer (a stale read) rather than only the leader, spreading reads across the servers. Defaults to the client's stale setting. Use index=0 to be returned the Index, whose last_contact and known_leader bound how stale the data may be.
+
         :return: json
         """
+        params = blocking({}, index, wait, stale)
         return self.agent.http.get(
-            CB.json(index=False, allow_404=False),
-            '/v1/acl/policies')
+            CB.json(index=index, allow_404=False),
+            '/v1/acl/policies', params=params)
 
     def set(self, policy_name, rules, description=None):
         """
@@ -34,21 +38,25 @@ This endpoint creates or updates an ACL Policy. This request is always forwarded
         data = {'Name': policy_name, 'Rules': rules}
         if description is not None:
             data['Description'] = description
-        data = dumps(data)
+        data = self.agent.http.codec.dumps(data)
         return self.agent.http.post(
-            CB.bool(), '/v1/acl/policy/%s' % policy_name, data=data)
+            CB.bool(), Path('/v1/acl/policy/%s', policy_name), data=data)
 
-    def read(self, policy_name):
+    def read(self, policy_name, index=None, wait=None, stale=None):
         """
 This endpoint reads an ACL policy with the given name. This queries the policy that have been replicated to the region, and may lag behind the authoritative region.
 
         :param: policy_name (string: <required>) - Specifies the policy name to read.
+        :param: index (int: <optional>) - Specifies the last seen X-Nomad-Index, see list.
+        :param: wait (string|int: <optional>) - Specifies the maximum time to block when index is given.
+        :param: stale (bool: <optional>) - Specifies whether any server may answer, see list.
 
         :return: json
         """
+        params = blocking({}, index, wait, stale)
         return self.agent.http.get(
-            CB.json(index=False, allow_404=False),
-            '/v1/acl/policy/%s' % policy_name)
+            CB.json(index=index, allow_404=False),
+            Path('/v1/acl/policy/%s', policy_name), params=params)
 
     def delete(self, policy_name):
         """
@@ -59,7 +67,7 @@ This endpoint deletes the named ACL policy. This request is always forwarded to
         :return: boolean
         """
         return self.agent.http.delete(
-            CB.bool(), '/v1/acl/policy/%s' % policy_name)
+            CB.bool(), Path('/v1/acl/policy/%s', policy_name))
 
 class Tokens(object):
     def __init__(self, agent):
@@ -75,15 +83,20 @@ class Tokens(object):
             CB.json(index=False, allow_404=False),
             '/v1/acl/bootstrap')
 
-    def list(self):
+    def list(self, index=None, wait=None, stale=None):
         """
         This endpoint lists all ACL tokens. This lists the local tokens and the global tokens which have been replicated to the region, and may lag behind the authoritative region.
 
+        :param: index (int: <optional>) - Specifies the last seen X-Nomad-Index. When given the request blocks until the index changes or wait expires and a tuple of (index, data) is returned. Use 0 for the first request of a watch loop.
+        :param: wait (string|int: <optional>) - Specifies the maximum time to block when index is given, as a duration ("5m") or in seconds.
+        :param: stale (bool: <optional>) - Specifies whether any server may answer (a stale read) rather than only the leader, spreading reads across the servers. Defaults to the client's stale setting. Use index=0 to be returned the Index, whose last_contact and known_leader bound how stale the data may be.
+
         :return: json
         """
+        params = blocking({}, index, wait, stale)
         return self.agent.http.get(
-            CB.json(index=False, allow_404=False),
-            '/v1/acl/tokens')
+            CB.json(index=index, allow_404=False),
+            '/v1/acl/tokens', params=params)
 
     def create(self, token_type, policies_array, name=None, make_global=False):
         """
@@ -100,7 +113,7 @@ class Tokens(object):
         if name is not None:
             data['Name'] = name
         data['Global'] = make_global
-        data = dumps(data)
+        data = self.agent.http.codec.dumps(data)
         return self.agent.http.post(
             CB.json(index=False, allow_404=False),
             '/v1/acl/token', data=data)
@@ -119,22 +132,26 @@ class Tokens(object):
         data = {'AccessorID': accessor_id, 'Type': token_type, 'Policies': policies_array}
         if name is not None:
             data['Name'] = name
-        data = dumps(data)
+        data = self.agent.http.codec.dumps(data)
         return self.agent.http.post(
             CB.json(index=False, allow_404=False),
-            '/v1/acl/token/%s' % accessor_id, data=data)
+            Path('/v1/acl/token/%s', accessor_id), data=data)
 
-    def read(self, accessor_id="self"):
+    def read(self, accessor_id="self", index=None, wait=None, stale=None):
         """
         This endpoint reads an ACL token with the given accessor. If the token is a global token which has been replicated to the region it may lag behind the authoritative region.
 
         :param: accessor_id (string: defaults to 'self') - Specifies the token (by accessor) that is being retrieved.
+        :param: index (int: <optional>) - Specifies the last seen X-Nomad-Index, see list.
+        :param: wait (string|int: <optional>) - Specifies the maximum time to block when index is given.
+        :param: stale (bool: <optional>) - Specifies whether any server may answer, see list.
 
         :return: json
         """
+        params = blocking({}, index, wait, stale)
         return self.agent.http.get(
-            CB.json(index=False, allow_404=False),
-            '/v1/acl/token/%s' % accessor_id)
+            CB.json(index=index, allow_404=False),
+            Path('/v1/acl/token/%s', accessor_id), params=params)
 
     def delete(self, accessor_id):
         """
@@ -145,4 +162,4 @@ class Tokens(object):
         :return: json
         """
         return self.agent.http.delete(
-            CB.bool(), '/v1/acl/token/%s' % accessor_id)
+            CB.bool(), Path('/v1/acl/token/%s', accessor_id))
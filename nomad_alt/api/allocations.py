@@ -1,4 +1,5 @@
-from nomad_alt.base import CB
+from nomad_alt.base import CB, blocking, Path
+from nomad_alt.models import AllocationStub
 
 
 class Allocations(object):
@@ -7,21 +8,70 @@ class Allocations(object):
     def __init__(self, agent):
         self.agent = agent
 
-    def list(self, prefix=None):
+    def list(self, prefix=None, index=None, wait=None, stale=None, stream=False, model=False, fields=None):
         """The /allocation endpoints are used to query for and interact with allocations.
 
 prefix (string: "")- Specifies a string to filter allocations on based on an index prefix. This is specified as a querystring parameter.
+index (int: None)- Specifies the last seen X-Nomad-Index. When given the request blocks until the index changes or wait expires and a tuple of (index, data) is returned. Use 0 for the first request of a watch loop.
+wait (string|int: None)- Specifies the maximum time to block when index is given, as a duration ("5m") or in seconds.
+stale (bool: None)- Specifies whether any server may answer (a stale read) rather than only the leader, spreading reads across the servers. Defaults to the client's stale setting. Use index=0 to be returned the Index, whose last_contact and known_leader bound how stale the data may be.
+stream (bool: false)- If set, the allocations are returned as an iterator, decoded one at a time as they are read off the socket, so memory use does not grow with the size of the cluster. Blocking queries still block, but no index is returned.
+model (bool: false)- If set, the allocations are returned as nomad_alt.models.AllocationStub objects, which keep their fields in slots and need a fraction of the memory of dicts.
+fields (list: None)- If set, only these fields of each allocation are decoded, as dotted paths such as "ID" or "TaskStates.*.State", see nomad_alt.projection. Nomad has no way of selecting fields, so the full response is still transferred.
 """
         params = {}
         if prefix is not None:
             params['prefix'] = prefix
+        blocking(params, index, wait, stale)
+        if stream:
+            return self.agent.http.stream(
+                CB.stream(map=AllocationStub if model else None, decode='Payload', fields=fields, allow_404=False),
+                '/v1/allocations', params=params)
         return self.agent.http.get(
-            CB.json(index=False, decode='Payload'),
+            CB.json(index=index, map=AllocationStub.from_list if model else None, decode='Payload', fields=fields, allow_404=False),
             '/v1/allocations', params=params)
 
-    def read(self, alloc_id):
-        """
+    def iterate(self, prefix=None, per_page=100, prefetch=True, model=False, fields=None):
+        """Iterates over all allocations, fetching them from Nomad one page at a time.
+
+prefix (string: "")- Specifies a string to filter allocations on based on an index prefix.
+per_page (int: 100)- Specifies the number of allocations to request per page.
+prefetch (bool: true)- If set, the next page is requested while the current one is being iterated over.
+model (bool: false)- If set, the allocations are returned as nomad_alt.models.AllocationStub objects, see list.
+fields (list: None)- If set, only these fields of each allocation are decoded, see list.
 """
+        params = {}
+        if prefix is not None:
+            params['prefix'] = prefix
+        return self.agent.http.paginate(
+            CB.page(map=AllocationStub if model else None, decode='Payload', fields=fields),
+            '/v1/allocations', params=params,
+            per_page=per_page, prefetch=prefetch)
+
+    def read(self, alloc_id, index=None, wait=None, stale=None, fields=None):
+        """This endpoint reads information about a specific allocation.
+
+alloc_id (string: <required>)- Specifies the UUID of the allocation. This must be the full UUID, not the short 8-character one. This is specified as part of the path.
+index (int: None)- Specifies the last seen X-Nomad-Index, see list.
+wait (string|int: None)- Specifies the maximum time to block when index is given.
+stale (bool: None)- Specifies whether any server may answer, see list.
+fields (list: None)- If set, only these fields of the allocation are decoded, see list.
+"""
+        params = blocking({}, index, wait, stale)
         return self.agent.http.get(
-            CB.json(index=False),
-            '/v1/allocation/%s' % alloc_id)
+            CB.json(index=index, fields=fields),
+            Path('/v1/allocation/%s', alloc_id), params=params)
+
+    def read_many(self, alloc_ids, concurrency=8, ordered=True):
+        """Reads many allocations at once, with up to concurrency requests in flight.
+
+alloc_ids (list: <required>)- Specifies the full UUIDs of the allocations to read.
+concurrency (int: 8)- Specifies the maximum number of concurrent requests.
+ordered (bool: true)- If set, results are returned in the order of alloc_ids, otherwise as they complete.
+
+Returns an iterator (an async iterator for the tornado and asyncio clients) of nomad_alt.base.Result(id, data, error) tuples. An allocation that can not be read has its NotFound or ACLPermissionDenied in error, and does not abort the others.
+"""
+        return self.agent.http.many(
+            ((alloc_id, CB.json(allow_404=False), Path('/v1/allocation/%s', alloc_id), None)
+             for alloc_id in alloc_ids),
+            concurrency=concurrency, ordered=ordered)
@@ -1,9 +1,62 @@
+import base64
+import collections
 from logging import getLogger
 import nomad_alt
 import nomad_alt.exceptions
-from nomad_alt.base import CB
+from nomad_alt.base import CB, Call, Path
+from nomad_alt.decoders import BytesDecoder, JSONSequenceDecoder
 from json import dumps, loads
 
+# A frame of a file or log stream: *data* (bytes) read from *file* up to
+# *offset*, or a FileEvent such as "file truncated" or "file deleted".
+Frame = collections.namedtuple('Frame', ['file', 'offset', 'data', 'event'])
+
+
+def frame(value):
+    """Returns the Frame of a decoded stream frame, or None for a
+    heartbeat."""
+    data = value.get('Data')
+    event = value.get('FileEvent')
+    if not data and not event:
+        return None
+    return Frame(value.get('File'), value.get('Offset', 0),
+                 base64.b64decode(data) if data else b'', event)
+
+
+def copy(items, out):
+    """
+    Writes the data of *items*, the chunks returned by Client.cat or read_at
+    or the Frames of stream_file or logs, into *out* as it arrives, returning
+    the number of bytes written. *out* is a file, or anything with a write
+    method, or a writable buffer such as a bytearray or memoryview, in which
+    case reading stops once it is full.
+
+    Only one chunk or frame is held at a time. For the blocking client only,
+    with the others write each item as it is read.
+    """
+    written = 0
+    if hasattr(out, 'write'):
+        for item in items:
+            data = item.data if isinstance(item, Frame) else item
+            if data:
+                out.write(data)
+                written += len(data)
+        return written
+    view = memoryview(out)
+    size = len(view)
+    for item in items:
+        data = item.data if isinstance(item, Frame) else item
+        n = min(len(data), size - written)
+        view[written:written + n] = data[:n]
+        written += n
+        if written == size:
+            # release the connection rather than wait for the collector
+            close = getattr(items, 'close', None)
+            if close is not None:
+                close()
+            break
+    return written
+
 class Client(object):
     """"""
 
@@ -21,13 +74,131 @@ class Client(object):
             CB.json(index=False, allow_404=False),
             '/v1/client/stats')
 
-    def allocation(self, alloc_id):
+    def allocation(self, alloc_id, fields=None):
         """This endpoint queries the actual resources consumed on a node. The API endpoint is hosted by the Nomad client and requests have to be made to the nomad client whose resource usage metrics are of interest.
 
         :param: :alloc_id (string: <required>) - Specifies the allocation ID to query. This is specified as part of the URL. Note, this must be the full allocation ID, not the short 8-character one. This is specified as part of the path.
+        :param: fields (list: None) - If set, only these fields of the stats are decoded, as dotted paths such as "ResourceUsage.CpuStats.Percent", see nomad_alt.projection.
 
         :return application/json
 """
         return self.agent.http.get(
-            CB.json(index=False, allow_404=False),
-            '/v1/client/allocation/%s/stats' % alloc_id)
+            CB.json(index=False, allow_404=False, fields=fields),
+            Path('/v1/client/allocation/%s/stats', alloc_id))
+
+    def allocation_many(self, alloc_ids, concurrency=8, ordered=False, fields=None):
+        """Queries the resources consumed by many allocations at once, with up to *concurrency* requests in flight. The servers forward each request to the client running the allocation. See nomad_alt.telemetry.AllocationSampler to sample them over time, with a rate limit per node.
+
+        :param alloc_ids (iterable: <required>) - Specifies the allocation IDs to query, consumed as they are queried.
+        :param concurrency (int: 8) - Specifies the maximum number of concurrent requests.
+        :param ordered (bool: false) - If set, results are returned in the order of *alloc_ids*, otherwise as they complete.
+        :param fields (list: None) - If set, only these fields of the stats are decoded, see allocation.
+
+        :return an iterator (an async iterator for the tornado and asyncio clients) of nomad_alt.base.Result(id, data, error) tuples, by allocation ID. An allocation that has gone away has a NotFound in *error*.
+"""
+        return self.agent.http.many(
+            (self._allocation_call(alloc_id, fields) for alloc_id in alloc_ids),
+            concurrency=concurrency, ordered=ordered)
+
+    def _allocation_call(self, alloc_id, fields=None):
+        return Call(
+            alloc_id, CB.json(allow_404=False, fields=fields),
+            Path('/v1/client/allocation/%s/stats', alloc_id))
+
+    def cat(self, alloc_id, path):
+        """This endpoint reads the contents of a file in an allocation directory.
+
+        :param: :alloc_id (string: <required>) - Specifies the ID of the allocation. This must be the full UUID, not the short 8-character one. This is specified as part of the path.
+        :param: path (string: "/") - Specifies the path of the file to read, relative to the root of the allocation directory.
+
+        :return an iterator (a nomad_alt.tornado.Stream for the tornado client, an async iterator for the asyncio client) of the contents of the file in chunks (bytes), as they are read off the socket. See copy to write them to a file or buffer.
+"""
+        return self.agent.http.stream(
+            CB.stream(allow_404=False, decoder=BytesDecoder),
+            Path('/v1/client/fs/cat/%s', alloc_id), params={'path': path})
+
+    def read_at(self, alloc_id, path, offset, limit):
+        """This endpoint reads the contents of a file in an allocation directory at a particular offset and limit.
+
+        :param: :alloc_id (string: <required>) - Specifies the ID of the allocation. This is specified as part of the path.
+        :param: path (string: "/") - Specifies the path of the file to read, relative to the root of the allocation directory.
+        :param: offset (int: <required>) - Specifies the byte offset from where content will be read.
+        :param: limit (int: <required>) - Specifies the number of bytes to read from the offset.
+
+        :return an iterator of the chunks (bytes) read, see cat.
+"""
+        params = {
+            'path': path,
+            'offset': offset,
+            'limit': limit,
+        }
+        return self.agent.http.stream(
+            CB.stream(allow_404=False, decoder=BytesDecoder),
+            Path('/v1/client/fs/readat/%s', alloc_id), params=params)
+
+    def stream_file(self, alloc_id, path, offset=0, origin='start', heartbeat=30, retry=None):
+        """This endpoint streams the contents of a file in an allocation directory, following it as it is written to.
+
+        :param: :alloc_id (string: <required>) - Specifies the ID of the allocation. This is specified as part of the path.
+        :param: path (string: "/") - Specifies the path of the file to stream, relative to the root of the allocation directory.
+        :param: offset (int: 0) - Specifies the byte offset from where content will be streamed.
+        :param: origin (string: "start") - Applies the relative offset to either the start or end of the file, "start" or "end".
+        :param: heartbeat (int: 30) - Specifies the seconds after which a stream that has received nothing, not even the heartbeats Nomad sends every second, is given up on and resumed.
+        :param: retry (nomad_alt.servers.Retry: None) - Specifies how often and after what delay to resume an interrupted stream, see HTTPClient.follow.
+
+        :return an iterator (see cat) of Frame(file, offset, data, event) tuples, decoded one at a time as they are read off the socket. An interrupted stream is resumed from the offset of the last frame, so no data is missed or repeated. See copy to write the data to a file or buffer.
+"""
+        params = {
+            'path': path,
+            'offset': offset,
+            'origin': origin,
+        }
+        return self.agent.http.follow(
+            CB.stream(map=frame, allow_404=False, decoder=JSONSequenceDecoder),
+            Path('/v1/client/fs/stream/%s', alloc_id), params=params,
+            advance=_advance_file, heartbeat=heartbeat, retry=retry)
+
+    def logs(self, alloc_id, task, type='stdout', follow=False, offset=0, origin='start', heartbeat=30, retry=None):
+        """This endpoint streams a task's stderr/stdout logs.
+
+        :param: :alloc_id (string: <required>) - Specifies the ID of the allocation. This is specified as part of the path.
+        :param: task (string: <required>) - Specifies the name of the task inside the allocation to stream logs from.
+        :param: type (string: "stdout") - Specifies the stream to stream, "stdout" or "stderr".
+        :param: follow (bool: false) - Specifies whether to tail the logs, rather than return once the logs written so far have been read.
+        :param: offset (int: 0) - Specifies the offset to start streaming from.
+        :param: origin (string: "start") - Specifies either "start" or "end" and applies the offset relative to either the start or end of the logs respectively.
+        :param: heartbeat (int: 30) - When following, specifies the seconds after which a stream that has received nothing is given up on and resumed, see stream_file.
+        :param: retry (nomad_alt.servers.Retry: None) - When following, specifies how often and after what delay to resume an interrupted stream.
+
+        :return an iterator (see cat) of Frame(file, offset, data, event) tuples. Logs followed from their start are resumed where they were interrupted; logs followed from their end are resumed from the end, so what is written in between is missed. See copy to write the data to a file or buffer.
+"""
+        params = {
+            'task': task,
+            'type': type,
+            'follow': 'true' if follow else 'false',
+            'offset': offset,
+            'origin': origin,
+        }
+        callback = CB.stream(map=frame, allow_404=False, decoder=JSONSequenceDecoder)
+        path = Path('/v1/client/fs/logs/%s', alloc_id)
+        if not follow:
+            return self.agent.http.stream(callback, path, params=params)
+
+        def advance(params, frame):
+            # the offset of a log from its start runs on across its files,
+            # that of each frame only within its file
+            if origin == 'start':
+                params['offset'] += len(frame.data)
+            else:
+                params['offset'] = 0
+            return (frame,)
+        return self.agent.http.follow(
+            callback, path, params=params, advance=advance,
+            heartbeat=heartbeat, retry=retry)
+
+
+def _advance_file(params, frame):
+    # the offset of a frame is that of the end of its data
+    params['offset'] = frame.offset
+    params['origin'] = 'start'
+    return (frame,)
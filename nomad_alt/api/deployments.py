@@ -1,6 +1,6 @@
-from json import dumps
-
-from nomad_alt.base import CB
+from nomad_alt.base import CB, blocking, Path
+from nomad_alt.models import Deployment
+from nomad_alt.waiters import DEPLOYMENT, WaitMany, WaitOne
 
 
 class Deployments(object):
@@ -9,37 +9,98 @@ class Deployments(object):
     def __init__(self, agent):
         self.agent = agent
 
-    def list(self, prefix=None):
+    def list(self, prefix=None, index=None, wait=None, stale=None, stream=False, model=False, fields=None):
         """This endpoint lists all deployments
 
 :param: prefix (string: "")- Specifies a string to filter deployments on based on an index prefix. This is specified as a querystring parameter
+:param: index (int: None)- Specifies the last seen X-Nomad-Index. When given the request blocks until the index changes or wait expires and a tuple of (index, data) is returned. Use 0 for the first request of a watch loop.
+:param: wait (string|int: None)- Specifies the maximum time to block when index is given, as a duration ("5m") or in seconds.
+:param: stale (bool: None)- Specifies whether any server may answer (a stale read) rather than only the leader, spreading reads across the servers. Defaults to the client's stale setting. Use index=0 to be returned the Index, whose last_contact and known_leader bound how stale the data may be.
+:param: stream (bool: false)- If set, the deployments are returned as an iterator, decoded one at a time as they are read off the socket, so memory use does not grow with the size of the cluster. Blocking queries still block, but no index is returned.
+:param: model (bool: false)- If set, the deployments are returned as nomad_alt.models.Deployment objects, which keep their fields in slots and need a fraction of the memory of dicts.
+:param: fields (list: None)- If set, only these fields of each deployment are decoded, as dotted paths such as "ID" or "TaskGroups.*.HealthyAllocs", see nomad_alt.projection. Nomad has no way of selecting fields, so the full response is still transferred.
 """
         params = {}
         if prefix is not None:
             params['prefix'] = prefix
+        blocking(params, index, wait, stale)
+        if stream:
+            return self.agent.http.stream(
+                CB.stream(map=Deployment if model else None, decode='Payload', fields=fields, allow_404=False),
+                '/v1/deployments', params=params)
         return self.agent.http.get(
-            CB.json(index=False, decode='Payload'),
+            CB.json(index=index, map=Deployment.from_list if model else None, decode='Payload', fields=fields, allow_404=False),
             '/v1/deployments', params=params)
 
-    def read(self, deployment_id):
+    def iterate(self, prefix=None, per_page=100, prefetch=True, model=False, fields=None):
+        """Iterates over all deployments, fetching them from Nomad one page at a time.
+
+:param: prefix (string: "")- Specifies a string to filter deployments on based on an index prefix.
+:param: per_page (int: 100)- Specifies the number of deployments to request per page.
+:param: prefetch (bool: true)- If set, the next page is requested while the current one is being iterated over.
+:param: model (bool: false)- If set, the deployments are returned as nomad_alt.models.Deployment objects, see list.
+:param: fields (list: None)- If set, only these fields of each deployment are decoded, see list.
+"""
+        params = {}
+        if prefix is not None:
+            params['prefix'] = prefix
+        return self.agent.http.paginate(
+            CB.page(map=Deployment if model else None, decode='Payload', fields=fields),
+            '/v1/deployments', params=params,
+            per_page=per_page, prefetch=prefetch)
+
+    def read(self, deployment_id, index=None, wait=None, stale=None, fields=None):
         """This endpoint reads information about a specific deployment by ID.
 
 :param: deployment_id (string: <required>)- Specifies the UUID of the deployment. This must be the full UUID, not the short 8-character one. This is specified as part of the path.
+:param: index (int: None)- Specifies the last seen X-Nomad-Index, see list.
+:param: wait (string|int: None)- Specifies the maximum time to block when index is given.
+:param: stale (bool: None)- Specifies whether any server may answer, see list.
+:param: fields (list: None)- If set, only these fields of the deployment are decoded, see list.
 
 """
+        params = blocking({}, index, wait, stale)
         return self.agent.http.get(
-            CB.json(index=False),
-            '/v1/deployment/%s' % deployment_id)
+            CB.json(index=index, fields=fields),
+            Path('/v1/deployment/%s', deployment_id), params=params)
+
+    def wait(self, deployment_id, timeout=None, wait=60):
+        """Waits for a deployment to succeed, fail or be cancelled, with blocking queries.
 
-    def allocations(self, deployment_id):
+:param: deployment_id (string: <required>)- Specifies the UUID of the deployment.
+:param: timeout (float: None)- Specifies the number of seconds after which to give up, raising nomad_alt.exceptions.Timeout.
+:param: wait (string|int: 60)- Specifies the maximum time each blocking query blocks for.
+
+Returns a nomad_alt.waiters.Waited(state, chain, elapsed, requests, history) (a Future or coroutine with the tornado and asyncio clients), where state is the deployment as it ended and history the (seconds, ID, status) of each status seen, e.g. paused or running.
+"""
+        return self.agent.http.chain(
+            WaitOne(DEPLOYMENT, deployment_id, wait, timeout).call())
+
+    def wait_many(self, deployment_ids, timeout=None, wait=60, namespace=None):
+        """Waits for many deployments at once, with a single blocking query of the list of deployments rather than one per deployment, so hundreds can be waited on with one request in flight.
+
+:param: deployment_ids (list: <required>)- Specifies the UUIDs of the deployments.
+:param: timeout, wait- See wait.
+:param: namespace (string: None)- Specifies the namespace of the deployments, "*" for all of them.
+
+Returns, once every deployment has finished or the timeout passed, a list of nomad_alt.base.Result(id, data, error) in the order of deployment_ids. data is the Waited of the deployment, error a Timeout, or NotFound for a deployment missing from the list.
+"""
+        return self.agent.http.chain(
+            WaitMany(DEPLOYMENT, deployment_ids, wait, timeout, namespace=namespace).call())
+
+    def allocations(self, deployment_id, index=None, wait=None, stale=None):
         """This endpoint lists the allocations created or modified for the given deployment.
 
 :param: deployment_id (string: <required>)- Specifies the UUID of the deployment. This must be the full UUID, not the short 8-character one. This is specified as part of the path.
+:param: index (int: None)- Specifies the last seen X-Nomad-Index, see list.
+:param: wait (string|int: None)- Specifies the maximum time to block when index is given.
+:param: stale (bool: None)- Specifies whether any server may answer, see list.
 
 """
+        params = blocking({}, index, wait, stale)
         return self.agent.http.get(
-            CB.json(index=False),
-            '/v1/deployment/allocations/%s' % deployment_id)
+            CB.json(index=index),
+            Path('/v1/deployment/allocations/%s', deployment_id), params=params)
 
     def fail(self, deployment_id):
         """This endpoint is used to mark a deployment as failed. This should be done to force the scheduler to stop creating allocations as part of the deployment or to cause a rollback to a previous job version. This endpoint only triggers a rollback if the most recent stable version of the job has a different specification than the job being reverted.
@@ -49,7 +110,7 @@ class Deployments(object):
 """
         return self.agent.http.post(
             CB.json(index=False),
-            '/v1/deployment/fail/%s' % deployment_id)
+            Path('/v1/deployment/fail/%s', deployment_id))
 
     def pause(self, deployment_id, pause=False):
         """This endpoint is used to pause or unpause a deployment. This is done to pause a rolling upgrade or resume it.
@@ -61,10 +122,10 @@ class Deployments(object):
             'DeploymentID': deployment_id,
             'Pause': True if pause else False
         }
-        data = dumps(req)
+        data = self.agent.http.codec.dumps(req)
         return self.agent.http.post(
             CB.json(index=False),
-            '/v1/deployment/pause/%s' % deployment_id, data=data)
+            Path('/v1/deployment/pause/%s', deployment_id), data=data)
 
     def promote(self, deployment_id, all_vals=False, groups=None):
         """This endpoint is used to promote task groups that have canaries for a deployment. This should be done when the placed canaries are healthy and the rolling upgrade of the remaining allocations should begin.
@@ -83,10 +144,10 @@ class Deployments(object):
                 req['Groups'] = groups
             else:
                 raise RuntimeError("When calling promote, the 'groups' argument must be a list if provided")
-        data = dumps(req)
+        data = self.agent.http.codec.dumps(req)
         return self.agent.http.post(
             CB.json(index=False),
-            '/v1/deployment/promote/%s' % deployment_id, data=data)
+            Path('/v1/deployment/promote/%s', deployment_id), data=data)
 
     def allocation_health(self, deployment_id, HealthyAllocationIDs=None, UnhealthyAllocationIDs=None):
         """This endpoint is used to promote task groups that have canaries for a deployment. This should be done when the placed canaries are healthy and the rolling upgrade of the remaining allocations should begin.
@@ -108,7 +169,7 @@ class Deployments(object):
                 req['UnhealthyAllocationIDs'] = UnhealthyAllocationIDs
             else:
                 raise RuntimeError("When calling promote, the 'UnhealthyAllocationIDs' argument must be a list if provided")
-        data = dumps(req)
+        data = self.agent.http.codec.dumps(req)
         return self.agent.http.post(
             CB.json(index=False),
-            '/v1/deployment/allocation-health/%s' % deployment_id, data=data)
+            Path('/v1/deployment/allocation-health/%s', deployment_id), data=data)
@@ -1,4 +1,6 @@
-from nomad_alt.base import CB
+from nomad_alt.base import CB, blocking, Path
+from nomad_alt.models import Evaluation
+from nomad_alt.waiters import EVALUATION, WaitMany, WaitOne
 
 
 class Evaluations(object):
@@ -7,29 +9,106 @@ class Evaluations(object):
     def __init__(self, agent):
         self.agent = agent
 
-    def list(self, prefix=None):
+    def list(self, prefix=None, index=None, wait=None, stale=None, stream=False, model=False, fields=None):
         """The /evaluation endpoints are used to query for and interact with evaluations.
 
 :prefix (string: "")- Specifies a string to filter evaluations on based on an index prefix. This is specified as a querystring parameter.
+:index (int: None)- Specifies the last seen X-Nomad-Index. When given the request blocks until the index changes or wait expires and a tuple of (index, data) is returned. Use 0 for the first request of a watch loop.
+:wait (string|int: None)- Specifies the maximum time to block when index is given, as a duration ("5m") or in seconds.
+:stale (bool: None)- Specifies whether any server may answer (a stale read) rather than only the leader, spreading reads across the servers. Defaults to the client's stale setting. Use index=0 to be returned the Index, whose last_contact and known_leader bound how stale the data may be.
+:stream (bool: false)- If set, the evaluations are returned as an iterator, decoded one at a time as they are read off the socket, so memory use does not grow with the size of the cluster. Blocking queries still block, but no index is returned.
+:model (bool: false)- If set, the evaluations are returned as nomad_alt.models.Evaluation objects, which keep their fields in slots and need a fraction of the memory of dicts.
+:fields (list: None)- If set, only these fields of each evaluation are decoded, as dotted paths such as "ID" or "QueuedAllocations", see nomad_alt.projection. Nomad has no way of selecting fields, so the full response is still transferred.
 """
         params = {}
         if prefix is not None:
             params['prefix'] = prefix
+        blocking(params, index, wait, stale)
+        if stream:
+            return self.agent.http.stream(
+                CB.stream(map=Evaluation if model else None, decode='Payload', fields=fields, allow_404=False),
+                '/v1/evaluations', params=params)
         return self.agent.http.get(
-            CB.json(index=False, decode='Payload'),
+            CB.json(index=index, map=Evaluation.from_list if model else None, decode='Payload', fields=fields, allow_404=False),
             '/v1/evaluations', params=params)
 
-    def read(self, eval_id):
+    def iterate(self, prefix=None, per_page=100, prefetch=True, model=False, fields=None):
+        """Iterates over all evaluations, fetching them from Nomad one page at a time.
+
+:prefix (string: "")- Specifies a string to filter evaluations on based on an index prefix.
+:per_page (int: 100)- Specifies the number of evaluations to request per page.
+:prefetch (bool: true)- If set, the next page is requested while the current one is being iterated over.
+:model (bool: false)- If set, the evaluations are returned as nomad_alt.models.Evaluation objects, see list.
+:fields (list: None)- If set, only these fields of each evaluation are decoded, see list.
+"""
+        params = {}
+        if prefix is not None:
+            params['prefix'] = prefix
+        return self.agent.http.paginate(
+            CB.page(map=Evaluation if model else None, decode='Payload', fields=fields),
+            '/v1/evaluations', params=params,
+            per_page=per_page, prefetch=prefetch)
+
+    def read(self, eval_id, index=None, wait=None, stale=None, fields=None):
         """This endpoint reads information about a specific evaluation by ID.
+
+:index (int: None)- Specifies the last seen X-Nomad-Index, see list.
+:wait (string|int: None)- Specifies the maximum time to block when index is given.
+:stale (bool: None)- Specifies whether any server may answer, see list.
+:fields (list: None)- If set, only these fields of the evaluation are decoded, see list.
 """
+        params = blocking({}, index, wait, stale)
         return self.agent.http.get(
-            CB.json(index=False),
-            '/v1/evaluation/%s' % eval_id)
+            CB.json(index=index, fields=fields),
+            Path('/v1/evaluation/%s', eval_id), params=params)
+
+    def read_many(self, eval_ids, concurrency=8, ordered=True):
+        """Reads many evaluations at once, with up to concurrency requests in flight.
+
+:eval_ids (list: <required>)- Specifies the IDs of the evaluations to read.
+:concurrency (int: 8)- Specifies the maximum number of concurrent requests.
+:ordered (bool: true)- If set, results are returned in the order of eval_ids, otherwise as they complete.
+
+Returns an iterator (an async iterator for the tornado and asyncio clients) of nomad_alt.base.Result(id, data, error) tuples. An evaluation that can not be read has its NotFound or ACLPermissionDenied in error, and does not abort the others.
+"""
+        return self.agent.http.many(
+            ((eval_id, CB.json(allow_404=False), Path('/v1/evaluation/%s', eval_id), None)
+             for eval_id in eval_ids),
+            concurrency=concurrency, ordered=ordered)
+
+    def wait(self, eval_id, timeout=None, follow=True, wait=60):
+        """Waits for an evaluation to complete, fail or be canceled, with blocking queries.
+
+:eval_id (string: <required>)- Specifies the ID of the evaluation.
+:timeout (float: None)- Specifies the number of seconds after which to give up, raising nomad_alt.exceptions.Timeout.
+:follow (bool: true)- If set, an evaluation completed with a NextEval (a delayed reschedule) or BlockedEval (allocations that could not be placed yet) is followed by waiting on that one. A blocked evaluation only completes once the cluster has room: without a timeout the wait returns as soon as it reaches one, with its state blocked, and with a timeout waits on it until then.
+:wait (string|int: 60)- Specifies the maximum time each blocking query blocks for.
+
+Returns a nomad_alt.waiters.Waited(state, chain, elapsed, requests, history) (a Future or coroutine with the tornado and asyncio clients), where state is the last evaluation of the chain waited on and history the (seconds, ID, status) of each status seen.
+"""
+        return self.agent.http.chain(
+            WaitOne(EVALUATION, eval_id, wait, timeout, follow).call())
+
+    def wait_many(self, eval_ids, timeout=None, follow=True, wait=60, namespace=None):
+        """Waits for many evaluations at once, with a single blocking query of the list of evaluations rather than one per evaluation.
+
+:eval_ids (list: <required>)- Specifies the IDs of the evaluations.
+:timeout, follow, wait- See wait.
+:namespace (string: None)- Specifies the namespace of the evaluations, "*" for all of them.
+
+Returns, once every evaluation has finished or the timeout passed, a list of nomad_alt.base.Result(id, data, error) in the order of eval_ids. data is the Waited of the evaluation, error a Timeout, or NotFound for an evaluation missing from the list.
+"""
+        return self.agent.http.chain(
+            WaitMany(EVALUATION, eval_ids, wait, timeout, follow, namespace).call())
 
-    def allocations(self, eval_id):
-        """
+    def allocations(self, eval_id, index=None, wait=None, stale=None):
+        """This endpoint lists the allocations created or modified for the given evaluation.
 
+:index (int: None)- Specifies the last seen X-Nomad-Index, see list.
+:wait (string|int: None)- Specifies the maximum time to block when index is given.
+:stale (bool: None)- Specifies whether any server may answer, see list.
 """
+        params = blocking({}, index, wait, stale)
         return self.agent.http.get(
-            CB.json(index=False),
-            '/v1/evaluation/%s/allocations' % eval_id)
+            CB.json(index=index),
+            Path('/v1/evaluation/%s/allocations', eval_id), params=params)
@@ -0,0 +1,47 @@
+import six
+
+from nomad_alt.base import CB
+from nomad_alt.decoders import JSONStreamDecoder
+
+
+class Events(object):
+    """
+The /event endpoints stream the changes made to the cluster's state.
+    """
+    def __init__(self, agent):
+        self.agent = agent
+
+    def stream(self, topics=None, index=None, namespace=None, heartbeat=30,
+               retry=None, frames=False):
+        """This endpoint streams the events of the given topics as they happen, resuming the stream should it be interrupted.
+
+        :param topics (list|dict: None) - Specifies the topics to follow, as a list of topic names (e.g. ["Job", "Node"]) to receive all of their events, or a dict of topic names to the keys, such as job IDs, to receive the events of (e.g. {"Job": ["redis"]}). Defaults to all topics.
+        :param index (int: None) - Specifies the index to start streaming from. Events still held by the server from that index on are sent first.
+        :param namespace (string: None) - Specifies the namespace to stream the events of, "*" for all of them.
+        :param heartbeat (int: 30) - Specifies the seconds after which a stream that has received nothing, not even the heartbeats Nomad sends every ten seconds, is given up on and resumed.
+        :param retry (nomad_alt.servers.Retry: None) - Specifies how often and after what delay to resume an interrupted stream, see HTTPClient.events.
+        :param frames (bool: false) - If set, the frames are returned rather than the events, each a dict of the Index and the Events made at that index, so that they can be applied together.
+
+        :return an iterator (a nomad_alt.tornado.Stream for the tornado client, an async iterator for the asyncio client) of the events, each a dict with the Topic, Type, Key, Index and Payload of the event. Events are resumed from the index after the last one seen, so none are missed or repeated.
+"""
+        params = {}
+        if topics:
+            params['topic'] = topic_params(topics)
+        if index is not None:
+            params['index'] = index
+        if namespace is not None:
+            params['namespace'] = namespace
+        return self.agent.http.events(
+            CB.stream(allow_404=False, decoder=JSONStreamDecoder),
+            '/v1/event/stream', params=params, heartbeat=heartbeat,
+            retry=retry, frames=frames)
+
+
+def topic_params(topics):
+    """Returns the topic query parameters following *topics*, see
+    Events.stream."""
+    if isinstance(topics, dict):
+        return ['%s:%s' % (topic, key)
+                for topic, keys in sorted(six.iteritems(topics))
+                for key in (keys or ['*'])]
+    return ['%s:*' % topic for topic in topics]
@@ -1,7 +1,7 @@
 import nomad_alt
 import nomad_alt.exceptions
-from nomad_alt.base import CB
-from json import dumps, loads
+from nomad_alt.base import CB, Call, blocking, prefixes, synchronous, Path
+from nomad_alt.models import JobStub
 
 class Jobs(object):
     """"""
@@ -10,35 +10,62 @@ class Jobs(object):
         self.agent = agent
 
     def __contains__(self, item):
-
-        try:
-            j = self.read(item)
-            return True
-        except nomad_alt.exceptions.NomadException:
-            return False
+        """`job_id in nomad.jobs`, with the blocking client only: use
+        contains_many with the tornado and asyncio clients."""
+        return synchronous(self.contains_many([item]), 'contains_many')[item]
 
     def __getitem__(self, item):
 
         try:
             j = self.read(item)
             return j
-        except nomad_alt.exceptions.NomadException:
-            raise KeyError
+        except nomad_alt.exceptions.NotFound:
+            raise KeyError(item)
 
-    def list(self, prefix=None):
+    def list(self, prefix=None, index=None, wait=None, stale=None, stream=False, model=False, fields=None):
         """This endpoint lists all known jobs in the system registered with Nomad.
 
         :param prefix (string: "") - Specifies a string to filter jobs on based on an index prefix. This is specified as a querystring parameter.
+        :param index (int: None) - Specifies the last seen X-Nomad-Index. When given the request blocks until the index changes or *wait* expires and a tuple of (index, data) is returned. Use 0 for the first request of a watch loop.
+        :param wait (string|int: None) - Specifies the maximum time to block when *index* is given, as a duration ("5m") or in seconds.
+        :param stale (bool: None) - Specifies whether any server may answer (a stale read) rather than only the leader, spreading reads across the servers. Defaults to the client's stale setting. Use index=0 to be returned the Index, whose last_contact and known_leader bound how stale the data may be.
+        :param stream (bool: false) - If set, the jobs are returned as an iterator, decoded one at a time as they are read off the socket, so memory use does not grow with the number of jobs. Blocking queries still block, but no index is returned.
+        :param model (bool: false) - If set, the jobs are returned as nomad_alt.models.JobStub objects, which keep their fields in slots and need a fraction of the memory of dicts.
+        :param fields (list: None) - If set, only these fields of each job are decoded, as dotted paths such as "ID" or "JobSummary.Summary.*.Running", see nomad_alt.projection. Nomad has no way of selecting fields, so the full response is still transferred.
 
         :return application/json
 """
         params = {}
         if prefix is not None:
             params['prefix'] = prefix
+        blocking(params, index, wait, stale)
+        if stream:
+            return self.agent.http.stream(
+                CB.stream(map=JobStub if model else None, decode='Payload', fields=fields, allow_404=False),
+                '/v1/jobs', params=params)
         return self.agent.http.get(
-            CB.json(index=False, decode='Payload', allow_404=False),
+            CB.json(index=index, map=JobStub.from_list if model else None, decode='Payload', fields=fields, allow_404=False),
             '/v1/jobs', params=params)
 
+    def iterate(self, prefix=None, per_page=100, prefetch=True, model=False, fields=None):
+        """Iterates over all known jobs, fetching them from Nomad one page at a time.
+
+        :param prefix (string: "") - Specifies a string to filter jobs on based on an index prefix.
+        :param per_page (int: 100) - Specifies the number of jobs to request per page.
+        :param prefetch (bool: true) - If set, the next page is requested while the current one is being iterated over.
+        :param model (bool: false) - If set, the jobs are returned as nomad_alt.models.JobStub objects, see list.
+        :param fields (list: None) - If set, only these fields of each job are decoded, see list.
+
+        :return an iterator of jobs (an async iterator for the tornado and asyncio clients)
+"""
+        params = {}
+        if prefix is not None:
+            params['prefix'] = prefix
+        return self.agent.http.paginate(
+            CB.page(map=JobStub if model else None, decode='Payload', fields=fields),
+            '/v1/jobs', params=params,
+            per_page=per_page, prefetch=prefetch)
+
     def create(self, job_dict, **kwargs):
         """This endpoint creates (aka "registers") a new job in the system.
 
@@ -54,89 +81,197 @@ class Jobs(object):
 """
         path = '/v1/jobs'
         params = kwargs
-        data = dumps(job_dict)
+        data = self.agent.http.codec.dumps(job_dict)
         return self.agent.http.post(
             CB.json(), path, params=params, data=data)
 
-    def read(self, job_id):
+    def register_many(self, jobs, concurrency=8, ordered=False, plan=False, **kwargs):
+        """Registers many jobs at once, with up to *concurrency* requests in flight. *jobs* is consumed as the jobs are registered, so it may be a generator of any number of jobs.
+
+        :param jobs (iterable: <required>) - Specifies the JSON definitions of the jobs, each either as for create ({"Job": {...}}) or the job itself.
+        :param concurrency (int: 8) - Specifies the maximum number of concurrent requests.
+        :param ordered (bool: false) - If set, results are returned in the order of *jobs*, otherwise as they complete.
+        :param plan (bool: false) - If set, each job is planned first and only registered if the plan shows a difference to the job Nomad has. It is then registered with EnforceIndex at the JobModifyIndex it was planned against, so a job changed in the meantime fails rather than being overwritten. Without *plan* a job's own EnforceIndex and JobModifyIndex are sent as given.
+        :param kwargs - Specifies further fields of each registration, e.g. PolicyOverride=True.
+
+        :return an iterator (an async iterator for the tornado and asyncio clients) of nomad_alt.base.Result(id, data, error) tuples, by job ID. *data* is the response of the registration, with its EvalID and Warnings, or for a job skipped for having no changes the response of its plan, which has no EvalID. A job that fails to plan or register, e.g. on a check-and-set conflict, has its NomadException in *error*, and does not abort the others.
+"""
+        return self.agent.http.many(
+            (self._register_call(job, plan, kwargs) for job in jobs),
+            concurrency=concurrency, ordered=ordered)
+
+    def _register_call(self, job, plan, kwargs):
+        spec = job.get('Job', job)
+        body = dict(job) if 'Job' in job else {'Job': spec}
+        body.update(kwargs)
+        dumps = self.agent.http.codec.dumps
+        register = CB.json(allow_404=False)
+        if not plan:
+            return Call(spec['ID'], register, '/v1/jobs', None, 'POST', dumps(body))
+
+        def planned(response):
+            if (response.get('Diff') or {}).get('Type') == 'None':
+                return response
+            body.setdefault('EnforceIndex', True)
+            body.setdefault('JobModifyIndex', response.get('JobModifyIndex') or 0)
+            return Call(spec['ID'], register, '/v1/jobs', None, 'POST', dumps(body))
+
+        plan_body = {'Job': spec, 'Diff': True}
+        if 'PolicyOverride' in body:
+            plan_body['PolicyOverride'] = body['PolicyOverride']
+        return Call(
+            spec['ID'], CB.json(map=planned, allow_404=False),
+            Path('/v1/job/%s/plan', spec['ID']), None, 'POST', dumps(plan_body))
+
+    def read(self, job_id, index=None, wait=None, stale=None, fields=None):
         """This endpoint reads information about a single job for its specification and status.
 
         :param job_id (string: <required>) - Specifies the ID of the job (as specified in the job file during submission). This is specified as part of the path.
+        :param index (int: None) - Specifies the last seen X-Nomad-Index, see list.
+        :param wait (string|int: None) - Specifies the maximum time to block when *index* is given.
+        :param stale (bool: None) - Specifies whether any server may answer, see list.
+        :param fields (list: None) - If set, only these fields of the job are decoded, see list.
 
         :return application/json
 """
+        params = blocking({}, index, wait, stale)
         return self.agent.http.get(
-            CB.json(index=False, allow_404=False),
-            '/v1/job/%s' % job_id)
+            CB.json(index=index, fields=fields, allow_404=False),
+            Path('/v1/job/%s', job_id), params=params)
+
+    def read_many(self, job_ids, concurrency=8, ordered=True):
+        """Reads many jobs at once, with up to *concurrency* requests in flight.
+
+        :param job_ids (list: <required>) - Specifies the IDs of the jobs to read.
+        :param concurrency (int: 8) - Specifies the maximum number of concurrent requests.
+        :param ordered (bool: true) - If set, results are returned in the order of *job_ids*, otherwise as they complete.
+
+        :return an iterator (an async iterator for the tornado and asyncio clients) of nomad_alt.base.Result(id, data, error) tuples. A job that can not be read has its NotFound or ACLPermissionDenied in *error*, and does not abort the others.
+"""
+        return self.agent.http.many(
+            ((job_id, CB.json(allow_404=False), Path('/v1/job/%s', job_id), None)
+             for job_id in job_ids),
+            concurrency=concurrency, ordered=ordered)
+
+    def contains_many(self, job_ids, stale=None):
+        """Checks which of many jobs exist, with a single request listing only the jobs sharing the longest common prefix of *job_ids*, of which only the IDs are decoded. Jobs sharing no prefix are listed by the prefix of each group of them starting with the same character, one list after the other, or should that take more than nomad_alt.base.MAX_PREFIX_LISTS lists, by a single list of every job. `job_id in nomad.jobs` does the same for one job.
+
+        :param job_ids (list: <required>) - Specifies the IDs of the jobs to look for.
+        :param stale (bool: None) - Specifies whether any server may answer, see list. With a response cache (see Nomad) repeated checks are answered from it while the jobs are unchanged.
 
-    def versions(self, job_id):
+        :return a dict of each of *job_ids* to whether the job exists. A server that can not answer raises its NomadException (or the transport's error) rather than reporting the jobs missing.
+"""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return self.agent.http.resolve({})
+        params = blocking({}, stale=stale)
+        return self.agent.http.chain(
+            CB.listed(job_ids, prefixes(job_ids), '/v1/jobs', params))
+
+    def versions(self, job_id, index=None, wait=None, stale=None):
         """This endpoint reads information about all versions of a job.
 
 :job_id (string: <required>) - Specifies the ID of the job (as specified in the job file during submission). This is specified as part of the path.
 
+:index (int: None) - Specifies the last seen X-Nomad-Index, see list.
+
+:wait (string|int: None) - Specifies the maximum time to block when index is given.
+:stale (bool: None) - Specifies whether any server may answer, see list.
+
         :return application/json
 """
+        params = blocking({}, index, wait, stale)
         return self.agent.http.get(
-            CB.json(index=False, allow_404=False),
-            '/v1/job/%s/versions' % job_id)
+            CB.json(index=index, allow_404=False),
+            Path('/v1/job/%s/versions', job_id), params=params)
 
-    def allocations(self, job_id, all=False):
+    def allocations(self, job_id, all=False, index=None, wait=None, stale=None):
         """This endpoint reads information about a single job's allocations.
 
 :job_id (string: <required>) - Specifies the ID of the job (as specified in the job file during submission). This is specified as part of the path.
 
 all (bool: false) - Specifies whether the list of allocations should include allocations from a previously registered job with the same ID. This is possible if the job is deregistered and reregistered.
 
+:index (int: None) - Specifies the last seen X-Nomad-Index, see list.
+
+:wait (string|int: None) - Specifies the maximum time to block when index is given.
+:stale (bool: None) - Specifies whether any server may answer, see list.
+
         :return application/json
 """
         params = {'all': all}
+        blocking(params, index, wait, stale)
         return self.agent.http.get(
-            CB.json(index=False, allow_404=False),
-            '/v1/job/%s/allocations' % job_id, params=params)
+            CB.json(index=index, allow_404=False),
+            Path('/v1/job/%s/allocations', job_id), params=params)
 
-    def evaluations(self, job_id):
+    def evaluations(self, job_id, index=None, wait=None, stale=None):
         """This endpoint reads information about a single job's evaluations
 
 :job_id (string: <required>) - Specifies the ID of the job (as specified in the job file during submission). This is specified as part of the path.
 
+:index (int: None) - Specifies the last seen X-Nomad-Index, see list.
+
+:wait (string|int: None) - Specifies the maximum time to block when index is given.
+:stale (bool: None) - Specifies whether any server may answer, see list.
+
         :return application/json
 """
+        params = blocking({}, index, wait, stale)
         return self.agent.http.get(
-            CB.json(index=False, allow_404=False),
-            '/v1/job/%s/evaluations' % job_id)
+            CB.json(index=index, allow_404=False),
+            Path('/v1/job/%s/evaluations', job_id), params=params)
 
-    def deployments(self, job_id):
+    def deployments(self, job_id, index=None, wait=None, stale=None):
         """This endpoint lists a single job's deployments
 
 :job_id (string: <required>) - Specifies the ID of the job (as specified in the job file during submission). This is specified as part of the path.
 
+:index (int: None) - Specifies the last seen X-Nomad-Index, see list.
+
+:wait (string|int: None) - Specifies the maximum time to block when index is given.
+:stale (bool: None) - Specifies whether any server may answer, see list.
+
         :return application/json
 """
+        params = blocking({}, index, wait, stale)
         return self.agent.http.get(
-            CB.json(index=False, allow_404=False),
-            '/v1/job/%s/deployments' % job_id)
+            CB.json(index=index, allow_404=False),
+            Path('/v1/job/%s/deployments', job_id), params=params)
 
-    def most_recent_deployment(self, job_id):
+    def most_recent_deployment(self, job_id, index=None, wait=None, stale=None):
         """This endpoint returns a single job's most recent deployment.
 
 :job_id (string: <required>) - Specifies the ID of the job (as specified in the job file during submission). This is specified as part of the path.
 
+:index (int: None) - Specifies the last seen X-Nomad-Index, see list.
+
+:wait (string|int: None) - Specifies the maximum time to block when index is given.
+:stale (bool: None) - Specifies whether any server may answer, see list.
+
         :return application/json
 """
+        params = blocking({}, index, wait, stale)
         return self.agent.http.get(
-            CB.json(index=False, allow_404=False),
-            '/v1/job/%s/deployment' % job_id)
+            CB.json(index=index, allow_404=False),
+            Path('/v1/job/%s/deployment', job_id), params=params)
 
-    def summary(self, job_id):
+    def summary(self, job_id, index=None, wait=None, stale=None):
         """This endpoint reads summary information about a job.
 
 :job_id (string: <required>) - Specifies the ID of the job (as specified in the job file during submission). This is specified as part of the path.
 
+:index (int: None) - Specifies the last seen X-Nomad-Index, see list.
+
+:wait (string|int: None) - Specifies the maximum time to block when index is given.
+:stale (bool: None) - Specifies whether any server may answer, see list.
+
         :return application/json
 """
+        params = blocking({}, index, wait, stale)
         return self.agent.http.get(
-            CB.json(index=False, allow_404=False),
-            '/v1/job/%s/summary' % job_id)
+            CB.json(index=index, allow_404=False),
+            Path('/v1/job/%s/summary', job_id), params=params)
 
     def update(self, job_id, job_dict, **kwargs):
         """This endpoint registers a new job or updates an existing job.
@@ -157,7 +292,7 @@ all (bool: false) - Specifies whether the list of allocations should include all
         params.update(job_dict)
         return self.agent.http.post(
             CB.json(index=False, allow_404=False),
-            '/v1/job/%s' % job_id, data=dumps(params))
+            Path('/v1/job/%s', job_id), data=self.agent.http.codec.dumps(params))
 
     def dispatch(self, job_id, **kwargs):
         """This endpoint dispatches a new instance of a parameterized job.
@@ -166,7 +301,7 @@ all (bool: false) - Specifies whether the list of allocations should include all
 """
         return self.agent.http.post(
             CB.json(index=False, allow_404=False),
-            '/v1/job/%s/dispatch' % job_id, data=kwargs)
+            Path('/v1/job/%s/dispatch', job_id), data=kwargs)
 
     # TODO - I don't think this is working yet
     def revert(self, job_id, version=0, prior=None, **kwargs):
@@ -186,7 +321,7 @@ all (bool: false) - Specifies whether the list of allocations should include all
 
         return self.agent.http.post(
             CB.json(index=False, allow_404=False),
-            '/v1/job/%s/revert' % job_id, data=dumps(params))
+            Path('/v1/job/%s/revert', job_id), data=self.agent.http.codec.dumps(params))
 
     # TODO - I don't think this is working yet
     def stability(self, job_id, version=0, stable=False, **kwargs):
@@ -206,7 +341,7 @@ all (bool: false) - Specifies whether the list of allocations should include all
 
         return self.agent.http.post(
             CB.json(index=False, allow_404=False),
-            '/v1/job/%s/stability' % job_id, data=dumps(params))
+            Path('/v1/job/%s/stability', job_id), data=self.agent.http.codec.dumps(params))
 
     def evaluate(self, job_id):
         """This endpoint creates a new evaluation for the given job. This can be used to force run the scheduling logic if necessary.
@@ -215,7 +350,7 @@ all (bool: false) - Specifies whether the list of allocations should include all
 """
         return self.agent.http.post(
             CB.json(index=False, allow_404=False),
-            '/v1/job/%s/evaluate' % job_id)
+            Path('/v1/job/%s/evaluate', job_id))
 
     def plan(self, job_id, job_dict, **kwargs):
         """This endpoint invokes a dry-run of the scheduler for the job.
@@ -238,7 +373,7 @@ PolicyOverride (bool: false) - If set, any soft mandatory Sentinel policies will
 
         return self.agent.http.post(
             CB.json(index=False),
-            '/v1/job/%s/plan' % job_id, data=dumps(params))
+            Path('/v1/job/%s/plan', job_id), data=self.agent.http.codec.dumps(params))
 
     def force_periodic(self, job_id):
         """This endpoint forces a new instance of the periodic job. A new instance will be created even if it violates the job's prohibit_overlap settings. As such, this should be only used to immediately run a periodic job.
@@ -247,7 +382,7 @@ PolicyOverride (bool: false) - If set, any soft mandatory Sentinel policies will
 """
         return self.agent.http.post(
             CB.json(index=False),
-            '/v1/job/%s/periodic/force' % job_id)
+            Path('/v1/job/%s/periodic/force', job_id))
 
     def stop(self, job_id, **kwargs):
         """This endpoint deregisters a job, and stops all allocations part of it.
@@ -260,4 +395,4 @@ PolicyOverride (bool: false) - If set, any soft mandatory Sentinel policies will
 """
         params = kwargs
         return self.agent.http.delete(
-            CB.json(), '/v1/job/%s' % job_id, params=params)
+            CB.json(), Path('/v1/job/%s', job_id), params=params)
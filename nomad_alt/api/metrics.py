@@ -8,16 +8,27 @@ class Metrics(object):
     def __init__(self, agent):
         self.agent = agent
 
-    def fetch(self, format=None):
+    def fetch(self, format=None, columnar=False, parser=None):
         """The /metrics endpoint returns metrics for the current Nomad process.
 
         :param format (string: "") - Specifies the metrics format to be other than the JSON default. Currently, only prometheus is supported as an alterntaive format. This is specified as a querystring parameter.
+        :param columnar - Return the JSON format as a nomad_alt.telemetry.Frame, as the prometheus format always is, rather than a dict.
+        :param parser - The nomad_alt.telemetry.Parser to parse with, reused across scrapes of the same agent to share their names and labels.
 
-        :return application/json
+        :return application/json, or a nomad_alt.telemetry.Frame
 """
         params = {}
         if format is not None:
             params['format'] = format
+        if format == 'prometheus' or columnar:
+            from nomad_alt.telemetry import Parser
+            parser = parser or Parser()
+        if format == 'prometheus':
+            raw = CB.raw(allow_404=False)
+            return self.agent.http.get(
+                lambda response: parser.prometheus(raw(response)),
+                '/v1/metrics', params=params)
         return self.agent.http.get(
-            CB.json(index=False, allow_404=False),
+            CB.json(index=False, allow_404=False,
+                    map=parser.json if columnar else None),
             '/v1/metrics', params=params)
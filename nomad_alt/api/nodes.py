@@ -1,7 +1,20 @@
+import re
+
 import nomad_alt
 import nomad_alt.exceptions
-from nomad_alt.base import CB
-from json import dumps, loads
+from nomad_alt.base import CB, blocking, prefixes, synchronous, Path, seconds
+from nomad_alt.models import NodeStub
+
+_UUID_PREFIX = re.compile(r'[0-9a-f-]*')
+
+
+def _hex_prefix(prefix):
+    # Nomad decodes a node ID prefix as hex, so only whole bytes of it
+    prefix = _UUID_PREFIX.match(prefix).group().rstrip('-')
+    if len(prefix.replace('-', '')) % 2:
+        prefix = prefix[:-1]
+    return prefix
+
 
 class Nodes(object):
     """"""
@@ -10,56 +23,104 @@ class Nodes(object):
         self.agent = agent
 
     def __contains__(self, item):
-
-        try:
-            j = self.read(item)
-            return True
-        except nomad_alt.exceptions.NomadException:
-            return False
+        """`node_id in nomad.nodes`, with the blocking client only: use
+        contains_many with the tornado and asyncio clients."""
+        return synchronous(self.contains_many([item]), 'contains_many')[item]
 
     def __getitem__(self, item):
 
         try:
             j = self.read(item)
             return j
-        except nomad_alt.exceptions.NomadException:
-            raise KeyError
+        except nomad_alt.exceptions.NotFound:
+            raise KeyError(item)
 
-    def list(self, prefix=None):
+    def list(self, prefix=None, index=None, wait=None, stale=None, stream=False, model=False, fields=None):
         """This endpoint lists all nodes registered with Nomad.
 
         :param prefix (string: "") - Specifies a string to filter nodes on based on an index prefix. This is specified as a querystring parameter.
+        :param index (int: None) - Specifies the last seen X-Nomad-Index. When given the request blocks until the index changes or *wait* expires and a tuple of (index, data) is returned. Use 0 for the first request of a watch loop.
+        :param wait (string|int: None) - Specifies the maximum time to block when *index* is given, as a duration ("5m") or in seconds.
+        :param stale (bool: None) - Specifies whether any server may answer (a stale read) rather than only the leader, spreading reads across the servers. Defaults to the client's stale setting. Use index=0 to be returned the Index, whose last_contact and known_leader bound how stale the data may be.
+        :param stream (bool: false) - If set, the nodes are returned as an iterator, decoded one at a time as they are read off the socket, so memory use does not grow with the size of the cluster. Blocking queries still block, but no index is returned.
+        :param model (bool: false) - If set, the nodes are returned as nomad_alt.models.NodeStub objects, which keep their fields in slots and need a fraction of the memory of dicts.
+        :param fields (list: None) - If set, only these fields of each node are decoded, as dotted paths such as "ID" or "Drivers.*.Healthy", see nomad_alt.projection. Nomad has no way of selecting fields, so the full response is still transferred.
 
         :return application/json
 """
         params = {}
         if prefix is not None:
             params['prefix'] = prefix
+        blocking(params, index, wait, stale)
+        if stream:
+            return self.agent.http.stream(
+                CB.stream(map=NodeStub if model else None, decode='Payload', fields=fields, allow_404=False),
+                '/v1/nodes', params=params)
         return self.agent.http.get(
-            CB.json(index=False, decode='Payload', allow_404=False),
+            CB.json(index=index, map=NodeStub.from_list if model else None, decode='Payload', fields=fields, allow_404=False),
             '/v1/nodes', params=params)
 
-    def read(self, node_id):
+    def read(self, node_id, index=None, wait=None, stale=None, fields=None):
         """This endpoint reads information about a single job for its specification and status.
 
         :param :node_id (string: <required>)- Specifies the ID of the node. This must be the full UUID, not the short 8-character one. This is specified as part of the path.
+        :param index (int: None) - Specifies the last seen X-Nomad-Index, see list.
+        :param wait (string|int: None) - Specifies the maximum time to block when *index* is given.
+        :param stale (bool: None) - Specifies whether any server may answer, see list.
+        :param fields (list: None) - If set, only these fields of the node are decoded, see list.
 
         :return application/json
 """
+        params = blocking({}, index, wait, stale)
         return self.agent.http.get(
-            CB.json(index=False, allow_404=False),
-            '/v1/node/%s' % node_id)
+            CB.json(index=index, fields=fields, allow_404=False),
+            Path('/v1/node/%s', node_id), params=params)
 
-    def allocations(self, node_id):
+    def read_many(self, node_ids, concurrency=8, ordered=True):
+        """Reads many nodes at once, with up to *concurrency* requests in flight.
+
+        :param node_ids (list: <required>) - Specifies the IDs of the nodes to read.
+        :param concurrency (int: 8) - Specifies the maximum number of concurrent requests.
+        :param ordered (bool: true) - If set, results are returned in the order of *node_ids*, otherwise as they complete.
+
+        :return an iterator (an async iterator for the tornado and asyncio clients) of nomad_alt.base.Result(id, data, error) tuples. A node that can not be read has its NotFound or ACLPermissionDenied in *error*, and does not abort the others.
+"""
+        return self.agent.http.many(
+            ((node_id, CB.json(allow_404=False), Path('/v1/node/%s', node_id), None)
+             for node_id in node_ids),
+            concurrency=concurrency, ordered=ordered)
+
+    def contains_many(self, node_ids, stale=None):
+        """Checks which of many nodes exist, with a single request listing only the nodes sharing the longest common prefix of *node_ids*, of which only the IDs are decoded. Nodes sharing no prefix are listed by the prefix of each group of them starting with the same byte, one list after the other, or should that take more than nomad_alt.base.MAX_PREFIX_LISTS lists, by a single list of every node. `node_id in nomad.nodes` does the same for one node.
+
+        :param node_ids (list: <required>) - Specifies the IDs of the nodes to look for.
+        :param stale (bool: None) - Specifies whether any server may answer, see list. With a response cache (see Nomad) repeated checks are answered from it while the nodes are unchanged.
+
+        :return a dict of each of *node_ids* to whether the node exists. A server that can not answer raises its NomadException (or the transport's error) rather than reporting the nodes missing.
+"""
+        node_ids = list(node_ids)
+        if not node_ids:
+            return self.agent.http.resolve({})
+        params = blocking({}, stale=stale)
+        return self.agent.http.chain(CB.listed(
+            node_ids, prefixes(node_ids, width=2, trim=_hex_prefix),
+            '/v1/nodes', params))
+
+    def allocations(self, node_id, index=None, wait=None, stale=None, fields=None):
         """This endpoint lists all of the allocations for the given node. This can be used to determine what allocations have been scheduled on the node, their current status, and the values of dynamically assigned resources, like ports.
 
         :param: :node_id (string: <required>)- Specifies the UUID of the node. This must be the full UUID, not the short 8-character one. This is specified as part of the path.
+        :param: index (int: None) - Specifies the last seen X-Nomad-Index, see list.
+        :param: wait (string|int: None) - Specifies the maximum time to block when *index* is given.
+        :param: stale (bool: None) - Specifies whether any server may answer, see list.
+        :param: fields (list: None) - If set, only these fields of each allocation are decoded, see list. The allocations are whole, not stubs, so this saves the most here.
 
         :return application/json
 """
+        params = blocking({}, index, wait, stale)
         return self.agent.http.get(
-            CB.json(index=False, allow_404=False),
-            '/v1/node/%s/allocations' % node_id)
+            CB.json(index=index, fields=fields, allow_404=False),
+            Path('/v1/node/%s/allocations', node_id), params=params)
 
     def evaluate(self, node_id):
         """This endpoint creates a new evaluation for the given node. This can be used to force a run of the scheduling logic.
@@ -70,22 +131,35 @@ class Nodes(object):
 """
         return self.agent.http.get(
             CB.json(index=False, allow_404=False),
-            '/v1/node/%s/evaluate' % node_id)
+            Path('/v1/node/%s/evaluate', node_id))
 
-    def drain(self, node_id, enabled=True):
-        """This endpoint toggles the drain mode of the node. When draining is enabled, no further allocations will be assigned to this node, and existing allocations will be migrated to new nodes.
+    def drain(self, node_id, enabled=True, deadline=None, ignore_system_jobs=False, mark_eligible=None, meta=None):
+        """This endpoint toggles the drain mode of the node. When draining is enabled, no further allocations will be assigned to this node, and existing allocations will be migrated to new nodes. See nomad_alt.drain.DrainOrchestrator for draining many nodes.
 
         :param: :node_id (string: <required>)- Specifies the UUID of the node. This must be the full UUID, not the short 8-character one. This is specified as part of the path.
-        :param: enable (bool: default True) - Specifies if drain mode should be enabled. This is specified as a query string parameter.
+        :param: enabled (bool: default True) - Specifies if drain mode should be enabled.
+        :param: deadline (string|int: None) - Specifies how long allocations may take to migrate, as a duration ("1h") or in seconds, after which those left are stopped. None for no deadline, -1 to stop them all at once.
+        :param: ignore_system_jobs (bool: False) - Specifies whether the allocations of system jobs are left running on the node.
+        :param: mark_eligible (bool: None) - Specifies whether the node is made eligible for scheduling again. Defaults to not *enabled*, so that disabling the drain makes the node eligible as it always has.
+        :param: meta (dict: None) - Specifies metadata recorded with the drain.
 
         :return application/json
 """
-        params = {
-            'enabled': 'true' if enabled else 'false'
-        }
+        spec = None
+        if enabled:
+            if deadline is None:
+                deadline = 0
+            elif deadline != -1:
+                deadline = int(seconds(deadline) * 1e9)
+            spec = {'Deadline': deadline, 'IgnoreSystemJobs': ignore_system_jobs}
+        if mark_eligible is None:
+            mark_eligible = not enabled
+        data = {'DrainSpec': spec, 'MarkEligible': mark_eligible}
+        if meta is not None:
+            data['Meta'] = meta
         return self.agent.http.post(
             CB.json(index=False, allow_404=False),
-            '/v1/node/%s/drain' % node_id, params=params)
+            Path('/v1/node/%s/drain', node_id), data=self.agent.http.codec.dumps(data))
 
     def purge(self, node_id):
         """This endpoint purges a node from the system. Nodes can still join the cluster if they are alive.
@@ -96,4 +170,4 @@ class Nodes(object):
 """
         return self.agent.http.post(
             CB.json(index=False, allow_404=False),
-            '/v1/node/%s/purge' % node_id)
+            Path('/v1/node/%s/purge', node_id))
@@ -1,9 +1,11 @@
 import abc
 import base64
 import collections
-import json
+import functools
+import importlib
 from logging import getLogger
 import os
+from timeit import default_timer
 try:
     from urlparse import urlparse
 except ImportError:
@@ -12,7 +14,11 @@ except ImportError:
 import six
 from six.moves import urllib
 
+from nomad_alt.codec import STDLIB, json_codec
+from nomad_alt.decoders import JSONArrayDecoder
 from nomad_alt.exceptions import NomadException, BadRequest, ACLDisabled, ACLPermissionDenied, NotFound
+from nomad_alt.projection import Projection
+from nomad_alt.servers import Servers
 
 
 
@@ -133,7 +139,215 @@ class Check(object):
         return ret
 
 
-Response = collections.namedtuple('Response', ['code', 'headers', 'body'])
+class Response(collections.namedtuple(
+        'Response', ['code', 'headers', 'body', 'codec'])):
+    """
+    A response as handed to a callback. *body* is the raw body, as bytes, or
+    text, and *codec* the JSONCodec to decode it with, by default the
+    standard library's.
+    """
+    __slots__ = ()
+
+    def __new__(klass, code, headers, body, codec=None):
+        return super(Response, klass).__new__(
+            klass, code, headers, body, codec)
+
+    @property
+    def text(self):
+        if isinstance(self.body, six.binary_type):
+            return self.body.decode('utf-8')
+        return self.body
+
+    def json(self):
+        return (self.codec or STDLIB).loads(self.body)
+
+
+class Path(str):
+    """
+    A request path that remembers the template it was rendered from, e.g.
+    Path('/v1/job/%s', job_id). Instrumentation hooks use the template to
+    group requests by endpoint rather than by object.
+    """
+
+    def __new__(klass, template, *args):
+        path = str.__new__(klass, template % args)
+        path.template = template
+        return path
+
+
+#
+# Instrumentation
+
+RequestEvent = collections.namedtuple('RequestEvent', [
+    'method', 'path', 'template', 'status', 'bytes_out', 'bytes_in',
+    'timings'])
+
+
+class Hook(object):
+    """
+    Base class for request instrumentation. Register an instance with
+    HTTPClient.add_hook and override either method.
+
+    A client with no hooks registered does no timing or bookkeeping at all.
+    """
+
+    def before(self, method, path, template, bytes_out):
+        """
+        Called just before a request is sent. *template* is the endpoint's
+        path template (e.g. '/v1/job/%s'), *path* the rendered path.
+        """
+
+    def after(self, event):
+        """
+        Called once a response has been received and handed to the endpoint's
+        callback, whether or not the callback raised. *event* is a
+        RequestEvent whose timings dict holds, in seconds:
+
+        *connect* time to establish the connection, *first_byte* time until
+        the response headers arrived, *decode* time spent in the callback
+        decoding the body and *total* for the whole request. A timing is None
+        when the transport can not measure it.
+
+        *event.bytes_in* is the size of the body as received, i.e. compressed
+        where the transport can tell, see HTTPClient.compression.
+        """
+
+
+#
+# Blocking queries
+
+# Nomad blocks for five minutes when an index is supplied without a wait
+DEFAULT_WAIT = 300
+
+# Nomad never blocks for longer than ten minutes
+MAX_WAIT = 600
+
+_DURATION_UNITS = (('ms', 0.001), ('us', 0.000001), ('ns', 0.000000001),
+                   ('h', 3600), ('m', 60), ('s', 1))
+
+
+def seconds(duration):
+    """
+    Converts *duration*, either a number of seconds or a Go style duration
+    string such as "5m", "30s" or "1m30s", to a float number of seconds.
+    """
+    if isinstance(duration, six.integer_types + (float,)):
+        return float(duration)
+    total = 0.0
+    rest = duration.strip()
+    while rest:
+        i = 0
+        while i < len(rest) and (rest[i].isdigit() or rest[i] == '.'):
+            i += 1
+        if i == 0:
+            raise ValueError('invalid duration %r' % duration)
+        value = float(rest[:i])
+        rest = rest[i:]
+        for unit, factor in _DURATION_UNITS:
+            if rest.startswith(unit):
+                total += value * factor
+                rest = rest[len(unit):]
+                break
+        else:
+            raise ValueError('invalid duration %r' % duration)
+    return total
+
+
+def synchronous(result, alternative):
+    """
+    Returns *result*, what a blocking client returned, for the dunder
+    methods of endpoints (e.g. `in`), which can not wait for a Future or
+    coroutine. With the tornado or asyncio clients raises a TypeError
+    pointing to *alternative* instead.
+    """
+    if hasattr(result, 'add_done_callback') or hasattr(result, '__await__'):
+        if hasattr(result, 'close'):
+            # the coroutine will never be awaited
+            result.close()
+        raise TypeError(
+            'an asynchronous client can not answer this, use %s'
+            % alternative)
+    return result
+
+
+def blocking(params, index=None, wait=None, stale=None):
+    """
+    Adds the blocking query parameters to *params*.
+
+    *index* is the last seen X-Nomad-Index. The request will block until the
+    index moves past it, or *wait* expires. An index of 0 never blocks, which
+    is how the first request of a watch loop obtains its starting index.
+
+    *wait* is the maximum time to block, either as a number of seconds or as
+    a duration string such as "5m". Nomad caps this at ten minutes.
+
+    *stale*, if not None, overrides the client's read consistency for this
+    request, see HTTPClient.query.
+    """
+    if index is not None:
+        params['index'] = int(index)
+        if wait is not None:
+            if isinstance(wait, six.integer_types + (float,)):
+                wait = '%dms' % int(min(seconds(wait), MAX_WAIT) * 1000)
+            params['wait'] = wait
+    if stale is not None:
+        params['stale'] = bool(stale)
+    return params
+
+
+# the most lists contains_many makes of IDs sharing no prefix, before it
+# lists every ID instead
+MAX_PREFIX_LISTS = 4
+
+
+def prefixes(ids, width=1, trim=None):
+    """
+    Returns the prefixes to list *ids* by: their longest common prefix or,
+    should they share none, that of each group of them starting with the
+    same *width* characters. Should that make more than MAX_PREFIX_LISTS
+    prefixes, or an empty one, returns [''] to list everything. *trim* cuts
+    a prefix down to one the endpoint accepts.
+    """
+    trim = trim or (lambda prefix: prefix)
+    prefix = trim(os.path.commonprefix(ids))
+    if prefix:
+        return [prefix]
+    groups = {}
+    for id in ids:
+        groups.setdefault(id[:width], []).append(id)
+    found = sorted(set(trim(os.path.commonprefix(group))
+                       for group in groups.values()))
+    if len(found) > MAX_PREFIX_LISTS or '' in found:
+        return ['']
+    return found
+
+
+class Index(int):
+    """
+    An X-Nomad-Index, as returned by the endpoints along with their data,
+    which also tells how up to date the server that answered was.
+
+    *last_contact* is the number of seconds since that server last heard
+    from the leader (0 for the leader itself) and *known_leader* whether it
+    knew of a leader at all. Both are None when not reported. A stale read
+    whose last_contact is too high can be retried with stale=False.
+    """
+
+    def __new__(klass, value, last_contact=None, known_leader=None):
+        index = int.__new__(klass, value)
+        index.last_contact = last_contact
+        index.known_leader = known_leader
+        return index
+
+    @classmethod
+    def of(klass, value, headers):
+        last_contact = headers.get('X-Nomad-LastContact')
+        if last_contact is not None:
+            last_contact = int(last_contact) / 1000.0
+        known_leader = headers.get('X-Nomad-KnownLeader')
+        if known_leader is not None:
+            known_leader = known_leader == 'true'
+        return klass(value, last_contact, known_leader)
 
 
 #
@@ -144,15 +358,34 @@ class CB(object):
     def __status(klass, response, allow_404=True):
         # status checking
         if response.code >= 500 and response.code < 600:
-            raise NomadException("%d %s" % (response.code, response.body))
+            raise NomadException("%d %s" % (response.code, response.text))
         if response.code == 400:
-            raise BadRequest('%d %s' % (response.code, response.body))
+            raise BadRequest('%d %s' % (response.code, response.text))
         if response.code == 401:
-            raise ACLDisabled(response.body)
+            raise ACLDisabled(response.text)
         if response.code == 403:
-            raise ACLPermissionDenied(response.body)
+            raise ACLPermissionDenied(response.text)
         if response.code == 404 and not allow_404:
-            raise NotFound(response.body)
+            raise NotFound(response.text)
+
+    @classmethod
+    def _index(klass, response, last_index=None):
+        """
+        Returns the X-Nomad-Index of *response* as an Index, sanitised for
+        use in the next blocking query.
+
+        Indexes are only ever expected to move forward. If the index goes
+        backwards (e.g. after a snapshot restore or a leader that lost state),
+        0 is returned so the caller's next request reads fresh state instead
+        of blocking on an index that will never be reached again. An index
+        below 1 is bumped to 1 so that a watch loop can not spin.
+        """
+        index = int(response.headers.get('X-Nomad-Index', 0))
+        if last_index is not None and index < last_index:
+            index = 0
+        else:
+            index = max(index, 1)
+        return Index.of(index, response.headers)
 
     @classmethod
     def bool(klass):
@@ -170,14 +403,17 @@ class CB(object):
             one=False,
             decode=False,
             is_id=False,
-            index=False):
+            index=False,
+            fields=None):
         """
         *map* is a function to apply to the final result.
 
         *allow_404* if set, None will be returned on 404, instead of raising
         NotFound.
 
-        *index* if set, a tuple of index, data will be returned.
+        *index* if set, a tuple of index, data will be returned. If *index*
+        is the (integer) index the request was made with, the returned index
+        is reset to 0 should the server's index have gone backwards.
 
         *one* returns only the first item of the list of items. empty lists are
         coerced to None.
@@ -185,13 +421,23 @@ class CB(object):
         *decode* if specified this key will be base64 decoded.
 
         *is_id* only the 'ID' field of the json object will be returned.
+
+        *fields* if specified only these fields are decoded, see
+        nomad_alt.projection.
         """
+        last_index = index if index is not True else None
+        index = index is not None and index is not False
+        projection = Projection.of(fields) if fields else None
 
         def cb(response):
             CB.__status(response, allow_404=allow_404)
             data = None
             if response.code in [200]:
-                data = json.loads(response.body)
+                if projection is not None:
+                    data = projection.loads(
+                        response.body, response.codec or STDLIB)
+                else:
+                    data = response.json()
 
                 if decode:
                     for item in data:
@@ -207,7 +453,7 @@ class CB(object):
                 if map:
                     data = map(data)
             if index:
-                return response.headers['X-Nomad-Index'], data
+                return CB._index(response, last_index), data
             return data
         return cb
 
@@ -240,12 +486,122 @@ class CB(object):
             CB.__status(response, allow_404=allow_404)
             data = None
             if response.code in [200]:
-                data = response.body
+                data = response.text
             if index:
                 return response.headers['X-Nomad-Index'], data
             return data
         return cb
 
+    @classmethod
+    def stream(klass, map=None, allow_404=True, decode=False,
+               decoder=JSONArrayDecoder, fields=None):
+        """
+        Returns a callback for HTTPClient.stream, which decodes the items of a
+        JSON array response one at a time as they arrive, or with *decoder*
+        JSONStreamDecoder the values of a newline delimited JSON response.
+
+        The callback is handed the response before its body has been read.
+        Once the status has been checked it returns the decoder to feed the
+        body through (or None on an allowed 404).
+
+        *map* is a function to apply to each item.
+
+        *decode* if specified this key of each item will be base64 decoded.
+
+        *fields* if specified each item is projected onto these fields, see
+        nomad_alt.projection, so only they are held on to.
+        """
+        projection = Projection.of(fields) if fields else None
+
+        def transform(item):
+            if projection is not None:
+                item = projection(item)
+            if decode and item.get(decode) is not None:
+                item[decode] = base64.b64decode(item[decode])
+            if map:
+                item = map(item)
+            return item
+
+        def cb(response):
+            CB.__status(response, allow_404=allow_404)
+            if response.code != 200:
+                return None
+            return decoder(
+                transform if decode or map or projection else None,
+                codec=response.codec)
+        return cb
+
+    @classmethod
+    def listed(klass, ids, prefixes, path, params=None):
+        """
+        Returns a Call listing *path* by each of *prefixes* in turn, for
+        HTTPClient.chain. The last callback returns a dict of each of *ids*
+        to whether an object of that ID was listed. Only the IDs of the
+        objects are decoded. Errors raise their NomadException rather than
+        being taken for an absence.
+        """
+        ids = list(ids)
+        prefixes = list(prefixes)
+        found = set()
+        listed = klass.json(allow_404=False, fields=['ID'])
+
+        def call(i):
+            def cb(response):
+                found.update(obj['ID'] for obj in listed(response) or ())
+                if i + 1 < len(prefixes):
+                    return call(i + 1)
+                return dict((id, id in found) for id in ids)
+            query = dict(params or {})
+            if prefixes[i]:
+                query['prefix'] = prefixes[i]
+            return Call(prefixes[i], cb, path, query)
+        return call(0)
+
+    @classmethod
+    def page(klass, map=None, decode=False, fields=None):
+        """
+        Returns a callback for HTTPClient.paginate, which decodes one page of
+        a paginated list into a tuple of the X-Nomad-NextToken (None on the
+        last page) and the page's items.
+
+        *map* is a function to apply to each item.
+
+        *decode* if specified this key of each item will be base64 decoded.
+
+        *fields* if specified only these fields are decoded.
+        """
+        items = klass.json(
+            map=(lambda data: [map(item) for item in data]) if map else None,
+            decode=decode, fields=fields)
+
+        def cb(response):
+            data = items(response) or []
+            return response.headers.get('X-Nomad-NextToken') or None, data
+        return cb
+
+
+#
+# Concurrent requests
+
+# the outcome of one of the requests made by HTTPClient.many: *data* on
+# success, otherwise the NomadException (e.g. NotFound) in *error*
+Result = collections.namedtuple('Result', ['id', 'data', 'error'])
+
+# a request for HTTPClient.many to make, a GET unless *method* says otherwise
+Call = collections.namedtuple(
+    'Call', ['id', 'callback', 'path', 'params', 'method', 'data'])
+Call.__new__.__defaults__ = (None, 'GET', None)
+
+
+#
+# Response compression
+
+# the Accept-Encoding sent for each supported compression mode
+COMPRESSION = {
+    'gzip': 'gzip',
+    None: 'identity',
+}
+
 
 class HTTPClient(six.with_metaclass(abc.ABCMeta, object)):
 
@@ -262,16 +618,294 @@ class HTTPClient(six.with_metaclass(abc.ABCMeta, object)):
         self.key = key
         self.token = token
         self.ca = ca
+        self.hooks = []
+        self.cache = None
+        self.servers = Servers([self.base_uri], scheme, port)
+        self.retry = None
+        self.stale = False
+        self.compression = 'gzip'
+        self.codec = STDLIB
 
         # self.logger.warn("verify: %s", verify)
 
+    def add_hook(self, hook):
+        """
+        Registers *hook*, a Hook instance, to be told about every request.
+        """
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
 
-    def uri(self, path, params=None):
-        uri = self.base_uri + urllib.parse.quote(path, safe='/:')
+    def before_request(self, method, path, data=None):
+        """
+        Notifies the registered hooks that a request is about to be sent.
+        Transports only call this when self.hooks is not empty. Returns the
+        request details and start time to hand on to after_request.
+        """
+        template = getattr(path, 'template', path)
+        bytes_out = len(data) if data else 0
+        for hook in self.hooks:
+            hook.before(method, path, template, bytes_out)
+        return (method, path, template, bytes_out, default_timer())
+
+    def after_request(self, request, callback, response, bytes_in, timings):
+        """
+        Applies *callback* to *response*, timing the decode, and notifies the
+        registered hooks. *timings* holds whatever the transport measured.
+        """
+        decoding = default_timer()
+        try:
+            return callback(response)
+        finally:
+            timings['decode'] = default_timer() - decoding
+            self.emit(request, response.code, bytes_in, timings)
+
+    def emit(self, request, status, bytes_in, timings):
+        """
+        Notifies the registered hooks that the request started by
+        before_request has completed.
+        """
+        method, path, template, bytes_out, started = request
+        timings.setdefault('connect', None)
+        timings.setdefault('first_byte', None)
+        timings.setdefault('decode', None)
+        timings['total'] = default_timer() - started
+        event = RequestEvent(
+            method, path, template, status, bytes_out, bytes_in, timings)
+        for hook in self.hooks:
+            hook.after(event)
+
+    def uri(self, path, params=None, server=None):
+        uri = (server or self.base_uri) + urllib.parse.quote(path, safe='/:')
         if params:
-            uri = '%s?%s' % (uri, urllib.parse.urlencode(params))
+            uri = '%s?%s' % (uri, urllib.parse.urlencode(params, doseq=True))
         return uri
 
+    def query(self, method, params):
+        """
+        Applies the read consistency to the *params* of a *method* request,
+        returning the params to send and whether the read may be stale.
+
+        A GET is a stale read if it asks for one (see blocking), or if the
+        client reads stale by default (Nomad(stale=True)) and it does not ask
+        otherwise. Any server can answer a stale read from its own copy of
+        the state, instead of forwarding it to the leader.
+        """
+        if method != 'GET':
+            return params, False
+        stale = self.stale
+        if params and 'stale' in params:
+            params = dict(params)
+            stale = params.pop('stale')
+        if stale:
+            params = dict(params or {})
+            params['stale'] = ''
+        return params, stale
+
+    def attempts(self, method, stale=False):
+        """
+        Returns the (server, delay) of each attempt a *method* request may
+        make, see nomad_alt.servers.Retry. The transport waits *delay*
+        seconds before sending the attempt to *server*, a base URI, and
+        reports the outcome to self.servers.
+
+        Consistent reads and writes go to the servers in order. Stale reads
+        are spread over them, favouring the fastest, see Servers.spread.
+
+        Without a retry policy every server is tried once, in order, but only
+        for as long as the connection can not be established.
+        """
+        servers = self.servers.spread() if stale else self.servers.ordered()
+        if self.retry is None:
+            return [(server, 0) for server in servers]
+        n = len(servers)
+        return [(servers[i % n], self.retry.delay(i // n))
+                for i in range(self.retry.attempts)]
+
+    def retryable(self, method, sent=True, status=None):
+        """
+        Whether a failed attempt at a *method* request may be retried. *sent*
+        is False when the request never left the client, *status* is the
+        status of the response, if there was one.
+        """
+        if not sent:
+            return True
+        retry = self.retry
+        if retry is None or method not in retry.methods:
+            return False
+        return status is None or status in retry.statuses
+
+    @property
+    def accept_encoding(self):
+        """
+        The Accept-Encoding header for self.compression. Transports decompress
+        responses incrementally, as they are read, so compression composes
+        with streaming decode.
+        """
+        return COMPRESSION[self.compression]
+
+    def timeout(self, params, default=None):
+        """
+        Returns the number of seconds a request with *params* may legitimately
+        take, or *default* for requests that do not block.
+
+        Nomad adds up to wait/16 of random jitter to a blocking query so that
+        many watchers do not all wake up together, so the transport's timeout
+        has to allow for that on top of the wait itself.
+        """
+        if not isinstance(params, dict) or 'index' not in params:
+            return default
+        wait = min(seconds(params.get('wait', DEFAULT_WAIT)), MAX_WAIT)
+        return wait + wait / 16.0 + 5
+
+    def _respond(self, callback, response):
+        """
+        Applies *callback* to a *response* that did not come off the wire,
+        e.g. one served from the cache, returning the result the way this
+        transport returns results.
+        """
+        return callback(response)
+
+    def resolve(self, value):
+        """
+        Returns *value*, an answer known without making a request, the way
+        this transport returns results, e.g. as a Future with the tornado
+        client.
+        """
+        return value
+
+    def stream(self, callback, path, params=None, read_timeout=None):
+        """
+        Makes a GET request whose body is decoded incrementally as it is
+        received. *callback* is a CB.stream callback. Transports return the
+        decoded items as an iterator of the kind natural to them.
+
+        With *read_timeout* the request fails with a Timeout if nothing is
+        received for that many seconds, however long the response as a whole
+        takes.
+        """
+        raise NotImplementedError
+
+    def follow(self, callback, path, params=None, advance=None,
+               heartbeat=30, retry=None):
+        """
+        Follows a stream that never ends of its own accord, such as
+        /v1/event/stream or a followed log. *callback* is a CB.stream
+        callback. For each item decoded *advance(params, item)* returns the
+        items to hand on, having moved *params* on past it, so that the stream
+        can be resumed from there. Transports return the items handed on as
+        an iterator of the kind natural to them.
+
+        Should nothing arrive for *heartbeat* seconds, the connection drop or
+        the server end the stream, the stream is resumed with the params as
+        they are, on whichever server is healthiest, after a delay set by
+        *retry*, a nomad_alt.servers.Retry whose attempts bound the number of
+        consecutive failures (by default 10, backing off up to 5 seconds).
+        Errors that a new attempt would only repeat, such as a 403, are
+        raised straight away.
+        """
+        raise NotImplementedError
+
+    def events(self, callback, path, params=None, heartbeat=30, retry=None,
+               frames=False):
+        """
+        Follows an event stream, such as /v1/event/stream, see follow.
+        *callback* is a CB.stream callback decoding the frames with
+        JSONStreamDecoder. Returned are the events of each frame, or with
+        *frames* the frames themselves, those that carry events, so that the
+        events of one index can be handled together.
+
+        Nomad sends an empty frame as a heartbeat every ten seconds. The
+        stream is resumed from the index after the last one seen.
+        """
+        return self.follow(
+            callback, path, params,
+            functools.partial(self.advance, frames=frames), heartbeat, retry)
+
+    @staticmethod
+    def resumable(error):
+        """Whether a stream interrupted by *error* may be resumed."""
+        return not isinstance(
+            error, (BadRequest, ACLDisabled, ACLPermissionDenied, NotFound))
+
+    @staticmethod
+    def advance(params, frame, frames=False):
+        """Moves *params* on past the index of *frame*, returning its events,
+        or with *frames* the frame itself if it has any."""
+        index = frame.get('Index')
+        if index:
+            params['index'] = index + 1
+        events = frame.get('Events') or ()
+        if frames:
+            return (frame,) if events else ()
+        return events
+
+    def paginate(self, callback, path, params=None, per_page=100,
+                 prefetch=True):
+        """
+        Makes a series of GET requests that walk a paginated list *per_page*
+        items at a time, following X-Nomad-NextToken from page to page.
+        *callback* is a CB.page callback. Transports return the items as an
+        iterator of the kind natural to them.
+
+        With *prefetch* the next page is requested while the caller is still
+        working through the current one, so at most two pages are held in
+        memory at once.
+        """
+        raise NotImplementedError
+
+    def many(self, calls, concurrency=8, ordered=True):
+        """
+        Makes the requests described by *calls*, an iterable of Calls (or
+        (id, callback, path, params) tuples, for GETs), with at most
+        *concurrency* of them in flight at once. *calls* is consumed as
+        requests are made, so it may be a generator of any length. Transports
+        return a Result per call as an iterator of the kind natural to them,
+        in the order of *calls* if *ordered*, or as they complete otherwise.
+
+        A callback may return another Call, which is made next in its place,
+        e.g. to register a job once its plan has been checked. The Result is
+        that of the last request of the chain.
+
+        A request failing with a NomadException, e.g. NotFound or
+        ACLPermissionDenied, only fails its own Result. Any other error, such
+        as the agent being unreachable, aborts the batch.
+        """
+        raise NotImplementedError
+
+    def chain(self, call):
+        """
+        Makes the request described by the Call *call* and, for as long as
+        its callback returns another Call, that one in turn. Returns what the
+        last callback returned, as get would, e.g. a Future with the tornado
+        client.
+        """
+        raise NotImplementedError
+
+    def send(self, call):
+        """Makes the request described by the Call *call*, returning what
+        get, put, delete or post would."""
+        method = call.method.upper()
+        if method == 'GET':
+            return self.get(call.callback, call.path, call.params)
+        if method == 'DELETE':
+            return self.delete(call.callback, call.path, call.params)
+        data = call.data if call.data is not None else ''
+        if method == 'PUT':
+            return self.put(call.callback, call.path, call.params, data)
+        if method == 'POST':
+            return self.post(call.callback, call.path, call.params, data)
+        raise ValueError('unsupported method %r' % call.method)
+
+    @staticmethod
+    def page_params(params, per_page, next_token):
+        params = dict(params or {})
+        params['per_page'] = per_page
+        if next_token is not None:
+            params['next_token'] = next_token
+        return params
+
     @abc.abstractmethod
     def get(self, callback, path, params=None):
         raise NotImplementedError
@@ -288,7 +922,47 @@ class HTTPClient(six.with_metaclass(abc.ABCMeta, object)):
     def post(self, callback, path, params=None, data=''):
         raise NotImplementedError
 
+
+class Endpoint(object):
+    """
+    An endpoint group of Nomad, e.g. nomad.jobs, whose module is only
+    imported, and class instantiated, when it is first used. The instance
+    then replaces this descriptor on the Nomad object.
+    """
+
+    def __init__(self, attr, module, name):
+        self.attr = attr
+        self.module = module
+        self.name = name
+
+    def __get__(self, nomad, owner):
+        if nomad is None:
+            return self
+        module = importlib.import_module(self.module)
+        endpoint = getattr(module, self.name)(nomad)
+        nomad.__dict__[self.attr] = endpoint
+        return endpoint
+
+
 class Nomad(object):
+    acl_policies = Endpoint('acl_policies', 'nomad_alt.api.acl', 'Policies')
+    acl_tokens = Endpoint('acl_tokens', 'nomad_alt.api.acl', 'Tokens')
+    agent = Endpoint('agent', 'nomad_alt.api.agent', 'Agent')
+    allocations = Endpoint(
+        'allocations', 'nomad_alt.api.allocations', 'Allocations')
+    client = Endpoint('client', 'nomad_alt.api.client', 'Client')
+    deployments = Endpoint(
+        'deployments', 'nomad_alt.api.deployments', 'Deployments')
+    evaluations = Endpoint(
+        'evaluations', 'nomad_alt.api.evaluations', 'Evaluations')
+    events = Endpoint('events', 'nomad_alt.api.events', 'Events')
+    jobs = Endpoint('jobs', 'nomad_alt.api.jobs', 'Jobs')
+    # namespaces = Endpoint(...)
+    nodes = Endpoint('nodes', 'nomad_alt.api.nodes', 'Nodes')
+    metrics = Endpoint('metrics', 'nomad_alt.api.metrics', 'Metrics')
+    # operator, quotas, regions, search, sentinel_policies, validate
+    status = Endpoint('status', 'nomad_alt.api.status', 'Status')
+
     def __init__(
             self,
             host=None,
@@ -298,7 +972,13 @@ class Nomad(object):
             ssl_verify=None,
             ssl_cert=None,
             ssl_key=None,
-            ssl_ca=None
+            ssl_ca=None,
+            cache=None,
+            compression='gzip',
+            servers=None,
+            retry=None,
+            stale=False,
+            codec=None
     ):
         """
 
@@ -319,6 +999,12 @@ class Nomad(object):
         :param ssl_cert: Client side certificates for HTTPS requests
         :param ssl_key: Unencrypted PEM encoded private key matching the client certificate
         :param ssl_ca: path to a PEM encoded CA cert file to use to verify the Nomad server SSL certificate
+        :param cache: A nomad_alt.cache.ResponseCache to serve repeated reads from (default no caching)
+        :param compression: 'gzip' to have Nomad compress responses, None to have them sent uncompressed (default gzip)
+        :param servers: Further Nomad servers to fail over to, as URIs, host:port or hosts (default none, see seed_servers)
+        :param retry: A nomad_alt.servers.Retry policy for failed requests (default only fail over when a server can not be reached)
+        :param stale: Whether reads may be answered by any server rather than only the leader, overridable per call (default False)
+        :param codec: The JSON backend for request and response bodies, 'orjson', 'msgspec', 'ujson', 'json', 'auto' for the fastest installed, or a nomad_alt.codec.JSONCodec (default 'json', the standard library)
         """
 
         # TODO: Status
@@ -354,37 +1040,29 @@ class Nomad(object):
         self.token = token if token is not None else os.getenv('NOMAD_TOKEN')
 
         self.http = self.connect(host, port, scheme, ssl_verify, ssl_cert, self.token, ssl_key, ssl_ca)
+        self.http.cache = cache
+        if compression not in COMPRESSION:
+            raise ValueError('unsupported compression %r' % (compression,))
+        self.http.compression = compression
+        if servers:
+            self.http.servers.add(servers)
+        self.http.retry = retry
+        self.http.stale = stale
+        self.http.codec = json_codec(codec)
+
+    def seed_servers(self, agent=False):
+        """
+        Adds the servers of the region, the raft peers, to those requests may
+        fail over to. The peers are reached on the HTTP scheme and port this
+        client was configured with. With *agent* the servers known to the
+        agent are used instead, which is how a client agent finds them.
 
-        from nomad_alt.api.acl import Tokens as ACL_Tokens, Policies as ACL_Policies
-        from nomad_alt.api.agent import Agent
-        from nomad_alt.api.allocations import Allocations
-        from nomad_alt.api.client import Client
-        from nomad_alt.api.deployments import Deployments
-        from nomad_alt.api.evaluations import Evaluations
-        from nomad_alt.api.jobs import Jobs
-        from nomad_alt.api.nodes import Nodes
-        from nomad_alt.api.metrics import Metrics
-        from nomad_alt.api.status import Status
-
-        self.acl_policies = ACL_Policies(self)
-        self.acl_tokens = ACL_Tokens(self)
-        self.agent = Agent(self)
-        self.allocations = Allocations(self)
-        self.client = Client(self)
-        self.deployments = Deployments(self)
-        # self.deployments = Deployments(self)
-        self.evaluations = Evaluations(self)
-        self.jobs = Jobs(self)
-        # self.namespaces = Namespaces(self)
-        self.nodes = Nodes(self)
-        self.metrics = Metrics(self)
-        # self.operator = Operator(self)
-        # self.quotas = Quotas(self)
-        # self.regions = Regions(self)
-        # self.search = Search(self)
-        # self.sentinel_policies = Sentinel_Policies(self)
-        self.status = Status(self)
-        # self.validate = Validate(self)
+        Returns the list of servers, as the endpoints of this client's
+        transport return results.
+        """
+        return self.http.get(
+            CB.json(map=self.http.servers.seed, allow_404=False),
+            '/v1/agent/servers' if agent else '/v1/status/peers')
 
     def connect(self, host, port, scheme, verify, cert, token, key, ca):
         pass
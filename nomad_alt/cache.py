@@ -0,0 +1,205 @@
+import collections
+import threading
+from timeit import default_timer
+
+__all__ = ['ResponseCache']
+
+
+class _Entry(object):
+    __slots__ = ('response', 'index', 'expires', 'size')
+
+    def __init__(self, response, index, expires):
+        self.response = response
+        self.index = index
+        self.expires = expires
+        self.size = len(response.body or '')
+
+
+class ResponseCache(object):
+    """
+    An opt-in cache of GET responses, shared by everything using one client::
+
+        nomad = Nomad(cache=ResponseCache(ttl=0.5, max_bytes=32 * 1024 * 1024))
+
+    Entries are keyed on path, query parameters and ACL token and remember
+    the X-Nomad-Index they were read at. An entry is served as is for *ttl*
+    seconds. After that it is revalidated with a blocking query on its index
+    and a very short *revalidate_wait*: if the index has not moved the entry
+    is simply renewed, otherwise it is replaced by the new response.
+
+    The cache holds at most *max_bytes* of response bodies (and at most
+    *max_entries* entries, if given), evicting the least recently used
+    entries first.
+
+    Writes made through the same client (PUT, POST and DELETE) drop every
+    entry they could affect, see invalidate. Explicit blocking queries (those
+    passing an index) always go to the server.
+    """
+
+    # writes to one kind of object change others, e.g. registering a job
+    # creates evaluations, allocations and deployments, and draining a node
+    # migrates its allocations
+    DEPENDENTS = {
+        'job': ('allocation', 'evaluation', 'deployment', 'node'),
+        'node': ('allocation', 'evaluation', 'deployment', 'job'),
+        'deployment': ('allocation', 'evaluation', 'job'),
+        'allocation': ('evaluation', 'deployment', 'job', 'node'),
+        'evaluation': ('allocation', 'deployment', 'job'),
+    }
+
+    PLURALS = {
+        'jobs': 'job',
+        'nodes': 'node',
+        'deployments': 'deployment',
+        'allocations': 'allocation',
+        'evaluations': 'evaluation',
+    }
+
+    def __init__(self, ttl=1.0, max_bytes=64 * 1024 * 1024, max_entries=None,
+                 revalidate_wait='5ms'):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.revalidate_wait = revalidate_wait
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._entries = collections.OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(path, params, token):
+        return (str(path), tuple(sorted(params.items())) if params else (),
+                token)
+
+    @staticmethod
+    def _index(response):
+        index = response.headers.get('X-Nomad-Index')
+        return int(index) if index is not None else None
+
+    def get(self, http, callback, path, params=None):
+        """
+        Serves a GET through the cache on behalf of the transport *http*.
+        """
+        if params and 'index' in params:
+            # an explicit blocking query is waiting for a change, not a copy
+            return http._request(callback, 'GET', path, params)
+
+        key = self.key(path, params, http.token)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+            generation = self._generation
+            fresh = entry is not None and entry.expires > default_timer()
+            # counted under the lock, as many threads may share the cache
+            if entry is None:
+                self.misses += 1
+            elif fresh:
+                self.hits += 1
+            else:
+                self.revalidations += 1
+
+        if entry is None:
+            return http._request(
+                self._storing(key, generation, callback), 'GET', path, params)
+
+        if fresh:
+            return http._respond(callback, entry.response)
+
+        if entry.index is None:
+            return http._request(
+                self._storing(key, generation, callback), 'GET', path, params)
+        revalidate = dict(params or {})
+        revalidate['index'] = entry.index
+        revalidate['wait'] = self.revalidate_wait
+        return http._request(
+            self._revalidating(key, generation, entry, callback),
+            'GET', path, revalidate)
+
+    def _storing(self, key, generation, callback):
+        def cb(response):
+            if response.code == 200:
+                self._store(key, generation, response)
+            return callback(response)
+        return cb
+
+    def _revalidating(self, key, generation, entry, callback):
+        def cb(response):
+            if response.code == 200 and self._index(response) == entry.index:
+                if generation == self._generation:
+                    entry.expires = default_timer() + self.ttl
+            elif response.code == 200:
+                self._store(key, generation, response)
+            else:
+                self._discard(key)
+            return callback(response)
+        return cb
+
+    def _store(self, key, generation, response):
+        entry = _Entry(
+            response, self._index(response), default_timer() + self.ttl)
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            # a write invalidated this part of the cache while the read was
+            # in flight, so the response may already be out of date
+            if generation != self._generation:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old.size
+            self._entries[key] = entry
+            self.size += entry.size
+            while self._entries and (
+                    self.size > self.max_bytes or
+                    (self.max_entries is not None and
+                     len(self._entries) > self.max_entries)):
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.size
+
+    def _discard(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.size -= entry.size
+
+    def invalidate(self, path):
+        """
+        Drops every entry a write to *path* could have changed: entries for
+        the same kind of object (a write to /v1/job/example drops /v1/jobs
+        and everything under /v1/job/) and for the kinds of object it has
+        knock-on effects on, see DEPENDENTS.
+        """
+        parts = str(path).split('/')
+        kind = parts[2] if len(parts) > 2 else ''
+        kind = self.PLURALS.get(kind, kind)
+        prefixes = tuple(
+            '/v1/' + k for k in (kind,) + self.DEPENDENTS.get(kind, ()))
+        with self._lock:
+            self._generation += 1
+            for key in [k for k in self._entries if k[0].startswith(prefixes)]:
+                self.size -= self._entries.pop(key).size
+
+    def invalidating(self, callback, path):
+        """
+        Invalidates the entries affected by a write to *path*, and wraps the
+        write's *callback* to do so again once the write has completed.
+        """
+        self.invalidate(path)
+
+        def cb(response):
+            self.invalidate(path)
+            return callback(response)
+        return cb
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self.size = 0
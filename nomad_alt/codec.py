@@ -0,0 +1,109 @@
+"""
+JSON codecs for request and response bodies: the standard library's json
+module by default, or one of the faster orjson, msgspec and ujson when
+installed and asked for. See the codec argument of Nomad.
+"""
+import collections
+import json
+
+import six
+
+__all__ = ['JSONCodec', 'STDLIB', 'available', 'json_codec']
+
+
+class JSONCodec(object):
+    """
+    A JSON backend. *loads* decodes bytes (or text) directly, raising
+    ValueError if they are not valid JSON. *dumps* encodes to bytes or text,
+    whichever is natural to the backend, as every transport accepts either
+    for a request body.
+    """
+
+    def __init__(self, name, loads, dumps):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+
+    def __repr__(self):
+        return '<JSONCodec %s>' % self.name
+
+
+def _json_loads(s):
+    # json.loads only takes bytes from Python 3.6 on
+    if isinstance(s, six.binary_type):
+        s = s.decode('utf-8')
+    return json.loads(s)
+
+
+def _json():
+    return JSONCodec('json', _json_loads, json.dumps)
+
+
+def _orjson():
+    import orjson
+    return JSONCodec('orjson', orjson.loads, orjson.dumps)
+
+
+def _msgspec():
+    import msgspec.json
+
+    def loads(s):
+        try:
+            return msgspec.json.decode(s)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e))
+    return JSONCodec('msgspec', loads, msgspec.json.encode)
+
+
+def _ujson():
+    import ujson
+    return JSONCodec('ujson', ujson.loads, ujson.dumps)
+
+
+# fastest first
+BACKENDS = collections.OrderedDict([
+    ('orjson', _orjson),
+    ('msgspec', _msgspec),
+    ('ujson', _ujson),
+    ('json', _json),
+])
+
+STDLIB = _json()
+
+
+def available():
+    """Returns the names of the backends installed, fastest first."""
+    names = []
+    for name, backend in six.iteritems(BACKENDS):
+        try:
+            backend()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def json_codec(codec=None):
+    """
+    Returns the JSONCodec for *codec*: the name of one of BACKENDS, 'auto'
+    for the fastest backend installed, a JSONCodec (or anything with loads
+    and dumps), or None for the standard library's json. Raises ImportError
+    if the named backend is not installed.
+
+    The faster backends are opt in as they differ from json at the edges,
+    e.g. orjson rejects integers beyond 64 bits and NaN.
+    """
+    if codec is None:
+        return STDLIB
+    if codec == 'auto':
+        for backend in six.itervalues(BACKENDS):
+            try:
+                return backend()
+            except ImportError:
+                continue
+    if hasattr(codec, 'loads') and hasattr(codec, 'dumps'):
+        return codec
+    backend = BACKENDS.get(codec)
+    if backend is None:
+        raise ValueError('unsupported JSON codec %r' % (codec,))
+    return backend()
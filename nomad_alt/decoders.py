@@ -0,0 +1,225 @@
+"""
+Incremental decoders for streaming responses.
+
+A decoder is fed the raw bytes of a response body chunk by chunk, as they
+come off the socket, and hands back each item as soon as it is complete, so
+that neither the whole body nor its decoded text is ever held in memory.
+"""
+import codecs
+import json
+import re
+
+from nomad_alt.codec import STDLIB
+
+__all__ = ['BytesDecoder', 'JSONArrayDecoder', 'JSONSequenceDecoder',
+           'JSONStreamDecoder']
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class JSONArrayDecoder(object):
+    """
+    Decodes the items of a top level JSON array, e.g. the body of
+    /v1/allocations, applying *transform* (if given) to each item. Finding
+    where an item ends takes the json module's raw_decode, so *codec* is not
+    used.
+
+        decoder = JSONArrayDecoder()
+        for chunk in chunks:
+            for item in decoder.feed(chunk):
+                ...
+        for item in decoder.close():
+            ...
+    """
+
+    _START, _FIRST, _ITEM, _SEPARATOR, _DONE = range(5)
+
+    def __init__(self, transform=None, codec=None):
+        self.transform = transform
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._state = self._START
+
+    def feed(self, chunk):
+        """Returns the list of items completed by *chunk* (bytes)."""
+        self._buffer += self._text.decode(chunk)
+        return self._items(final=False)
+
+    def close(self):
+        """Returns any remaining items, raising ValueError if the body was
+        not a complete JSON array."""
+        self._buffer += self._text.decode(b'', final=True)
+        items = self._items(final=True)
+        if self._state != self._DONE or self._buffer.strip():
+            raise ValueError('truncated or invalid JSON array')
+        return items
+
+    def _items(self, final):
+        items = []
+        buf = self._buffer
+        pos = 0
+        end = len(buf)
+        state = self._state
+        transform = self.transform
+        while True:
+            pos = _WHITESPACE.match(buf, pos).end()
+            if pos == end:
+                break
+            c = buf[pos]
+            if state == self._START:
+                if c != '[':
+                    raise ValueError('expected a JSON array')
+                state = self._FIRST
+                pos += 1
+            elif state == self._SEPARATOR or (state == self._FIRST and c == ']'):
+                if c == ']':
+                    state = self._DONE
+                elif c == ',':
+                    state = self._ITEM
+                else:
+                    raise ValueError('expected , or ] at %d' % pos)
+                pos += 1
+            elif state == self._DONE:
+                raise ValueError('unexpected data after JSON array')
+            else:
+                try:
+                    item, stop = self._json.raw_decode(buf, pos)
+                except ValueError:
+                    if final:
+                        raise
+                    # the item has not been received in full yet
+                    break
+                if stop == end and not final and buf[stop - 1].isdigit():
+                    # a bare number may continue in the next chunk
+                    break
+                items.append(transform(item) if transform else item)
+                state = self._SEPARATOR
+                pos = stop
+        self._buffer = buf[pos:]
+        self._state = state
+        return items
+
+
+class JSONStreamDecoder(object):
+    """
+    Decodes a stream of newline delimited JSON values, e.g. the body of
+    /v1/event/stream, applying *transform* (if given) to each value. Each
+    line is decoded from bytes by *codec*, a nomad_alt.codec.JSONCodec
+    (by default the json module). Blank lines are skipped. It is used the
+    same way as JSONArrayDecoder.
+    """
+
+    def __init__(self, transform=None, codec=None):
+        self.transform = transform
+        self._loads = (codec or STDLIB).loads
+        self._pending = []
+
+    def feed(self, chunk):
+        """Returns the list of values completed by *chunk* (bytes)."""
+        if b'\n' not in chunk:
+            self._pending.append(chunk)
+            return []
+        lines = chunk.split(b'\n')
+        if self._pending:
+            self._pending.append(lines[0])
+            lines[0] = b''.join(self._pending)
+        self._pending = [lines.pop()] if lines[-1] else []
+        return self._values(lines)
+
+    def close(self):
+        """Returns the last value, raising ValueError if the stream ended
+        part way through one."""
+        lines = [b''.join(self._pending)]
+        self._pending = []
+        return self._values(lines)
+
+    def _values(self, lines):
+        values = []
+        transform = self.transform
+        loads = self._loads
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            value = loads(line)
+            values.append(transform(value) if transform else value)
+        return values
+
+
+class JSONSequenceDecoder(object):
+    """
+    Decodes a sequence of JSON objects following one another, separated by
+    whitespace if at all, e.g. the frames of /v1/client/fs/stream, applying
+    *transform* (if given) to each object and dropping those it returns None
+    for. Like JSONArrayDecoder it does not use *codec*.
+    """
+
+    def __init__(self, transform=None, codec=None):
+        self.transform = transform
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+
+    def feed(self, chunk):
+        """Returns the list of objects completed by *chunk* (bytes)."""
+        text = self._text.decode(chunk)
+        self._buffer += text
+        if '}' not in text:
+            # nothing can have been completed without its closing brace, so
+            # spare decoding a large object over and over as it arrives
+            return []
+        return self._values(final=False)
+
+    def close(self):
+        """Returns any remaining objects, raising ValueError if the sequence
+        ended part way through one."""
+        self._buffer += self._text.decode(b'', final=True)
+        return self._values(final=True)
+
+    def _values(self, final):
+        values = []
+        buf = self._buffer
+        pos = 0
+        end = len(buf)
+        transform = self.transform
+        while True:
+            pos = _WHITESPACE.match(buf, pos).end()
+            if pos == end:
+                break
+            if buf[pos] != '{':
+                raise ValueError('expected a JSON object at %d' % pos)
+            try:
+                value, pos = self._json.raw_decode(buf, pos)
+            except ValueError:
+                if final:
+                    raise
+                # the object has not been received in full yet
+                break
+            if transform:
+                value = transform(value)
+                if value is None:
+                    continue
+            values.append(value)
+        self._buffer = buf[pos:]
+        return values
+
+
+class BytesDecoder(object):
+    """
+    Hands on the chunks of a body as they arrive, e.g. of a file read from
+    /v1/client/fs/cat, applying *transform* (if given) to each. It is used the
+    same way as JSONArrayDecoder.
+    """
+
+    def __init__(self, transform=None, codec=None):
+        self.transform = transform
+
+    def feed(self, chunk):
+        """Returns *chunk* (bytes), unless empty."""
+        if not chunk:
+            return []
+        return [self.transform(chunk) if self.transform else chunk]
+
+    def close(self):
+        return []
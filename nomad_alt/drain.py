@@ -0,0 +1,268 @@
+"""
+Draining many nodes, a few at a time, e.g. to patch a pool of machines::
+
+    orchestrator = DrainOrchestrator(
+        nomad, {'NodeClass': 'batch'}, max_parallel=10, deadline='1h',
+        on_progress=print)
+    progress = orchestrator.run()
+
+Progress is watched with blocking queries of each node draining and of its
+allocations, decoding only the few fields needed. Both are read from the
+leader, so that a node's drain is not taken for over before the leader says
+it is.
+"""
+import collections
+import itertools
+import logging
+import threading
+from timeit import default_timer
+
+import six
+from six.moves import queue
+
+from nomad_alt.base import seconds
+from nomad_alt.exceptions import NomadException, NotFound
+
+__all__ = ['DrainOrchestrator', 'Progress']
+
+# the state of a drain: the number of nodes selected, drained, draining,
+# waiting their turn and that failed (down, or the drain was refused), the
+# allocations still to move off the selected nodes and those moved so far,
+# the seconds since the drain started, nodes and allocations drained per
+# second, and the estimated seconds to go, None until there is a rate
+Progress = collections.namedtuple('Progress', [
+    'total', 'done', 'draining', 'queued', 'failed', 'allocs_left',
+    'allocs_moved', 'elapsed', 'node_rate', 'alloc_rate', 'eta'])
+
+# what is decoded of the lists watched
+NODE_FIELDS = ['ID', 'Name', 'Drain', 'Status']
+ALLOC_FIELDS = ['ID', 'NodeID', 'JobType', 'ClientStatus']
+
+LIVE = frozenset(['pending', 'running'])
+SYSTEM = frozenset(['system', 'sysbatch'])
+
+
+def selector(nodes):
+    """
+    Returns a predicate of node stubs for *nodes*: a predicate itself, a
+    dict of fields to the value (or list, tuple or set of values) to match,
+    or node IDs.
+    """
+    if callable(nodes):
+        return nodes
+    if isinstance(nodes, dict):
+        def matches(node):
+            for field, value in six.iteritems(nodes):
+                if isinstance(value, (list, tuple, set, frozenset)):
+                    if node.get(field) not in value:
+                        return False
+                elif node.get(field) != value:
+                    return False
+            return True
+        return matches
+    ids = frozenset(nodes)
+    return lambda node: node['ID'] in ids
+
+
+class DrainOrchestrator(object):
+    """
+    Drains the nodes selected by *nodes* (see selector), at most
+    *max_parallel* at a time, each with a DrainSpec of *deadline* and
+    *ignore_system_jobs* (see Nodes.drain). *on_progress* is called with a
+    Progress each time it changes.
+
+    run blocks until every node has been drained, so needs a blocking
+    (nomad_alt.std) client. Each node draining is watched by two threads of
+    its own, blocking for up to *wait* on the node and on its allocations.
+    stop, from another thread, ends it early, leaving the drains already
+    started to carry on.
+    """
+
+    logger = logging.getLogger('nomad_alt.drain.DrainOrchestrator')
+
+    def __init__(self, nomad, nodes, max_parallel=1, deadline='1h',
+                 ignore_system_jobs=False, wait='10s', on_progress=None):
+        self.nomad = nomad
+        self.select = selector(nodes)
+        self.max_parallel = max_parallel
+        self.deadline = deadline
+        self.ignore_system_jobs = ignore_system_jobs
+        self.wait = seconds(wait)
+        self.on_progress = on_progress
+        self.queued = collections.deque()
+        self.draining = {}
+        self.done = set()
+        self.failed = {}
+        self.total = 0
+        self.allocs_left = 0
+        self.allocs_moved = 0
+        self.started = None
+        # the live allocations of each node selected, when last looked at
+        self._live = {}
+        self._progress = None
+        self._stopping = threading.Event()
+        # (kind, node ID, data) of each change seen by the watching threads
+        self._changes = queue.Queue()
+
+    def stop(self):
+        """Ends run. The threads watching the nodes end once their current
+        request returns."""
+        self._stopping.set()
+        self._changes.put(None)
+
+    def run(self):
+        """Drains the nodes, returning the final Progress."""
+        self.started = default_timer()
+        nodes = [node for node in self.nomad.nodes.list(fields=NODE_FIELDS)
+                 if self.select(node)]
+        self.total = len(nodes)
+        self.queued.extend(node['ID'] for node in sorted(
+            nodes, key=lambda node: (node.get('Name') or '', node['ID'])))
+        self.logger.info('draining %d nodes, %d at a time',
+                         self.total, self.max_parallel)
+        # the allocations before any drain starts, to count those moved from
+        _, allocs = self.nomad.allocations.list(index=0, fields=ALLOC_FIELDS)
+        self.update(nodes, allocs or [])
+        while not self._stopping.is_set():
+            for node_id in self._start():
+                self._watch(node_id)
+            self._report()
+            if not self.draining:
+                break
+            change = self._changes.get()
+            if change is None:
+                break
+            kind, node_id, data = change
+            if kind == 'node':
+                self._drained(node_id, data)
+            else:
+                self._moved(node_id, self._by_node(data or [])[node_id])
+                self._left()
+        return self.progress()
+
+    def _start(self):
+        """Starts draining nodes while there is room, returning their IDs."""
+        started = []
+        while self.queued and len(self.draining) < self.max_parallel:
+            node_id = self.queued.popleft()
+            try:
+                self.nomad.nodes.drain(
+                    node_id, deadline=self.deadline,
+                    ignore_system_jobs=self.ignore_system_jobs)
+            except NomadException as e:
+                self.logger.warning('draining %s failed: %s', node_id, e)
+                self.failed[node_id] = e
+                continue
+            self.draining[node_id] = default_timer()
+            started.append(node_id)
+        return started
+
+    def _watch(self, node_id):
+        """Watches *node_id* and its allocations for as long as it drains."""
+        nodes = self.nomad.nodes
+
+        def node(index):
+            return nodes.read(node_id, index=index, wait=self.wait,
+                              stale=False, fields=NODE_FIELDS)
+
+        def allocs(index):
+            return nodes.allocations(node_id, index=index, wait=self.wait,
+                                     stale=False, fields=ALLOC_FIELDS)
+
+        for kind, read in (('node', node), ('allocs', allocs)):
+            thread = threading.Thread(
+                target=self._follow, args=(kind, node_id, read))
+            thread.daemon = True
+            thread.start()
+
+    def _follow(self, kind, node_id, read):
+        index = 0
+        while node_id in self.draining and not self._stopping.is_set():
+            try:
+                last, data = read(index)
+            except NotFound:
+                self._changes.put(('node', node_id, None))
+                return
+            except Exception:
+                self.logger.exception('watching %s of %s failed', kind,
+                                      node_id)
+                self._stopping.wait(1.0)
+                continue
+            if last != index:
+                index = last
+                self._changes.put((kind, node_id, data))
+
+    def update(self, nodes, allocs):
+        """Takes in the current node and allocation lists."""
+        live = self._by_node(allocs)
+        for node_id in list(self._selected()):
+            self._moved(node_id, live[node_id])
+        self._left()
+        by_id = dict((node['ID'], node) for node in nodes)
+        for node_id in list(self.draining):
+            self._drained(node_id, by_id.get(node_id))
+        self._report()
+
+    def _by_node(self, allocs):
+        """Returns the IDs of the live allocations of *allocs*, by node."""
+        live = collections.defaultdict(set)
+        for alloc in allocs:
+            if alloc.get('ClientStatus') not in LIVE:
+                continue
+            if self.ignore_system_jobs and alloc.get('JobType') in SYSTEM:
+                continue
+            live[alloc.get('NodeID')].add(alloc['ID'])
+        return live
+
+    def _moved(self, node_id, live):
+        """Takes in the IDs of the live allocations of *node_id*."""
+        before = self._live.get(node_id, live)
+        if node_id in self.draining or node_id in self.done:
+            self.allocs_moved += len(before - live)
+        self._live[node_id] = live
+
+    def _left(self):
+        self.allocs_left = sum(
+            len(self._live.get(node_id, ()))
+            for node_id in list(self.queued) + list(self.draining))
+
+    def _drained(self, node_id, node):
+        """Takes in *node* as the leader has it, None once it is gone."""
+        if node_id not in self.draining:
+            return
+        if node is None or node.get('Status') == 'down':
+            self.failed[node_id] = NomadException(
+                'node %s went away while draining' % node_id)
+        elif node.get('Drain'):
+            return
+        else:
+            self.done.add(node_id)
+            self.logger.info('drained %s in %.0fs', node_id,
+                             default_timer() - self.draining[node_id])
+        del self.draining[node_id]
+
+    def _report(self):
+        progress = self.progress()
+        if progress[:7] != (self._progress or ())[:7]:
+            self._progress = progress
+            if self.on_progress is not None:
+                self.on_progress(progress)
+
+    def _selected(self):
+        return itertools.chain(
+            self.queued, list(self.draining), self.done, list(self.failed))
+
+    def progress(self):
+        """Returns the Progress of the drain."""
+        elapsed = default_timer() - self.started
+        node_rate = len(self.done) / elapsed if elapsed else 0.0
+        alloc_rate = self.allocs_moved / elapsed if elapsed else 0.0
+        eta = None
+        if alloc_rate and self.allocs_left:
+            eta = self.allocs_left / alloc_rate
+        elif node_rate:
+            eta = (len(self.queued) + len(self.draining)) / node_rate
+        return Progress(
+            self.total, len(self.done), len(self.draining), len(self.queued),
+            len(self.failed), self.allocs_left, self.allocs_moved, elapsed,
+            node_rate, alloc_rate, eta)
@@ -0,0 +1,456 @@
+"""
+An in-memory replica of a cluster's jobs, nodes, allocations, evaluations and
+deployments, kept up to date from the event stream or with blocking queries,
+and indexed so that questions such as "the running allocations of job X on
+node Y" are answered from memory rather than with requests.
+"""
+import logging
+import threading
+
+from timeit import default_timer
+
+import six
+
+from nomad_alt import models
+
+__all__ = ['ClusterMirror', 'Snapshot', 'Table']
+
+
+class Table(object):
+    """
+    The objects of one kind by ID, with a secondary index on the field of each
+    of *indexes*, a dict of index names to field names::
+
+        table = Table({'job': 'JobID', 'status': 'ClientStatus'})
+        table.put(allocation)
+        table.find(job='example', status=('pending', 'running'))
+
+    Taking a view of the table is O(1): the table and its views share their
+    dicts and sets until the table is next changed, at which point it copies
+    the dicts, and each index set the first time it changes it.
+
+    A Table is not thread safe, ClusterMirror guards its own.
+    """
+
+    def __init__(self, indexes, objects=()):
+        self.indexes = indexes
+        self.objects = {}
+        self._by = dict((name, {}) for name in indexes)
+        # whether objects and _by are shared with a view, and which index
+        # sets have been copied since they last were
+        self._shared = False
+        self._copied = set()
+        for obj in objects:
+            self.put(obj)
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __iter__(self):
+        return iter(six.itervalues(self.objects))
+
+    def __contains__(self, id):
+        return id in self.objects
+
+    def get(self, id, default=None):
+        return self.objects.get(id, default)
+
+    def find(self, **where):
+        """
+        Returns the objects whose indexed fields have the values given by
+        keyword, by index name. A list, tuple or set of values matches any of
+        them. The smallest index set is scanned, so the cost is proportional
+        to the most selective condition.
+        """
+        if not where:
+            return list(six.itervalues(self.objects))
+        sets = []
+        for name, value in six.iteritems(where):
+            index = self._by.get(name)
+            if index is None:
+                raise ValueError('no %r index' % name)
+            if isinstance(value, (list, tuple, set, frozenset)):
+                members = set()
+                for v in value:
+                    members.update(index.get(v, ()))
+            else:
+                members = index.get(value)
+            if not members:
+                return []
+            sets.append(members)
+        sets.sort(key=len)
+        first, rest = sets[0], sets[1:]
+        objects = self.objects
+        return [objects[id] for id in first
+                if all(id in members for members in rest)]
+
+    def view(self):
+        """Returns a read only view of the table as it is now."""
+        view = Table.__new__(Table)
+        view.indexes = self.indexes
+        view.objects = self.objects
+        view._by = self._by
+        # should a view be written to after all, it copies too
+        view._shared = True
+        view._copied = set()
+        self._shared = True
+        self._copied = set()
+        return view
+
+    def put(self, obj):
+        """
+        Adds or replaces *obj*, returning False if it was ignored for being
+        older, going by ModifyIndex, than the object already held.
+        """
+        id = obj['ID']
+        old = self.objects.get(id)
+        if old is not None and \
+                obj.get('ModifyIndex', 0) < old.get('ModifyIndex', 0):
+            return False
+        self._own()
+        self.objects[id] = obj
+        for name, field in six.iteritems(self.indexes):
+            value = obj.get(field)
+            if old is not None:
+                previous = old.get(field)
+                if previous == value:
+                    continue
+                self._unindex(name, previous, id)
+            if value:
+                self._members(name, value).add(id)
+        return True
+
+    def remove(self, id):
+        """Removes the object *id*, returning it if it was held."""
+        old = self.objects.get(id)
+        if old is None:
+            return None
+        self._own()
+        del self.objects[id]
+        for name, field in six.iteritems(self.indexes):
+            self._unindex(name, old.get(field), id)
+        return old
+
+    def _own(self):
+        if self._shared:
+            self.objects = dict(self.objects)
+            self._by = dict((name, dict(index))
+                            for name, index in six.iteritems(self._by))
+            self._shared = False
+
+    def _members(self, name, value):
+        index = self._by[name]
+        members = index.get(value)
+        key = (name, value)
+        if members is None:
+            members = index[value] = set()
+            self._copied.add(key)
+        elif key not in self._copied:
+            members = index[value] = set(members)
+            self._copied.add(key)
+        return members
+
+    def _unindex(self, name, value, id):
+        if not value:
+            return
+        members = self._members(name, value)
+        members.discard(id)
+        if not members:
+            del self._by[name][value]
+
+
+class Snapshot(object):
+    """
+    A consistent, read only view of a ClusterMirror as of *index*. Its tables
+    are attributes named after their kind::
+
+        snapshot = mirror.snapshot()
+        for alloc in snapshot.allocations.find(node=node_id):
+            job = snapshot.jobs.get(alloc['JobID'])
+    """
+
+    def __init__(self, index, tables):
+        self.index = index
+        self.tables = tables
+
+    def __getattr__(self, kind):
+        try:
+            return self.__dict__['tables'][kind]
+        except KeyError:
+            raise AttributeError(kind)
+
+    def get(self, kind, id, default=None):
+        return self.tables[kind].get(id, default)
+
+    def find(self, kind, **where):
+        return self.tables[kind].find(**where)
+
+
+class ClusterMirror(object):
+    """
+    A replica of the objects of *kinds* (by default all of KINDS) of the
+    cluster *nomad* talks to, indexed by the fields named in KINDS::
+
+        mirror = ClusterMirror(nomad)
+        mirror.start()
+        running = mirror.find('allocations', job='example', node=node_id,
+                              status='running')
+
+    start loads every kind, then keeps them up to date in a daemon thread,
+    following the event stream or, without *events*, with a blocking query
+    (waiting up to *wait*) on each list in a thread of its own. The event
+    stream is resumed should it be interrupted (see Events.stream, with
+    *heartbeat*). Blocking queries always return the full list.
+
+    The event stream does not report objects being garbage collected:
+    allocations, evaluations, deployments and dead batch jobs (the kinds of
+    COLLECTED) just vanish from the lists. So every *reconcile* seconds
+    those kinds are listed again, in a thread of their own, and the objects
+    no longer listed are pruned; until then a collected object lingers in
+    the mirror. With *resync* every kind is also reloaded in full, once an
+    event arrives, when that many seconds have passed since the last load.
+    A job stopped is kept, as Nomad still lists it, one purged is removed.
+
+    Objects are those returned by the list endpoints, e.g. AllocListStub,
+    until an event carrying the whole object replaces them. Events of one
+    index are applied at once, so a snapshot never sees some of them only.
+    With *model* objects are kept as the compact nomad_alt.models of their
+    kind (see MODELS), events included, to mirror large clusters in less
+    memory.
+
+    Driving the mirror needs a blocking (nomad_alt.std) client. With the
+    tornado or asyncio clients feed it from a coroutine instead, with replace
+    for lists, apply for the frames of nomad.events.stream(frames=True) and
+    prune for the lists of the COLLECTED kinds.
+    """
+
+    # kind: (event topic, {index name: field})
+    KINDS = {
+        'jobs': ('Job', {
+            'status': 'Status', 'type': 'Type'}),
+        'nodes': ('Node', {
+            'status': 'Status', 'datacenter': 'Datacenter',
+            'node_class': 'NodeClass',
+            'eligibility': 'SchedulingEligibility'}),
+        'allocations': ('Allocation', {
+            'job': 'JobID', 'node': 'NodeID', 'task_group': 'TaskGroup',
+            'status': 'ClientStatus', 'desired_status': 'DesiredStatus',
+            'deployment': 'DeploymentID', 'eval': 'EvalID'}),
+        'evaluations': ('Evaluation', {
+            'job': 'JobID', 'node': 'NodeID', 'status': 'Status',
+            'deployment': 'DeploymentID'}),
+        'deployments': ('Deployment', {
+            'job': 'JobID', 'status': 'Status'}),
+    }
+
+    # kind: the model its objects are kept as, with model=True
+    MODELS = {
+        'jobs': models.JobStub,
+        'nodes': models.NodeStub,
+        'allocations': models.AllocationStub,
+        'evaluations': models.Evaluation,
+        'deployments': models.Deployment,
+    }
+
+    # event types removing their object, others add or replace it
+    DELETED = frozenset(['NodeDeregistration'])
+
+    # event types removing their object unless it was only stopped: a job
+    # deregistered with purge is gone, one merely stopped is still listed.
+    # Stopping writes the job at the index of the event, while a purge
+    # reports the job as it was last written, possibly stopped already
+    PURGED = frozenset(['JobDeregistered'])
+
+    # kinds garbage collected without an event, see reconcile
+    COLLECTED = frozenset(['jobs', 'allocations', 'evaluations',
+                           'deployments'])
+
+    logger = logging.getLogger('nomad_alt.mirror.ClusterMirror')
+
+    def __init__(self, nomad, kinds=None, events=True, wait='5m',
+                 heartbeat=30, resync=None, reconcile=300, model=False):
+        self.nomad = nomad
+        self.kinds = tuple(kinds or sorted(self.KINDS))
+        self.events = events
+        self.wait = wait
+        self.heartbeat = heartbeat
+        self.resync = resync
+        self.reconcile = reconcile
+        self.model = model
+        self.index = 0
+        self.indexes = dict.fromkeys(self.kinds, 0)
+        self.tables = dict((kind, Table(self.KINDS[kind][1]))
+                           for kind in self.kinds)
+        self.topics = dict((self.KINDS[kind][0], kind) for kind in self.kinds)
+        self.error = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def get(self, kind, id, default=None):
+        with self._lock:
+            return self.tables[kind].get(id, default)
+
+    def find(self, kind, **where):
+        """Returns the objects of *kind* matching *where*, see Table.find."""
+        with self._lock:
+            return self.tables[kind].find(**where)
+
+    def snapshot(self):
+        """Returns a Snapshot of every kind as of the last index applied."""
+        with self._lock:
+            return Snapshot(self.index, dict(
+                (kind, table.view())
+                for kind, table in six.iteritems(self.tables)))
+
+    def replace(self, kind, index, objects):
+        """Replaces every object of *kind* with *objects*, listed at
+        *index*."""
+        table = Table(self.KINDS[kind][1], objects)
+        with self._lock:
+            self.tables[kind] = table
+            self.indexes[kind] = index
+            self.index = max(self.index, index)
+
+    def apply(self, frame):
+        """Applies the Events of an event stream *frame*, returning the
+        number of objects changed."""
+        changed = 0
+        index = frame.get('Index') or 0
+        with self._lock:
+            for event in frame.get('Events') or ():
+                topic = event.get('Topic')
+                kind = self.topics.get(topic)
+                if kind is None:
+                    continue
+                table = self.tables[kind]
+                event_type = event.get('Type')
+                obj = (event.get('Payload') or {}).get(topic)
+                if event_type in self.DELETED or (
+                        event_type in self.PURGED and
+                        not self._stopped(obj, event.get('Index') or index)):
+                    changed += table.remove(event['Key']) is not None
+                else:
+                    if self.model:
+                        obj = self.MODELS[kind](obj)
+                    changed += table.put(obj)
+            for kind in self.kinds:
+                self.indexes[kind] = max(self.indexes[kind], index)
+            self.index = max(self.index, index)
+        return changed
+
+    @staticmethod
+    def _stopped(job, index):
+        """Returns whether the *job* of a deregistration at *index* was only
+        stopped, rather than purged."""
+        return bool(job and job.get('Stop') and
+                    job.get('ModifyIndex') == index)
+
+    def prune(self, kind, index, objects):
+        """
+        Removes the objects of *kind* missing from *objects*, listed at
+        *index*, such as those garbage collected, returning how many were.
+        Objects changed since *index* are kept.
+        """
+        listed = set(obj['ID'] for obj in objects)
+        removed = 0
+        with self._lock:
+            table = self.tables[kind]
+            for obj in list(table):
+                if obj['ID'] not in listed and \
+                        obj.get('ModifyIndex', 0) <= index:
+                    table.remove(obj['ID'])
+                    removed += 1
+        return removed
+
+    def sync(self):
+        """Loads every kind afresh."""
+        for kind in self.kinds:
+            index, objects = getattr(self.nomad, kind).list(
+                index=0, model=self.model)
+            self.replace(kind, index, objects or [])
+
+    def start(self):
+        """Loads every kind, then keeps them up to date in the
+        background."""
+        self._stopping.clear()
+        self.sync()
+        if self.events:
+            targets = [(self._follow_events, ())]
+            if self.reconcile:
+                targets.append((self._reconcile, ()))
+        else:
+            targets = [(self._follow_list, (kind,)) for kind in self.kinds]
+        for target, args in targets:
+            thread = threading.Thread(target=target, args=args)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """
+        Stops updating the mirror, waiting up to *timeout* seconds for the
+        threads to notice, which they do once their current request returns.
+        """
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _follow_events(self):
+        while not self._stopping.is_set():
+            loaded = default_timer()
+            try:
+                # resume from the kind furthest behind, so nothing is missed
+                frames = self.nomad.events.stream(
+                    list(self.topics), index=min(self.indexes.values()) + 1,
+                    heartbeat=self.heartbeat, frames=True)
+                for frame in frames:
+                    self.apply(frame)
+                    if self._stopping.is_set():
+                        return
+                    if self.resync is not None and \
+                            default_timer() - loaded >= self.resync:
+                        break
+            except Exception as e:
+                # events may have been missed, start over
+                self.error = e
+                self.logger.exception('following the event stream failed')
+                if self._stopping.wait(1.0):
+                    return
+            self._sync()
+
+    def _sync(self):
+        try:
+            self.sync()
+        except Exception as e:
+            self.error = e
+            self.logger.exception('loading the mirror failed')
+
+    def _reconcile(self):
+        while not self._stopping.wait(self.reconcile):
+            for kind in self.kinds:
+                if kind not in self.COLLECTED:
+                    continue
+                try:
+                    index, objects = getattr(self.nomad, kind).list(
+                        index=0, model=self.model)
+                    self.prune(kind, index, objects or [])
+                except Exception as e:
+                    self.error = e
+                    self.logger.exception('reconciling %s failed', kind)
+
+    def _follow_list(self, kind):
+        endpoint = getattr(self.nomad, kind)
+        while not self._stopping.is_set():
+            try:
+                index, objects = endpoint.list(
+                    index=self.indexes[kind], wait=self.wait,
+                    model=self.model)
+            except Exception as e:
+                self.error = e
+                self.logger.exception('watching %s failed', kind)
+                self._stopping.wait(1.0)
+                continue
+            if index != self.indexes[kind]:
+                self.replace(kind, index, objects or [])
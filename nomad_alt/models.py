@@ -0,0 +1,166 @@
+"""
+Compact, read only models of the stubs returned by the list endpoints, for
+holding many of them in memory, e.g. in a ClusterMirror::
+
+    allocations = nomad.allocations.list(model=True)
+    allocations[0].ClientStatus, allocations[0]['JobID']
+
+A model keeps the top level scalar fields of its kind in slots, interning
+those repeated across objects, such as node and job IDs and statuses. All
+other fields, e.g. the TaskStates of an allocation, are kept encoded as JSON
+until one of them is first read.
+
+Models are mappings, with the keys and values of the dict they were built
+from, so code written for dicts, the ClusterMirror included, takes either.
+"""
+from six.moves import intern
+from six.moves.collections_abc import Mapping
+
+from nomad_alt.codec import json_codec
+
+__all__ = ['Model', 'AllocationStub', 'NodeStub', 'JobStub', 'Evaluation',
+           'Deployment']
+
+# the rest of a model is only read back by the same codec, so the fastest
+# installed is used whatever the client's
+_codec = json_codec('auto')
+
+
+def _pack(value):
+    encoded = _codec.dumps(value)
+    if isinstance(encoded, bytes):
+        # orjson returns bytes in a buffer of at least 1KiB, copy them into
+        # one of their own size
+        encoded = memoryview(encoded).tobytes()
+    return encoded
+
+
+class Model(Mapping):
+    """
+    The base of the models. Subclasses list their top level fields in
+    __slots__, and in FIELDS, and those to intern in INTERNED.
+    """
+    __slots__ = ('_rest',)
+    FIELDS = frozenset()
+    INTERNED = frozenset()
+
+    def __init__(self, data):
+        fields = self.FIELDS
+        interned = self.INTERNED
+        rest = {}
+        for key, value in data.items():
+            if key not in fields:
+                rest[key] = value
+                continue
+            if key in interned and type(value) is str:
+                value = intern(value)
+            setattr(self, key, value)
+        self._rest = _pack(rest) if rest else None
+
+    @classmethod
+    def from_list(klass, items):
+        """Returns the models of *items*, a list of dicts."""
+        return [klass(item) for item in items] if items is not None else None
+
+    def _expand(self):
+        rest = self._rest
+        if rest is None:
+            return {}
+        if not isinstance(rest, dict):
+            rest = self._rest = _codec.loads(rest)
+        return rest
+
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        return self._expand()[key]
+
+    def __getattr__(self, name):
+        # only called for fields that are not slots, or are unset
+        if name.startswith('_') or name in self.FIELDS:
+            raise AttributeError(name)
+        try:
+            return self._expand()[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __iter__(self):
+        for key in self.__slots__:
+            if hasattr(self, key):
+                yield key
+        for key in self._expand():
+            yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return '<%s %s>' % (type(self).__name__, getattr(self, 'ID', None))
+
+    def to_dict(self):
+        """Returns the dict the model was built from."""
+        return dict(self.items())
+
+
+class AllocationStub(Model):
+    """An allocation as listed by /v1/allocations or /v1/node/:id/allocations."""
+    __slots__ = (
+        'ID', 'EvalID', 'Name', 'Namespace', 'NodeID', 'NodeName', 'JobID',
+        'JobType', 'JobVersion', 'TaskGroup', 'DesiredStatus',
+        'DesiredDescription', 'ClientStatus', 'ClientDescription',
+        'FollowupEvalID', 'CreateIndex', 'ModifyIndex', 'CreateTime',
+        'ModifyTime')
+    FIELDS = frozenset(__slots__)
+    INTERNED = frozenset([
+        'EvalID', 'Namespace', 'NodeID', 'NodeName', 'JobID', 'JobType',
+        'TaskGroup', 'DesiredStatus', 'DesiredDescription', 'ClientStatus',
+        'ClientDescription'])
+
+
+class NodeStub(Model):
+    """A node as listed by /v1/nodes."""
+    __slots__ = (
+        'ID', 'Address', 'Datacenter', 'Name', 'NodeClass', 'Version',
+        'Drain', 'SchedulingEligibility', 'Status', 'StatusDescription',
+        'CreateIndex', 'ModifyIndex')
+    FIELDS = frozenset(__slots__)
+    INTERNED = frozenset([
+        'Datacenter', 'NodeClass', 'Version', 'SchedulingEligibility',
+        'Status', 'StatusDescription'])
+
+
+class JobStub(Model):
+    """A job as listed by /v1/jobs."""
+    __slots__ = (
+        'ID', 'ParentID', 'Name', 'Namespace', 'Type', 'Priority', 'Periodic',
+        'ParameterizedJob', 'Stop', 'Status', 'StatusDescription',
+        'CreateIndex', 'ModifyIndex', 'JobModifyIndex', 'SubmitTime')
+    FIELDS = frozenset(__slots__)
+    INTERNED = frozenset([
+        'ParentID', 'Namespace', 'Type', 'Status', 'StatusDescription'])
+
+
+class Evaluation(Model):
+    """An evaluation as listed by /v1/evaluations."""
+    __slots__ = (
+        'ID', 'Namespace', 'Priority', 'Type', 'TriggeredBy', 'JobID',
+        'JobModifyIndex', 'NodeID', 'NodeModifyIndex', 'DeploymentID',
+        'Status', 'StatusDescription', 'Wait', 'NextEval', 'PreviousEval',
+        'BlockedEval', 'CreateIndex', 'ModifyIndex')
+    FIELDS = frozenset(__slots__)
+    INTERNED = frozenset([
+        'Namespace', 'Type', 'TriggeredBy', 'JobID', 'NodeID', 'DeploymentID',
+        'Status', 'StatusDescription'])
+
+
+class Deployment(Model):
+    """A deployment as listed by /v1/deployments."""
+    __slots__ = (
+        'ID', 'Namespace', 'JobID', 'JobVersion', 'JobModifyIndex',
+        'JobCreateIndex', 'Status', 'StatusDescription', 'CreateIndex',
+        'ModifyIndex')
+    FIELDS = frozenset(__slots__)
+    INTERNED = frozenset(['Namespace', 'JobID', 'Status', 'StatusDescription'])
@@ -0,0 +1,155 @@
+"""
+Field projection: keeping only the fields of a response a caller asked for,
+see the fields argument of the list and read methods::
+
+    nomad.allocations.list(fields=['ID', 'NodeID', 'ClientStatus',
+                                   'TaskStates.*.State'])
+
+A field is a dotted path of keys. Lists met on the way are descended into,
+so that 'TaskGroups.Name' is the Name of every task group, and * stands for
+every key of an object, e.g. the task names of TaskStates. Fields missing
+from an object are left out of its projection.
+
+Nomad's API has no parameter selecting fields (filter expressions select
+whole objects), so the full body is always transferred. With the msgspec
+codec only the selected fields are decoded, the others are skipped over
+without building any objects for them. With the other codecs the body is
+decoded in full and each object projected in turn, which bounds the memory
+held afterwards but not the time taken to decode it.
+"""
+import six
+
+__all__ = ['Projection']
+
+
+def _tree(fields):
+    """Returns the paths of *fields* as a nested dict of keys, in which None
+    selects the whole value."""
+    tree = {}
+    for field in fields:
+        keys = field.split('.')
+        node = tree
+        for i, key in enumerate(keys):
+            last = i == len(keys) - 1
+            if key in node and node[key] is None:
+                # the whole value is selected already
+                break
+            if last:
+                node[key] = None
+            else:
+                node = node.setdefault(key, {})
+    return tree
+
+
+def _selector(tree):
+    """Returns a function projecting a value onto *tree*, see _tree."""
+    star = tree.get('*', False)
+    star = star if star is None or star is False else _selector(star)
+    leaves = [key for key, sub in six.iteritems(tree)
+              if sub is None and key != '*']
+    nested = [(key, _selector(sub)) for key, sub in six.iteritems(tree)
+              if sub is not None and key != '*']
+
+    def select(value):
+        if type(value) is list:
+            return [select(item) for item in value]
+        if type(value) is not dict:
+            return value
+        if star is not False:
+            selected = dict(value) if star is None else dict(
+                (key, star(item)) for key, item in six.iteritems(value))
+        else:
+            selected = {}
+        for key in leaves:
+            if key in value:
+                selected[key] = value[key]
+        for key, sub in nested:
+            if key in value:
+                selected[key] = sub(value[key])
+        return selected
+    return select
+
+
+def _msgspec_type(tree):
+    """Returns the msgspec type decoding only the fields of *tree*, or None
+    if it can not be expressed as one."""
+    import typing
+    import msgspec
+
+    if tree is None:
+        return typing.Any
+    if '*' in tree:
+        if len(tree) > 1:
+            return None
+        kind = _msgspec_type(tree['*'])
+        return None if kind is None else typing.Dict[str, kind]
+    fields = []
+    rename = {}
+    for i, (key, sub) in enumerate(sorted(six.iteritems(tree))):
+        kind = _msgspec_type(sub)
+        if kind is None:
+            return None
+        if sub is not None:
+            kind = typing.Union[kind, typing.List[kind], None]
+        # keys need not be identifiers, so the attributes are named apart
+        name = 'f%d' % i
+        rename[name] = key
+        fields.append((name, kind, msgspec.UNSET))
+    return msgspec.defstruct('Projection', fields, rename=rename)
+
+
+class Projection(object):
+    """The projection of a JSON value onto *fields*, see the module."""
+
+    # recently used projections by fields, see of
+    _cache = {}
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.tree = _tree(self.fields)
+        self._select = _selector(self.tree)
+        self._decoder = None
+
+    @classmethod
+    def of(klass, fields):
+        """Returns the Projection onto *fields*, shared between calls so that
+        its decoder is only built once."""
+        fields = tuple(fields)
+        projection = klass._cache.get(fields)
+        if projection is None:
+            if len(klass._cache) >= 64:
+                klass._cache.clear()
+            projection = klass._cache[fields] = klass(fields)
+        return projection
+
+    def __call__(self, value):
+        """Returns the projection of *value*, a decoded object or list of
+        objects."""
+        return self._select(value)
+
+    def loads(self, body, codec):
+        """Returns the projection of the JSON *body*, decoded with
+        *codec*."""
+        if getattr(codec, 'name', None) == 'msgspec':
+            decoder = self._msgspec_decoder()
+            if decoder is not None:
+                import msgspec
+                try:
+                    return msgspec.to_builtins(decoder.decode(body))
+                except msgspec.DecodeError:
+                    # shaped other than the fields expect, e.g. a scalar
+                    # where an object was expected, or not JSON at all: the
+                    # codec decodes it or raises its ValueError
+                    pass
+        return self(codec.loads(body))
+
+    def _msgspec_decoder(self):
+        if self._decoder is None:
+            import typing
+            import msgspec.json
+
+            kind = _msgspec_type(self.tree)
+            # False remembers that the fields can not be decoded directly
+            self._decoder = False if kind is None else msgspec.json.Decoder(
+                typing.Union[typing.List[kind], kind])
+        return self._decoder or None
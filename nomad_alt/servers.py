@@ -0,0 +1,179 @@
+import random
+import threading
+from timeit import default_timer
+
+from six.moves.urllib.parse import urlparse
+
+__all__ = ['Retry', 'Servers']
+
+
+class Retry(object):
+    """
+    When and how often to retry a failed request::
+
+        nomad = Nomad(servers=['10.0.0.1', '10.0.0.2', '10.0.0.3'],
+                      retry=Retry(attempts=5))
+
+    A request is attempted at most *attempts* times in total. Each attempt
+    goes to the next server in turn, healthiest first (see Servers). Failing
+    over to another server is immediate; once every server has been tried the
+    next round waits a random time of up to *backoff* seconds, doubling each
+    round up to *max_backoff* ("full jitter"), so that many clients retrying
+    at once do not all hit the servers together.
+
+    Only requests using one of *methods*, those that are safe to repeat, are
+    retried after they may have reached a server: on a connection error, a
+    timeout, or a response with one of *statuses*. A request that never left
+    the client, because the connection could not be established, can be sent
+    to another server whatever its method.
+    """
+
+    def __init__(self, attempts=3, backoff=0.05, max_backoff=2.0,
+                 methods=('GET', 'HEAD'), statuses=(500, 502, 503, 504)):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.methods = methods
+        self.statuses = statuses
+
+    def delay(self, round):
+        """Seconds to wait before attempt *round* (from 0) of the servers."""
+        if round == 0:
+            return 0
+        return random.uniform(
+            0, min(self.max_backoff, self.backoff * 2 ** (round - 1)))
+
+
+def resuming():
+    """The default Retry policy for resuming an event stream."""
+    return Retry(attempts=10, backoff=0.1, max_backoff=5.0)
+
+
+class Servers(object):
+    """
+    The ordered list of Nomad servers a client sends its requests to, with
+    the health of each.
+
+    A server that fails a request is marked down for *cooldown* seconds,
+    doubling with each consecutive failure up to *max_cooldown*. Requests go
+    to the first server that is up, or, should all of them be down, to the
+    one due back soonest. A server is marked up again as soon as it answers.
+
+    The latency of each server is tracked as an exponentially weighted moving
+    average, each new observation having a weight of *alpha*, for spreading
+    stale reads, see spread.
+    """
+
+    def __init__(self, addresses, scheme='http', port=4646, cooldown=1.0,
+                 max_cooldown=30.0, alpha=0.3):
+        self.scheme = scheme
+        self.port = port
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.alpha = alpha
+        self.uris = []
+        self.latency = {}
+        self._down = {}
+        self._lock = threading.Lock()
+        self.add(addresses)
+
+    def __len__(self):
+        return len(self.uris)
+
+    def __iter__(self):
+        return iter(self.uris)
+
+    def uri(self, address):
+        """
+        Returns the base URI for *address*, which may be a URI, host:port or a
+        host, defaulting to this list's scheme and port.
+        """
+        if '://' not in address:
+            address = '%s://%s' % (self.scheme, address)
+        parts = urlparse(address)
+        return '%s://%s:%s' % (
+            parts.scheme, parts.hostname, parts.port or self.port)
+
+    def add(self, addresses):
+        """
+        Appends the servers at *addresses* that are not already known, and
+        returns the full list.
+        """
+        with self._lock:
+            for address in addresses:
+                uri = self.uri(address)
+                if uri not in self.uris:
+                    self.uris.append(uri)
+        return list(self.uris)
+
+    def seed(self, addresses):
+        """
+        Adds the hosts of *addresses*, the RPC addresses returned by
+        /v1/status/peers or /v1/agent/servers, using this list's HTTP scheme
+        and port. See Nomad.seed_servers.
+        """
+        return self.add(
+            [address.rsplit(':', 1)[0] for address in addresses or ()])
+
+    def ordered(self):
+        """Returns the servers in the order requests should try them."""
+        now = default_timer()
+        down = self._down
+        up = [uri for uri in self.uris if uri not in down or down[uri][0] <= now]
+        if len(up) == len(self.uris):
+            return up
+        return up + sorted(
+            (uri for uri in self.uris if uri not in up),
+            key=lambda uri: down[uri][0])
+
+    def spread(self):
+        """
+        Returns the servers in the order a stale read, which any of them can
+        answer, should try them.
+
+        The first is the faster of two servers picked at random from those
+        that are up (the "power of two choices"), so that reads favour fast
+        servers without all of them piling onto the fastest one. A server
+        whose latency has not been measured yet counts as the fastest. The
+        others follow, fastest first.
+        """
+        servers = self.ordered()
+        up = [uri for uri in servers if self.healthy(uri)]
+        latency = self.latency
+        if len(up) > 1:
+            a, b = random.sample(up, 2)
+            first = a if latency.get(a, 0) <= latency.get(b, 0) else b
+            up.remove(first)
+            up.sort(key=lambda uri: latency.get(uri, 0))
+            up.insert(0, first)
+        return up + [uri for uri in servers if uri not in up]
+
+    def observe(self, uri, seconds):
+        """Records that *uri* answered a request in *seconds*."""
+        average = self.latency.get(uri)
+        if average is None:
+            self.latency[uri] = seconds
+        else:
+            self.latency[uri] = average + self.alpha * (seconds - average)
+
+    def failed(self, uri):
+        with self._lock:
+            failures = self._down.get(uri, (0, 0))[1] + 1
+            cooldown = min(
+                self.max_cooldown, self.cooldown * 2 ** (failures - 1))
+            self._down[uri] = (default_timer() + cooldown, failures)
+
+    def succeeded(self, uri, seconds=None):
+        """
+        Marks *uri* up, recording its latency unless *seconds* is None, as
+        for blocking queries whose duration says nothing about the server.
+        """
+        if seconds is not None:
+            self.observe(uri, seconds)
+        if uri in self._down:
+            with self._lock:
+                self._down.pop(uri, None)
+
+    def healthy(self, uri):
+        down = self._down.get(uri)
+        return down is None or down[0] <= default_timer()
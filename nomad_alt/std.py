@@ -1,66 +1,495 @@
-import logging
+import collections
+import itertools
+import threading
+import time
+from timeit import default_timer
 
 import requests
+import requests.adapters
+from urllib3 import connectionpool
+from urllib3.exceptions import ConnectTimeoutError
 
 from nomad_alt import base
+from nomad_alt.exceptions import NomadException
+from nomad_alt.servers import resuming
 from nomad_alt.base import HTTPClient as HTTPClient_base
 
-__all__ = ['Nomad']
+__all__ = ['Nomad', 'PoolStats']
+
+
+# the state of a client's connection pools: the number of pools (one per
+# server), the connections each may keep, those in use and those open and
+# idle, the connections made so far, the times a request found its pool
+# empty and waited (with pool_block) or opened a connection beyond the pool
+# (without), the seconds spent waiting, and the connections closed for
+# finding their pool full
+PoolStats = collections.namedtuple('PoolStats', [
+    'pools', 'maxsize', 'in_use', 'idle', 'opened', 'waits', 'wait_time',
+    'overflows', 'discarded'])
+
+
+class _CountingPool(object):
+    """Counts the use of a urllib3 connection pool, see PoolStats."""
+
+    def __init__(self, *args, **kwargs):
+        super(_CountingPool, self).__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.in_use = 0
+        self.opened = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.overflows = 0
+        self.discarded = 0
+
+    def _get_conn(self, timeout=None):
+        empty = self.pool is not None and self.pool.empty()
+        started = default_timer()
+        conn = super(_CountingPool, self)._get_conn(timeout)
+        with self._stats_lock:
+            self.in_use += 1
+            # a new connection, or one closed since it was last used,
+            # connects when the request is sent
+            if getattr(conn, 'sock', None) is None:
+                self.opened += 1
+            if empty and self.block:
+                self.waits += 1
+                self.wait_time += default_timer() - started
+            elif empty:
+                self.overflows += 1
+        return conn
+
+    def _put_conn(self, conn):
+        with self._stats_lock:
+            self.in_use -= 1
+            if conn is not None and self.pool is not None and \
+                    self.pool.full():
+                self.discarded += 1
+        super(_CountingPool, self)._put_conn(conn)
+
+    def stats(self):
+        idle = sum(1 for conn in list(self.pool.queue)
+                   if getattr(conn, 'sock', None) is not None) \
+            if self.pool is not None else 0
+        with self._stats_lock:
+            return PoolStats(
+                1, self.pool.maxsize if self.pool is not None else 0,
+                self.in_use, idle, self.opened, self.waits, self.wait_time,
+                self.overflows, self.discarded)
+
+
+class _HTTPConnectionPool(_CountingPool, connectionpool.HTTPConnectionPool):
+    pass
+
+
+class _HTTPSConnectionPool(_CountingPool, connectionpool.HTTPSConnectionPool):
+    pass
+
+
+class _Adapter(requests.adapters.HTTPAdapter):
+    """An HTTPAdapter whose connection pools count their use."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(_Adapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _HTTPConnectionPool, 'https': _HTTPSConnectionPool}
+
+    def pools(self):
+        """Returns the connection pools, by server."""
+        pools = self.poolmanager.pools
+        pools = [(key, pools.get(key)) for key in pools.keys()]
+        return dict(('%s://%s:%s' % (key.key_scheme, key.key_host,
+                                     key.key_port), pool)
+                    for key, pool in pools if pool is not None)
 
 
 class HTTPClient(HTTPClient_base):
+    """
+    Blocking adapter for python-nomad-alt using the requests library.
+
+    Requests share one requests session, whose connection pools keep up to
+    *pool_maxsize* connections alive to each of up to *pool_connections*
+    servers. When every connection to a server is in use a request waits
+    for one to be released with *pool_block*, otherwise it opens another,
+    which is closed rather than kept once it is done. Without *keepalive*
+    every request asks for its connection to be closed after it.
+
+    *connect_timeout* and *read_timeout* bound, in seconds, connecting and
+    each read of the response. A blocking query may always take as long as
+    its wait (see timeout).
+    """
+
     def __init__(self, *args, **kwargs):
+        pool_connections = kwargs.pop('pool_connections', 10)
+        pool_maxsize = kwargs.pop('pool_maxsize', 10)
+        pool_block = kwargs.pop('pool_block', False)
+        self.keepalive = kwargs.pop('keepalive', True)
+        self.connect_timeout = kwargs.pop('connect_timeout', None)
+        self.read_timeout = kwargs.pop('read_timeout', None)
         super(HTTPClient, self).__init__(*args, **kwargs)
+        self.pool_maxsize = pool_maxsize
+        self.adapter = _Adapter(pool_connections=pool_connections,
+                                pool_maxsize=pool_maxsize,
+                                pool_block=pool_block)
         self.session = requests.session()
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
 
     def response(self, response):
-        response.encoding = 'utf-8'
         return base.Response(
-            response.status_code, response.headers, response.text)
+            response.status_code, response.headers, response.content,
+            self.codec)
+
+    def _kwargs(self, params, data=None):
+        headers = {
+            "X-Nomad-Token": self.token,
+            "Accept-Encoding": self.accept_encoding,
+        }
+        if not self.keepalive:
+            headers['Connection'] = 'close'
+        return {
+            'data': data,
+            'headers': headers,
+            'verify': self.verify,
+            'cert': self.cert if self.key is None else (self.cert, self.key),
+            'timeout': self._timeout(
+                self.timeout(params, default=self.read_timeout)),
+        }
+
+    def _timeout(self, read):
+        if self.connect_timeout is None:
+            return read
+        return (self.connect_timeout, read)
+
+    def prewarm(self, connections=None):
+        """
+        Opens *connections* (by default pool_maxsize) connections to each
+        server, leaving them idle in the pool so that the first requests
+        need not connect. Returns the number opened.
+        """
+        connections = min(connections or self.pool_maxsize, self.pool_maxsize)
+        opened = 0
+        for server in list(self.servers):
+            responses = []
+            try:
+                # each request holds its connection until its body is read,
+                # so the next has to open another
+                for _ in range(connections):
+                    responses.append(self.session.get(
+                        self.uri('/v1/status/leader', None, server),
+                        stream=True, **self._kwargs(None)))
+                    opened += 1
+            except requests.RequestException as e:
+                self.logger.warning('prewarming %s failed: %s', server, e)
+            for response in responses:
+                # reading the body in full returns the connection to the pool
+                response.content
+        return opened
+
+    def pool_stats(self, by_server=False):
+        """
+        Returns the PoolStats of the connection pools, added up, or with
+        *by_server* a dict of the PoolStats of each server's pool.
+        """
+        stats = dict((server, pool.stats()) for server, pool in
+                     self.adapter.pools().items())
+        if by_server:
+            return stats
+        return PoolStats(*[sum(values) for values in zip(
+            PoolStats(0, 0, 0, 0, 0, 0, 0.0, 0, 0), *stats.values())])
+
+    @staticmethod
+    def bytes_in(response):
+        # urllib3 counts the bytes read off the socket, before decompression
+        try:
+            return response.raw.tell()
+        except (AttributeError, TypeError):
+            return len(response.content)
+
+    @staticmethod
+    def _sent(error):
+        # requests wraps urllib3's failure to connect, in which case nothing
+        # reached the server
+        if isinstance(error, requests.ConnectTimeout):
+            return False
+        reason = getattr(error.args[0] if error.args else None, 'reason', None)
+        return not isinstance(reason, ConnectTimeoutError)
+
+    def _send(self, method, path, params, **kwargs):
+        """
+        Sends the request to the healthiest server, or for a stale read any
+        server, retrying and failing over to other servers as self.retry
+        allows. Returns the response.
+        """
+        params, stale = self.query(method, params)
+        timed = not params or 'index' not in params
+        attempts = self.attempts(method, stale)
+        last = len(attempts) - 1
+        for i, (server, delay) in enumerate(attempts):
+            if delay:
+                time.sleep(delay)
+            try:
+                response = self.session.request(
+                    method, self.uri(path, params, server), **kwargs)
+            except requests.RequestException as e:
+                sent = self._sent(e)
+                if isinstance(e, requests.ConnectionError):
+                    self.servers.failed(server)
+                if i == last or not self.retryable(method, sent):
+                    raise
+                continue
+            if (i < last and response.status_code >= 500 and
+                    self.retryable(method, status=response.status_code)):
+                self.servers.failed(server)
+                response.close()
+                continue
+            self.servers.succeeded(
+                server, response.elapsed.total_seconds() if timed else None)
+            return response
+
+    def _request(self, callback, method, path, params=None, data=None):
+        kwargs = self._kwargs(params, data)
+        if not self.hooks:
+            return callback(self.response(
+                self._send(method, path, params, **kwargs)))
+
+        request = self.before_request(method, path, data)
+        response = self._send(method, path, params, **kwargs)
+        # requests measures the time until the response headers were parsed
+        timings = {'first_byte': response.elapsed.total_seconds()}
+        return self.after_request(
+            request, callback, self.response(response),
+            self.bytes_in(response), timings)
+
+    def stream(self, callback, path, params=None, read_timeout=None,
+               chunk_size=64 * 1024):
+        """
+        Returns a generator of the items decoded from the response as they are
+        read off the socket, up to *chunk_size* bytes at a time. The request
+        is made when iteration starts.
+        """
+        hooked = bool(self.hooks)
+        if hooked:
+            request = self.before_request('GET', path)
+            decode = 0.0
+        kwargs = self._kwargs(params)
+        if read_timeout is not None:
+            # requests applies its timeout to each read from the socket
+            kwargs['timeout'] = self._timeout(read_timeout)
+        # a failed attempt is retried before any of the body has been read
+        response = self._send('GET', path, params, stream=True, **kwargs)
+        try:
+            if response.status_code != 200:
+                # error bodies are small, read them in full for the message
+                decoder = callback(self.response(response))
+            else:
+                decoder = callback(base.Response(
+                    response.status_code, response.headers, None,
+                    self.codec))
+            if decoder is None:
+                return
+            for chunk in response.iter_content(chunk_size):
+                if hooked:
+                    started = default_timer()
+                    items = decoder.feed(chunk)
+                    decode += default_timer() - started
+                else:
+                    items = decoder.feed(chunk)
+                for item in items:
+                    yield item
+            for item in decoder.close():
+                yield item
+        finally:
+            response.close()
+            if hooked:
+                self.emit(
+                    request, response.status_code, self.bytes_in(response),
+                    {'first_byte': response.elapsed.total_seconds(),
+                     'decode': decode})
+
+    def follow(self, callback, path, params=None, advance=None,
+               heartbeat=30, retry=None):
+        """
+        Returns a generator of the items of a stream, resuming the stream
+        whenever it is interrupted. It ends should the server end the stream
+        as many times in a row as *retry* allows attempts.
+        """
+        params = dict(params or {})
+        retry = retry or resuming()
+        failures = 0
+        while True:
+            try:
+                # with no chunk_size each chunk is handed on as it arrives
+                for item in self.stream(
+                        callback, path, params, read_timeout=heartbeat,
+                        chunk_size=None):
+                    failures = 0
+                    for entry in advance(params, item):
+                        yield entry
+            except (requests.RequestException, NomadException,
+                    ValueError) as e:
+                if not self.resumable(e):
+                    raise
+                failures += 1
+                if failures >= retry.attempts:
+                    raise
+            else:
+                # the server ended the stream, e.g. as it shut down
+                failures += 1
+                if failures >= retry.attempts:
+                    return
+            time.sleep(retry.delay(failures))
+
+    def paginate(self, callback, path, params=None, per_page=100,
+                 prefetch=True):
+        """
+        Returns a generator of the items of a paginated list. With *prefetch*
+        the next page is fetched on a background thread while the current
+        page is being iterated over.
+        """
+        token, items = self.get(
+            callback, path, self.page_params(params, per_page, None))
+        while True:
+            fetch = None
+            if token is not None and prefetch:
+                fetch = _Fetch(self.get, callback, path,
+                               self.page_params(params, per_page, token))
+            for item in items:
+                yield item
+            if token is None:
+                return
+            if fetch is not None:
+                token, items = fetch.result()
+            else:
+                token, items = self.get(
+                    callback, path, self.page_params(params, per_page, token))
+
+    def many(self, calls, concurrency=8, ordered=True):
+        """
+        Returns a generator of the Results of *calls*, made on a pool of
+        *concurrency* threads. The requests share this client's connection
+        pool, which should be at least *concurrency* connections large. No
+        more than twice *concurrency* calls are taken from *calls* ahead of
+        the Results the caller has been handed.
+        """
+        # only imported when needed, it takes longer than the rest of a
+        # client to import
+        from concurrent import futures
+
+        def call(c):
+            c = base.Call(*c)
+            try:
+                return base.Result(c.id, self.chain(c), None)
+            except NomadException as e:
+                return base.Result(c.id, None, e)
+
+        pool = futures.ThreadPoolExecutor(concurrency)
+        calls = iter(calls)
+        pending = collections.deque()
+
+        def submit():
+            for c in itertools.islice(calls, 2 * concurrency - len(pending)):
+                pending.append(pool.submit(call, c))
+
+        try:
+            submit()
+            while pending:
+                if ordered:
+                    done = [pending.popleft()]
+                else:
+                    done = futures.wait(
+                        pending, return_when=futures.FIRST_COMPLETED)[0]
+                    for f in done:
+                        pending.remove(f)
+                # keep the pool busy while the caller handles these
+                submit()
+                for f in done:
+                    yield f.result()
+        finally:
+            # the caller may have stopped early, skip whatever has not started
+            for f in pending:
+                f.cancel()
+            pool.shutdown(wait=False)
+
+    def chain(self, call):
+        data = self.send(call)
+        while isinstance(data, base.Call):
+            data = self.send(data)
+        return data
 
     def get(self, callback, path, params=None):
-        uri = self.uri(path, params)
-        logging.warning("Get from %s using %s", uri, self.cert)
-        return callback(self.response(
-            self.session.get(uri,
-                             headers={"X-Nomad-Token": self.token},
-                             verify=self.verify,
-                             cert=self.cert if self.key is None else (self.cert, self.key)
-                             )))
+        if self.cache is not None:
+            return self.cache.get(self, callback, path, params)
+        return self._request(callback, 'GET', path, params)
 
     def put(self, callback, path, params=None, data=''):
-        uri = self.uri(path, params)
-        logging.warning("Put to %s", uri)
-        return callback(self.response(
-            self.session.put(uri,
-                             data=data,
-                             headers={"X-Nomad-Token": self.token},
-                             verify=self.verify,
-                             cert=self.cert if self.key is None else (self.cert, self.key)
-                             )))
+        if self.cache is not None:
+            callback = self.cache.invalidating(callback, path)
+        return self._request(callback, 'PUT', path, params, data)
 
     def delete(self, callback, path, params=None):
-        uri = self.uri(path, params)
-        logging.warning("delete from %s", uri)
-        return callback(self.response(
-            self.session.delete(uri,
-                                headers={"X-Nomad-Token": self.token},
-                                verify=self.verify,
-                                cert=self.cert if self.key is None else (self.cert, self.key)
-                                )))
+        if self.cache is not None:
+            callback = self.cache.invalidating(callback, path)
+        return self._request(callback, 'DELETE', path, params)
 
     def post(self, callback, path, params=None, data=''):
-        uri = self.uri(path, params)
-        logging.warning("Post to %s", uri)
-        return callback(self.response(
-            self.session.post(uri,
-                              data=data,
-                              headers={"X-Nomad-Token": self.token},
-                              verify=self.verify,
-                              cert=self.cert if self.key is None else (self.cert, self.key)
-                              )))
+        if self.cache is not None:
+            callback = self.cache.invalidating(callback, path)
+        return self._request(callback, 'POST', path, params, data)
+
+
+class _Fetch(threading.Thread):
+    """Calls *get* on a daemon thread, see result."""
+
+    def __init__(self, get, *args):
+        super(_Fetch, self).__init__()
+        self.daemon = True
+        self._get = get
+        self._args = args
+        self._result = None
+        self._error = None
+        self.start()
+
+    def run(self):
+        try:
+            self._result = self._get(*self._args)
+        except Exception as e:
+            self._error = e
+
+    def result(self):
+        """Waits for the call to complete, returning its result or raising
+        its exception."""
+        self.join()
+        if self._error is not None:
+            raise self._error
+        return self._result
 
 
 class Nomad(base.Nomad):
+    """
+    Blocking Nomad client.
+
+    :param pool_connections: Number of servers to keep a connection pool for (default 10)
+    :param pool_maxsize: Maximum number of connections kept open to the same server (default 10)
+    :param pool_block: Whether a request waits for a connection when all of a server's are in use, rather than opening one more and closing it after (default False)
+    :param keepalive: Whether connections are kept open between requests (default True)
+    :param connect_timeout: Seconds to wait for a connection to be established (default None, no limit)
+    :param read_timeout: Seconds to wait for each read of a response, other than a blocking query's wait (default None, no limit)
+    :param prewarm: Number of connections to open to each server up front, True for pool_maxsize (default 0)
+
+    The remaining parameters are those of :class:`nomad_alt.base.Nomad`.
+    The state of the pools is returned by ``nomad.http.pool_stats()``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.pool_options = dict(
+            (name, kwargs.pop(name)) for name in (
+                'pool_connections', 'pool_maxsize', 'pool_block', 'keepalive',
+                'connect_timeout', 'read_timeout') if name in kwargs)
+        prewarm = kwargs.pop('prewarm', 0)
+        super(Nomad, self).__init__(*args, **kwargs)
+        if prewarm:
+            self.http.prewarm(None if prewarm is True else prewarm)
+
     def connect(self, host, port, scheme, verify=True, cert=None, token=None, key=None, ca=None):
-        return HTTPClient(host, port, scheme, verify, cert, token=token, key=key, ca=ca)
+        return HTTPClient(host, port, scheme, verify, cert, token=token, key=key, ca=ca,
+                          **self.pool_options)
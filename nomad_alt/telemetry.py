@@ -0,0 +1,698 @@
+"""
+Agent metrics as columns rather than dicts, and sampled over time.
+
+A Frame holds one scrape of /v1/metrics, in either format, as three parallel
+columns: the metric names, their label sets and their values, the values in
+a compact array of doubles. Names and label sets are shared between samples
+and between scrapes by a Parser, so a scrape of thousands of samples costs
+three lists and an array, not a dict per sample::
+
+    frame = nomad.metrics.fetch('prometheus')
+    frame.get('nomad_nomad_broker_total_ready')
+
+A Sampler scrapes a set of agents every *interval* seconds into a ring
+buffer of the last *size* scrapes, from which rates and deltas are computed
+with numpy (which it needs) over every series at once::
+
+    sampler = Sampler({'server-1': server_1, 'client-1': client_1})
+    sampler.start()
+    rates = sampler.rates(window=60)
+    for column in sampler.select('nomad_client_allocs_cpu_total_ticks'):
+        print(sampler.keys[column], rates[column])
+
+An AllocationSampler does the same for the resource usage of allocations,
+querying the stats of many at once, and summarises a series by job, task
+group or node::
+
+    sampler = AllocationSampler(nomad, nodes=node_ids, node_rate=5)
+    sampler.start()
+    cpu = sampler.rollup('cpu_percent', by='job')
+    for job, p95 in zip(cpu.groups, cpu.p95):
+        print(job, p95)
+"""
+import array
+import collections
+import heapq
+import logging
+import re
+import threading
+import time
+import warnings
+
+from timeit import default_timer
+
+import six
+
+from nomad_alt.exceptions import NomadException
+
+__all__ = ['AllocationSampler', 'Frame', 'Parser', 'RingBuffer', 'Rollup',
+           'Sampler']
+
+# the aggregates of a counter or sample in the JSON format, and the suffix of
+# the name each is reported under
+AGGREGATES = (('Count', '.count'), ('Sum', '.sum'), ('Min', '.min'),
+              ('Max', '.max'), ('Mean', '.mean'))
+
+_LABEL = re.compile(r'\s*([a-zA-Z_][a-zA-Z0-9_]*)\s*=\s*"((?:[^"\\]|\\.)*)"')
+_ESCAPE = re.compile(r'\\(.)')
+_ESCAPES = {'n': '\n', '\\': '\\', '"': '"'}
+
+
+def _unescape(value):
+    if '\\' not in value:
+        return value
+    return _ESCAPE.sub(lambda m: _ESCAPES.get(m.group(1), m.group(0)), value)
+
+
+class Frame(object):
+    """
+    One scrape of an agent's metrics: the *names*, *labels* (a sorted tuple
+    of (name, value) pairs, the same tuple for every sample with the same
+    labels) and *values* (an array of doubles) of each sample, the *types*
+    of the metrics whose type was reported, and the *timestamp* it was taken
+    at, in seconds since the epoch.
+    """
+
+    __slots__ = ('names', 'labels', 'values', 'types', 'timestamp')
+
+    def __init__(self, names, labels, values, types=None, timestamp=None):
+        self.names = names
+        self.labels = labels
+        self.values = values
+        self.types = types or {}
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        """Yields each sample as a (name, labels, value) tuple."""
+        return six.moves.zip(self.names, self.labels, self.values)
+
+    def __repr__(self):
+        return '<Frame of %d samples>' % len(self)
+
+    def get(self, name, labels=(), default=None):
+        """Returns the value of the sample of *name* and *labels* (a dict
+        or tuple of pairs)."""
+        if isinstance(labels, dict):
+            labels = tuple(sorted(labels.items()))
+        for i, sample in enumerate(self.names):
+            if sample == name and self.labels[i] == labels:
+                return self.values[i]
+        return default
+
+    def select(self, name):
+        """Returns the (labels, value) of each sample of *name*."""
+        return [(self.labels[i], self.values[i])
+                for i, sample in enumerate(self.names) if sample == name]
+
+    def array(self):
+        """Returns the values as a numpy array, sharing their memory."""
+        import numpy
+        return numpy.frombuffer(self.values, dtype=numpy.float64)
+
+
+class Parser(object):
+    """
+    Parses scrapes into Frames, sharing the name and label set objects of
+    every Frame it parses. Keep one per agent scraped over time, as a
+    Sampler does, so that repeated scrapes reuse the label sets already
+    parsed rather than parsing them again.
+    """
+
+    def __init__(self):
+        self._names = {}
+        # the label sets by their text, and by themselves
+        self._raw = {}
+        self._labels = {(): ()}
+
+    def _name(self, name):
+        return self._names.setdefault(name, name)
+
+    def _label_set(self, pairs):
+        return self._labels.setdefault(pairs, pairs)
+
+    def prometheus(self, text):
+        """Parses the Prometheus text exposition format."""
+        if isinstance(text, six.binary_type):
+            text = text.decode('utf-8')
+        names = []
+        labels = []
+        values = array.array('d')
+        types = {}
+        raw = self._raw
+        for line in text.splitlines():
+            if not line or line[0] == '#':
+                if line.startswith('# TYPE '):
+                    parts = line.split()
+                    if len(parts) >= 4:
+                        types[self._name(parts[2])] = parts[3]
+                continue
+            brace = line.find('{')
+            if brace == -1:
+                parts = line.split()
+                if len(parts) < 2:
+                    continue
+                name, label_set, value = parts[0], (), parts[1]
+            else:
+                end = line.rfind('}')
+                name = line[:brace].strip()
+                pairs = line[brace:end + 1]
+                label_set = raw.get(pairs)
+                if label_set is None:
+                    label_set = raw[pairs] = self._label_set(tuple(sorted(
+                        (self._name(key), _unescape(escaped))
+                        for key, escaped in _LABEL.findall(pairs[1:-1]))))
+                value = line[end + 1:].split()[0]
+            names.append(self._name(name))
+            labels.append(label_set)
+            # float takes NaN, +Inf and -Inf as Prometheus writes them
+            values.append(float(value))
+        return Frame(names, labels, values, types)
+
+    def json(self, data):
+        """
+        Parses the JSON format: gauges are reported under their name,
+        counters and samples as the aggregates of the current interval under
+        their name with the suffix of each in AGGREGATES.
+        """
+        names = []
+        labels = []
+        values = array.array('d')
+        types = {}
+        for gauge in data.get('Gauges') or ():
+            name = self._name(gauge['Name'])
+            names.append(name)
+            labels.append(self._json_labels(gauge.get('Labels')))
+            values.append(gauge.get('Value') or 0.0)
+            types[name] = 'gauge'
+        for kind, metrics in (('counter', data.get('Counters')),
+                              ('sample', data.get('Samples'))):
+            for metric in metrics or ():
+                label_set = self._json_labels(metric.get('Labels'))
+                for field, suffix in AGGREGATES:
+                    name = self._name(metric['Name'] + suffix)
+                    names.append(name)
+                    labels.append(label_set)
+                    values.append(metric.get(field) or 0.0)
+                    types[name] = kind
+        return Frame(names, labels, values, types)
+
+    def _json_labels(self, labels):
+        if not labels:
+            return ()
+        return self._label_set(tuple(sorted(
+            (self._name(key), value) for key, value in labels.items())))
+
+
+class RingBuffer(object):
+    """
+    The last *size* rows of a growing set of columns, in a preallocated numpy
+    array of doubles, with the time of each row. Columns are added as new
+    series are seen, a row missing a column holds NaN.
+
+    A RingBuffer is not thread safe, Samplers guard their own.
+    """
+
+    def __init__(self, size, columns=64):
+        import numpy
+        self._np = numpy
+        self.size = size
+        self.count = 0
+        self.times = numpy.full(size, numpy.nan)
+        self.data = numpy.full((size, columns), numpy.nan)
+        self.width = 0
+
+    def add_columns(self, n):
+        """Returns the indexes of *n* new columns."""
+        np = self._np
+        start = self.width
+        self.width += n
+        capacity = self.data.shape[1]
+        if self.width > capacity:
+            capacity = max(self.width, capacity * 2)
+            data = np.full((self.size, capacity), np.nan)
+            data[:, :start] = self.data[:, :start]
+            self.data = data
+        return np.arange(start, self.width)
+
+    def row(self, timestamp):
+        """Starts a row at *timestamp*, returning its index."""
+        row = self.count % self.size
+        self.count += 1
+        self.times[row] = timestamp
+        self.data[row, :self.width] = self._np.nan
+        return row
+
+    def order(self, window=None):
+        """Returns the indexes of the rows, oldest first, of the last
+        *window* seconds."""
+        np = self._np
+        n = min(self.count, self.size)
+        rows = np.arange(self.count - n, self.count) % self.size
+        if window is not None and n:
+            times = self.times[rows]
+            rows = rows[times >= times[-1] - window]
+        return rows
+
+    def values(self, window=None):
+        """Returns the times and values of the rows, oldest first."""
+        rows = self.order(window)
+        return self.times[rows], self.data[rows, :self.width]
+
+    def latest(self):
+        """Returns the values of the last row."""
+        if not self.count:
+            return self._np.full(self.width, self._np.nan)
+        return self.data[(self.count - 1) % self.size, :self.width].copy()
+
+    def deltas(self, window=None):
+        """Returns the change of each column from each row to the next."""
+        _, values = self.values(window)
+        return self._np.diff(values, axis=0)
+
+    def rates(self, window=None, counter=True):
+        """
+        Returns the per second rate of change of each column over the
+        rows. With *counter* a fall in value is taken to be a counter reset,
+        so it counts as the value after it. Columns with fewer than two
+        values have a rate of NaN.
+        """
+        np = self._np
+        times, values = self.values(window)
+        deltas = np.diff(values, axis=0)
+        if counter:
+            deltas = np.where(deltas < 0, values[1:], deltas)
+        seen = ~np.isnan(deltas)
+        # the seconds between the rows each delta was taken over
+        spans = np.diff(times)[:, None] * seen
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rates = np.where(seen, deltas, 0.0).sum(axis=0) / spans.sum(axis=0)
+        rates[~seen.any(axis=0)] = np.nan
+        return rates
+
+
+class Sampler(object):
+    """
+    Scrapes the metrics of *agents*, a dict of names to Nomad clients (each
+    talking to the agent to scrape) or a single client, every *interval*
+    seconds in *format*, keeping the last *size* scrapes in a RingBuffer.
+
+    Each series is a column, *keys* holding the (agent, name, labels) of
+    each: latest, deltas and rates return arrays of the columns in that
+    order, select the columns of a metric.
+
+    start samples in a daemon thread and needs a blocking (nomad_alt.std)
+    client. With the tornado or asyncio clients call record with the Frames
+    fetched instead.
+    """
+
+    logger = logging.getLogger('nomad_alt.telemetry.Sampler')
+
+    def __init__(self, agents, interval=10, size=360, format='prometheus'):
+        if not isinstance(agents, dict):
+            agents = {'%s:%s' % (agents.http.host, agents.http.port): agents}
+        self.agents = agents
+        self.interval = interval
+        self.format = format
+        self.buffer = RingBuffer(size)
+        self.keys = []
+        self.columns = {}
+        self.errors = {}
+        self._parsers = dict((agent, Parser()) for agent in agents)
+        # the names and labels each agent last reported, and their columns
+        self._layouts = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        """Scrapes every agent once, recording the Frames as one row."""
+        frames = {}
+        for agent, nomad in six.iteritems(self.agents):
+            try:
+                frames[agent] = nomad.metrics.fetch(
+                    self.format, columnar=True, parser=self._parsers[agent])
+            except (NomadException, IOError) as e:
+                self.logger.warning('scraping %s failed: %s', agent, e)
+                self.errors[agent] = e
+            else:
+                self.errors.pop(agent, None)
+        self.record(frames)
+
+    def record(self, frames, timestamp=None):
+        """Records *frames*, a dict of agent names to Frames, as one row."""
+        if timestamp is None:
+            timestamp = max([f.timestamp for f in frames.values()] or
+                            [time.time()])
+        with self._lock:
+            row = self.buffer.row(timestamp)
+            for agent, frame in six.iteritems(frames):
+                columns = self._columns(agent, frame)
+                self.buffer.data[row, columns] = frame.array()
+
+    def _columns(self, agent, frame):
+        layout = self._layouts.get(agent)
+        # a scrape usually reports the same series in the same order as the
+        # last, the names and labels being the same objects this compares fast
+        if layout is not None and layout[0] == frame.names and \
+                layout[1] == frame.labels:
+            return layout[2]
+        keys = [(agent, name, labels)
+                for name, labels in zip(frame.names, frame.labels)]
+        new = []
+        for key in keys:
+            if key not in self.columns and key not in new:
+                new.append(key)
+        for key, column in zip(new, self.buffer.add_columns(len(new))):
+            self.columns[key] = column
+            self.keys.append(key)
+        columns = self.buffer._np.array(
+            [self.columns[key] for key in keys], dtype=int)
+        self._layouts[agent] = (frame.names, frame.labels, columns)
+        return columns
+
+    def select(self, name, agent=None, **labels):
+        """Returns the columns of the series of *name*, of *agent* and with
+        *labels* if given."""
+        with self._lock:
+            return [column for column, key in enumerate(self.keys)
+                    if key[1] == name and
+                    (agent is None or key[0] == agent) and
+                    all(pair in key[2] for pair in labels.items())]
+
+    def latest(self):
+        with self._lock:
+            return self.buffer.latest()
+
+    def deltas(self, window=None):
+        with self._lock:
+            return self.buffer.deltas(window)
+
+    def rates(self, window=None, counter=True):
+        with self._lock:
+            return self.buffer.rates(window, counter)
+
+    def values(self, window=None):
+        """Returns the times of the rows and their values, oldest first."""
+        with self._lock:
+            times, values = self.buffer.values(window)
+            return times, values.copy()
+
+    def start(self):
+        """Samples every *interval* seconds in the background."""
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stops sampling, waiting up to *timeout* seconds for the scrape in
+        progress."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run(self):
+        """Samples every *interval* seconds until stopped. A round that
+        fails is logged, and sampling goes on."""
+        while not self._stopping.is_set():
+            started = default_timer()
+            try:
+                self.sample()
+            except Exception:
+                self.logger.exception('sampling the metrics failed')
+            self._stopping.wait(
+                max(0.0, self.interval - (default_timer() - started)))
+
+
+# the group of allocations each rollup is by, and the fields of an
+# allocation making up its key
+GROUPS = {
+    'job': ('Namespace', 'JobID'),
+    'task_group': ('Namespace', 'JobID', 'TaskGroup'),
+    'node': ('NodeID',),
+}
+
+# the series an AllocationSampler keeps, and where in the ResourceUsage of
+# an allocation's stats each is read from
+USAGE = (
+    ('cpu_percent', ('CpuStats', 'Percent')),
+    ('cpu_ticks', ('CpuStats', 'TotalTicks')),
+    ('memory_rss', ('MemoryStats', 'RSS')),
+    ('memory_usage', ('MemoryStats', 'Usage')),
+)
+
+USAGE_FIELDS = ['ResourceUsage.%s.%s' % path for _, path in USAGE]
+
+ALLOCATION_FIELDS = ['ID', 'Namespace', 'JobID', 'TaskGroup', 'NodeID',
+                     'ClientStatus']
+
+# the groups of a rollup and, for each, the number of allocations it was
+# taken over and the median, 95th percentile and maximum of their values
+Rollup = collections.namedtuple(
+    'Rollup', ['groups', 'count', 'p50', 'p95', 'max'])
+
+
+def rollup(codes, values, groups):
+    """
+    Returns the Rollup of *values* by group, *codes* being the index in
+    *groups* of the group of each value. NaN values are left out, as are
+    the groups left with none.
+    """
+    import numpy as np
+    kept = ~np.isnan(values)
+    codes, values = codes[kept], values[kept]
+    order = np.lexsort((values, codes))
+    codes, values = codes[order], values[order]
+    counts = np.bincount(codes, minlength=len(groups))
+    present = np.nonzero(counts)[0]
+    counts = counts[present]
+    starts = np.cumsum(counts) - counts
+
+    def percentile(q):
+        # linear interpolation between the closest ranks, as numpy's default
+        position = starts + q * (counts - 1)
+        low = np.floor(position).astype(int)
+        high = np.ceil(position).astype(int)
+        return values[low] + (values[high] - values[low]) * (position - low)
+
+    return Rollup([groups[i] for i in present], counts, percentile(0.5),
+                  percentile(0.95), values[starts + counts - 1])
+
+
+class AllocationSampler(object):
+    """
+    Samples the resource usage of many allocations, every *interval*
+    seconds, keeping the last *size* samples of each series of USAGE in a
+    RingBuffer with a column per allocation.
+
+    The allocations are *allocations*, either allocation stubs (which are
+    sampled as given) or IDs, or else the running allocations of *nodes*
+    (node IDs), or of the whole cluster. Unless given as stubs they are
+    listed afresh before each round of sampling.
+
+    Each round queries up to *concurrency* allocations at once, taking the
+    allocations of each node in turn, and with *node_rate* no more than that
+    many of a node's allocations a second, so as not to load any one client
+    unduly. Stats are read through the servers, which forward them to the
+    clients. An allocation keeps its column once it has gone, holding NaN.
+
+    rollup summarises a series by job, task group or node. start samples in
+    a daemon thread and needs a blocking (nomad_alt.std) client, as
+    node_rate is kept by sleeping. With the tornado or asyncio clients call
+    record with the stats fetched instead, e.g. by Client.allocation_many.
+    """
+
+    logger = logging.getLogger('nomad_alt.telemetry.AllocationSampler')
+
+    def __init__(self, nomad, allocations=None, nodes=None, interval=30,
+                 size=120, concurrency=32, node_rate=None):
+        self.nomad = nomad
+        self.allocations = None
+        self.ids = None
+        if allocations is not None:
+            allocations = list(allocations)
+            if allocations and isinstance(allocations[0], six.string_types):
+                self.ids = frozenset(allocations)
+            else:
+                self.allocations = allocations
+        self.nodes = frozenset(nodes) if nodes is not None else None
+        self.interval = interval
+        self.concurrency = concurrency
+        self.node_rate = node_rate
+        self.buffers = dict((name, RingBuffer(size)) for name, _ in USAGE)
+        # the allocation of each column, the column of each allocation, and
+        # the code of the group of each column in each of GROUPS
+        self.keys = []
+        self.columns = {}
+        self.groups = dict((by, []) for by in GROUPS)
+        self._group_codes = dict((by, {}) for by in GROUPS)
+        self._codes = dict((by, []) for by in GROUPS)
+        self.errors = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def targets(self):
+        """Returns the allocations to sample."""
+        if self.allocations is not None:
+            return self.allocations
+        allocations = self.nomad.allocations.list(fields=ALLOCATION_FIELDS)
+        return [alloc for alloc in allocations or ()
+                if alloc.get('ClientStatus') == 'running' and
+                (self.ids is None or alloc['ID'] in self.ids) and
+                (self.nodes is None or alloc.get('NodeID') in self.nodes)]
+
+    def calls(self, allocations):
+        """
+        Yields the Calls querying the stats of *allocations*, a node at a
+        time in turn, sleeping as needed to keep to node_rate.
+        """
+        by_node = collections.OrderedDict()
+        for alloc in allocations:
+            by_node.setdefault(alloc.get('NodeID'), []).append(alloc['ID'])
+        interval = 1.0 / self.node_rate if self.node_rate else 0.0
+        # (the time the node is next due, the order it was due in, node)
+        due = [(0.0, i, node) for i, node in enumerate(by_node)]
+        heapq.heapify(due)
+        client = self.nomad.client
+        turn = len(due)
+        while due:
+            at, _, node = heapq.heappop(due)
+            now = default_timer()
+            if at > now:
+                time.sleep(at - now)
+                now = at
+            ids = by_node[node]
+            yield client._allocation_call(ids.pop(), USAGE_FIELDS)
+            if ids:
+                heapq.heappush(due, (now + interval, turn, node))
+                turn += 1
+
+    def sample(self):
+        """Queries the stats of every allocation once, recording them as one
+        row."""
+        started = time.time()
+        allocations = self.targets()
+        stats = {}
+        errors = {}
+        for result in self.nomad.http.many(
+                self.calls(allocations), concurrency=self.concurrency,
+                ordered=False):
+            if result.error is not None:
+                errors[result.id] = result.error
+            else:
+                stats[result.id] = result.data
+        if errors:
+            self.logger.warning('querying the stats of %d of %d allocations '
+                                'failed', len(errors), len(allocations))
+        self.errors = errors
+        self.record(allocations, stats, started)
+
+    def record(self, allocations, stats, timestamp=None):
+        """
+        Records *stats*, a dict of allocation IDs to their stats, as one row
+        at *timestamp*. *allocations* are the stubs of the allocations
+        sampled, whose job, task group and node they are grouped by.
+        """
+        import numpy as np
+        if timestamp is None:
+            timestamp = time.time()
+        columns = []
+        values = dict((name, []) for name, _ in USAGE)
+        with self._lock:
+            self._add(allocations)
+            for alloc_id, data in six.iteritems(stats):
+                column = self.columns.get(alloc_id)
+                usage = (data or {}).get('ResourceUsage')
+                if column is None or not usage:
+                    continue
+                columns.append(column)
+                for name, (group, field) in USAGE:
+                    values[name].append(
+                        (usage.get(group) or {}).get(field, np.nan))
+            columns = np.array(columns, dtype=int)
+            for name, buffer in six.iteritems(self.buffers):
+                row = buffer.row(timestamp)
+                buffer.data[row, columns] = np.array(values[name], dtype=float)
+
+    def _add(self, allocations):
+        new = [alloc for alloc in allocations
+               if alloc['ID'] not in self.columns]
+        if not new:
+            return
+        for buffer in self.buffers.values():
+            columns = buffer.add_columns(len(new))
+        for alloc, column in zip(new, columns):
+            self.columns[alloc['ID']] = column
+            self.keys.append(alloc['ID'])
+            for by, fields in six.iteritems(GROUPS):
+                key = tuple(alloc.get(field) for field in fields)
+                codes = self._group_codes[by]
+                if key not in codes:
+                    codes[key] = len(self.groups[by])
+                    self.groups[by].append(key)
+                self._codes[by].append(codes[key])
+
+    def values(self, name, window=None):
+        """Returns the times of the rows and the values of series *name*,
+        oldest first, a column per allocation (see keys)."""
+        with self._lock:
+            times, values = self.buffers[name].values(window)
+            return times, values.copy()
+
+    def latest(self, name):
+        """Returns the last value of series *name* of each allocation."""
+        with self._lock:
+            return self.buffers[name].latest()
+
+    def rollup(self, name='cpu_percent', by='job', window=None):
+        """
+        Returns the Rollup of series *name* by *by*, one of GROUPS, of the
+        last value of each allocation, or with *window* of the mean of its
+        values over the last that many seconds. A job or task group is
+        identified by its namespace and job ID (and name), a node by its ID.
+        """
+        import numpy as np
+        with self._lock:
+            buffer = self.buffers[name]
+            if window is None:
+                values = buffer.latest()
+            else:
+                with warnings.catch_warnings():
+                    # allocations with no value in the window are NaN
+                    warnings.simplefilter('ignore', RuntimeWarning)
+                    values = np.nanmean(buffer.values(window)[1], axis=0)
+            codes = np.array(self._codes[by], dtype=int)
+            return rollup(codes, values, self.groups[by])
+
+    def start(self):
+        """Samples every *interval* seconds in the background."""
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stops sampling, waiting up to *timeout* seconds for the round in
+        progress."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run(self):
+        """Samples every *interval* seconds until stopped. A round that
+        fails, e.g. as the allocations could not be listed, is logged, and
+        sampling goes on."""
+        while not self._stopping.is_set():
+            started = default_timer()
+            try:
+                self.sample()
+            except Exception:
+                self.logger.exception('sampling the allocations failed')
+            self._stopping.wait(
+                max(0.0, self.interval - (default_timer() - started)))
@@ -1,16 +1,220 @@
 from __future__ import absolute_import
 import logging
+import math
+import socket
+
+from timeit import default_timer
 
 from tornado import gen
 from tornado import httpclient
+from tornado import httputil
+from tornado import ioloop
+from tornado import locks
+from tornado import iostream
+from tornado import queues
+from tornado import simple_httpclient
+from tornado import tcpclient
+from tornado.concurrent import Future
 
 import nomad_alt
 import nomad_alt.base
 import nomad_alt.exceptions
 from nomad_alt import base
+from nomad_alt.exceptions import NomadException
+from nomad_alt.servers import resuming
 
 __all__ = ['Nomad']
 
+
+class Stream(object):
+    """
+    The items of a streaming or paginated response, in the order they
+    arrive.
+
+    In a coroutine, ``item = yield stream.read()`` resolves to the next item,
+    or to None once the response is complete. On Python 3.5+ the stream can
+    also be consumed with ``async for item in stream``. Errors, such as a 403
+    or a Timeout, are raised by read().
+
+    Tornado gives no way to pause a response body, so decoded items queue up
+    here if the consumer falls behind the network.
+
+    With *read_timeout* the stream fails with a Timeout should nothing arrive
+    for that many seconds, and its connection is closed, so that one left
+    half open by the server does not linger.
+
+    *on_read* is called as each item is read, e.g. to take more work on.
+
+    close() stops a stream that is no longer wanted, such as one followed
+    with HTTPClient.follow.
+    """
+
+    _END = object()
+
+    def __init__(self, callback, read_timeout=None, codec=None, on_read=None):
+        self.callback = callback
+        self.read_timeout = read_timeout
+        self.codec = codec
+        self.on_read = on_read
+        self.code = None
+        self.headers = httputil.HTTPHeaders()
+        self.decoder = None
+        self.error = None
+        self.bytes_in = 0
+        self.decode = 0.0
+        self.closed = False
+        # closes the connection the stream is read from, if it can be
+        self.abort = None
+        self._errors = []
+        self._queue = queues.Queue()
+        self._watchdog = None
+        self._watch()
+
+    def _watch(self):
+        if self.read_timeout is None:
+            return
+        loop = ioloop.IOLoop.current()
+        if self._watchdog is not None:
+            loop.remove_timeout(self._watchdog)
+        self._watchdog = loop.call_later(self.read_timeout, self._expire)
+
+    def _expire(self):
+        self._watchdog = None
+        self.fail(nomad_alt.exceptions.Timeout())
+        if self.abort is not None:
+            self.abort()
+
+    def header_callback(self, line):
+        self._watch()
+        if self.code is None and line.startswith('HTTP/'):
+            self.code = int(line.split(' ', 2)[1])
+        elif line.strip() and not line.startswith('HTTP/'):
+            self.headers.parse_line(line)
+
+    def streaming_callback(self, chunk):
+        if self.closed:
+            # the stream has timed out or been closed, abort the request
+            raise nomad_alt.exceptions.Timeout
+        self._watch()
+        self.bytes_in += len(chunk)
+        if self.code != 200:
+            self._errors.append(chunk)
+            return
+        if self.error is not None:
+            return
+        started = default_timer()
+        try:
+            if self.decoder is None:
+                self.decoder = self.callback(
+                    base.Response(self.code, self.headers, None, self.codec))
+            for item in self.decoder.feed(chunk):
+                self._queue.put_nowait(item)
+        except Exception as e:
+            self.error = e
+        self.decode += default_timer() - started
+
+    def finish(self, response):
+        if self.error is not None:
+            raise self.error
+        if self.decoder is None:
+            body = b''.join(self._errors).decode('utf-8')
+            self.decoder = self.callback(
+                base.Response(response.code, response.headers, body))
+        if self.decoder is not None:
+            for item in self.decoder.close():
+                self._queue.put_nowait(item)
+        self.end()
+
+    def put(self, item):
+        self._queue.put_nowait(item)
+
+    def drained(self):
+        """Returns a Future that resolves once every item put so far has been
+        read."""
+        return self._queue.join()
+
+    def end(self):
+        self._close(self._END)
+
+    def fail(self, exc):
+        self._close(_Failure(exc))
+
+    def close(self):
+        """Ends the stream, and closes the connection it is read from."""
+        self.end()
+        if self.abort is not None:
+            self.abort()
+
+    def _close(self, marker):
+        if self.closed:
+            return
+        self.closed = True
+        if self._watchdog is not None:
+            ioloop.IOLoop.current().remove_timeout(self._watchdog)
+            self._watchdog = None
+        self._queue.put_nowait(marker)
+
+    @gen.coroutine
+    def read(self):
+        item = yield self._queue.get()
+        self._queue.task_done()
+        if item is self._END or isinstance(item, _Failure):
+            # leave the marker for any further reads
+            self._queue.put_nowait(item)
+            if item is self._END:
+                raise gen.Return(None)
+            raise item.exc
+        if self.on_read is not None:
+            self.on_read()
+        raise gen.Return(item)
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        future = Future()
+
+        def done(f):
+            try:
+                item = f.result()
+            except Exception as e:
+                future.set_exception(e)
+                return
+            if item is None:
+                future.set_exception(StopAsyncIteration())
+            else:
+                future.set_result(item)
+        self.read().add_done_callback(done)
+        return future
+
+
+class _Failure(object):
+    def __init__(self, exc):
+        self.exc = exc
+
+
+class _TCPClient(tcpclient.TCPClient):
+    """A TCPClient that can close the connections it has made."""
+
+    def __init__(self, *args, **kwargs):
+        super(_TCPClient, self).__init__(*args, **kwargs)
+        self.streams = []
+        self.aborted = False
+
+    @gen.coroutine
+    def connect(self, *args, **kwargs):
+        stream = yield super(_TCPClient, self).connect(*args, **kwargs)
+        self.streams.append(stream)
+        if self.aborted:
+            stream.close()
+        raise gen.Return(stream)
+
+    def abort(self):
+        self.aborted = True
+        for stream in self.streams:
+            stream.close()
+
+
 class HTTPClient(nomad_alt.base.HTTPClient):
     logger = logging.getLogger('nomad_alt.tornado.HTTPClient')
     def __init__(self, *args, **kwargs):
@@ -19,71 +223,336 @@ class HTTPClient(nomad_alt.base.HTTPClient):
 
     def response(self, response):
         return base.Response(
-            response.code, response.headers, response.body.decode('utf-8'))
+            response.code, response.headers, response.body, self.codec)
 
     @gen.coroutine
-    def _request(self, callback, request):
-        try:
-            response = yield self.client.fetch(request)
-        except httpclient.HTTPError as e:
-            if e.code == 599:
-                raise nomad_alt.exceptions.Timeout
-            response = e.response
-        raise gen.Return(callback(self.response(response)))
-
-    def __handle_request(self, callback, uri, kwargs):
+    def _fetch(self, callback, path, params, kwargs):
+        hooked = bool(self.hooks)
+        if hooked:
+            start = self.before_request(
+                kwargs['method'], path, kwargs.get('body'))
+        response = yield self._send(path, params, kwargs)
+        if not hooked:
+            raise gen.Return(callback(self.response(response)))
+
+        # time_info is only populated by the curl based client
+        time_info = response.time_info or {}
+        timings = {
+            'connect': time_info.get('connect'),
+            'first_byte': time_info.get('starttransfer'),
+        }
+        raise gen.Return(self.after_request(
+            start, callback, self.response(response),
+            len(response.body or b''), timings))
+
+    @gen.coroutine
+    def _send(self, path, params, kwargs):
+        """
+        Sends the request to the healthiest server, or for a stale read any
+        server, retrying and failing over to other servers as self.retry
+        allows. Resolves to the response.
+        """
+        method = kwargs['method']
+        params, stale = self.query(method, params)
+        timed = not params or 'index' not in params
+        attempts = self.attempts(method, stale)
+        last = len(attempts) - 1
+        for i, (server, delay) in enumerate(attempts):
+            if delay:
+                yield gen.sleep(delay)
+            request = httpclient.HTTPRequest(
+                self.uri(path, params, server), **kwargs)
+            started = default_timer()
+            try:
+                response = yield self.client.fetch(request)
+            except httpclient.HTTPError as e:
+                if e.code != 599:
+                    response = e.response
+                else:
+                    # a timeout, or any connection error with curl
+                    self.servers.failed(server)
+                    if i == last or not self.retryable(method):
+                        raise nomad_alt.exceptions.Timeout
+                    continue
+            except (socket.error, IOError) as e:
+                self.servers.failed(server)
+                sent = isinstance(e, iostream.StreamClosedError)
+                if i == last or not self.retryable(method, sent):
+                    raise
+                continue
+            if (i < last and response.code >= 500 and
+                    self.retryable(method, status=response.code)):
+                self.servers.failed(server)
+                continue
+            self.servers.succeeded(
+                server, default_timer() - started if timed else None)
+            raise gen.Return(response)
+
+    def stream(self, callback, path, params=None, read_timeout=None):
+        """
+        Returns a Stream of the items decoded from the response as they
+        arrive.
+        """
+        stream = Stream(callback, read_timeout, self.codec)
+        # the body is handed on as it arrives, so a stream is not retried
+        query, stale = self.query('GET', params)
+        server, _ = self.attempts('GET', stale)[0]
+        uri = self.uri(path, query, server)
+        kwargs = {
+            'method': 'GET',
+            'header_callback': stream.header_callback,
+            'streaming_callback': stream.streaming_callback,
+            # a stream lasts as long as it is followed, even one with an
+            # index, only its reads are timed
+            'request_timeout': 0,
+        }
+        kwargs.update(self._encoding())
         kwargs['validate_cert'] = self.verify
         kwargs['ca_certs'] = self.ca
         kwargs['client_cert'] = self.cert
         kwargs['client_key'] = self.key
-        request = httpclient.HTTPRequest(uri, **kwargs)
-        assert request.validate_cert == self.verify
-        return self._request(callback, request)
+        client = self._stream_client(stream, kwargs)
+        self._stream(stream, path, client, httpclient.HTTPRequest(uri, **kwargs))
+        return stream
 
-    def get(self, callback, path, params=None):
-        uri = self.uri(path, params)
-        kwargs = {
-            'method': 'GET',
-        }
-        if self.token is not None:
-            kwargs['headers'] = {"X-Nomad-Token": self.token}
+    def _stream_client(self, stream, kwargs):
+        """
+        Returns the client to make the request of *stream* with, such that
+        the connection is closed should the stream time out.
 
-        return self.__handle_request(callback, uri, kwargs)
+        The simple client gives no way to abort a request, so each stream
+        with a read_timeout gets a client of its own, whose connection the
+        stream closes. That also keeps long lived streams from taking up the
+        shared client's max_clients. curl gives up on a stalled transfer
+        itself.
+        """
+        if stream.read_timeout is None:
+            return self.client
+        if not isinstance(self.client, simple_httpclient.SimpleAsyncHTTPClient):
+            read_timeout = stream.read_timeout
 
-    def put(self, callback, path, params=None, data=''):
-        uri = self.uri(path, params)
-        kwargs = {
-            'method': 'PUT',
-            'validate_cert': self.verify,
-        }
-        if self.token is not None:
-            kwargs['headers'] = {"X-Nomad-Token": self.token}
-        kwargs['body'] = '' if data is None else data
+            def prepare(curl):
+                import pycurl
+                curl.setopt(pycurl.LOW_SPEED_LIMIT, 1)
+                curl.setopt(pycurl.LOW_SPEED_TIME,
+                            max(1, int(math.ceil(read_timeout))))
+            kwargs['prepare_curl_callback'] = prepare
+            return self.client
+        client = simple_httpclient.SimpleAsyncHTTPClient(
+            force_instance=True, max_clients=1, defaults=self.client.defaults)
+        client.tcp_client = _TCPClient(resolver=client.resolver)
+        stream.abort = client.tcp_client.abort
+        return client
 
-        return self.__handle_request(callback, uri, kwargs)
+    @gen.coroutine
+    def _stream(self, stream, path, client, request):
+        hooked = bool(self.hooks)
+        if hooked:
+            start = self.before_request('GET', path)
+        try:
+            try:
+                response = yield client.fetch(request)
+            except httpclient.HTTPError as e:
+                if e.code == 599:
+                    raise nomad_alt.exceptions.Timeout
+                response = e.response
+            stream.finish(response)
+        except Exception as e:
+            stream.fail(e)
+        finally:
+            if client is not self.client:
+                client.close()
+            if hooked:
+                self.emit(start, stream.code, stream.bytes_in,
+                          {'decode': stream.decode})
 
-    def delete(self, callback, path, params=None):
-        uri = self.uri(path, params)
-        kwargs = {
-            'method': 'DELETE',
-            'validate_cert': self.verify,
-        }
+    def follow(self, callback, path, params=None, advance=None,
+               heartbeat=30, retry=None):
+        """
+        Returns a Stream of the items of a stream, resuming the stream
+        whenever it is interrupted, until the Stream is closed. The Stream
+        ends should the server end the stream as many times in a row as
+        *retry* allows attempts.
+        """
+        stream = Stream(None)
+        self._follow(stream, callback, path, dict(params or {}), advance,
+                     heartbeat, retry or resuming())
+        return stream
+
+    @gen.coroutine
+    def _follow(self, stream, callback, path, params, advance, heartbeat,
+                retry):
+        failures = 0
+        while not stream.closed:
+            items = self.stream(callback, path, params, read_timeout=heartbeat)
+            # closing the stream followed closes the one it is read from
+            stream.abort = items.close
+            try:
+                item = yield items.read()
+                while item is not None and not stream.closed:
+                    failures = 0
+                    for entry in advance(params, item):
+                        stream.put(entry)
+                    item = yield items.read()
+            except Exception as e:
+                if stream.closed:
+                    return
+                failures += 1
+                if not self.resumable(e) or failures >= retry.attempts:
+                    stream.fail(e)
+                    return
+            else:
+                # the server ended the stream, e.g. as it shut down
+                failures += 1
+                if failures >= retry.attempts:
+                    stream.end()
+                    return
+            yield gen.sleep(retry.delay(failures))
+
+    def many(self, calls, concurrency=8, ordered=True):
+        """
+        Returns a Stream of the Results of *calls*, made by *concurrency*
+        coroutines taking turns at the next call. No more than twice
+        *concurrency* calls are taken from *calls* ahead of the Results read
+        from the Stream.
+        """
+        ahead = locks.Semaphore(2 * concurrency)
+        stream = Stream(None, on_read=ahead.release)
+        self._many(stream, calls, concurrency, ordered, ahead)
+        return stream
+
+    @gen.coroutine
+    def _many(self, stream, calls, concurrency, ordered, ahead):
+        calls = enumerate(calls)
+        done = {}
+        order = [0]
+
+        @gen.coroutine
+        def worker():
+            while True:
+                yield ahead.acquire()
+                taken = next(calls, None)
+                if taken is None:
+                    break
+                i, call = taken
+                call = base.Call(*call)
+                try:
+                    data = yield self.chain(call)
+                    result = base.Result(call.id, data, None)
+                except NomadException as e:
+                    result = base.Result(call.id, None, e)
+                if not ordered:
+                    stream.put(result)
+                    continue
+                done[i] = result
+                while order[0] in done:
+                    stream.put(done.pop(order[0]))
+                    order[0] += 1
+
+        try:
+            yield [worker() for _ in range(concurrency)]
+            stream.end()
+        except Exception as e:
+            stream.fail(e)
+
+    def _encoding(self):
+        # token and compression related request arguments
+        headers = {"Accept-Encoding": self.accept_encoding}
         if self.token is not None:
-            kwargs['headers'] = {"X-Nomad-Token": self.token}
+            headers["X-Nomad-Token"] = self.token
+        return {
+            'headers': headers,
+            'decompress_response': self.compression is not None,
+        }
 
-        return self.__handle_request(callback, uri, kwargs)
+    def paginate(self, callback, path, params=None, per_page=100,
+                 prefetch=True):
+        """
+        Returns a Stream of the items of a paginated list. The next page is
+        only requested once the items of the previous one have all been read,
+        or, with *prefetch*, as soon as the previous page has arrived.
+        """
+        stream = Stream(None)
+        self._paginate(stream, callback, path, params, per_page, prefetch)
+        return stream
 
-    def post(self, callback, path, params=None, data=''):
-        uri = self.uri(path, params)
+    @gen.coroutine
+    def _paginate(self, stream, callback, path, params, per_page, prefetch):
+        try:
+            token, items = yield self.get(
+                callback, path, self.page_params(params, per_page, None))
+            while True:
+                fetch = None
+                if token is not None and prefetch:
+                    fetch = self.get(
+                        callback, path, self.page_params(params, per_page, token))
+                for item in items:
+                    stream.put(item)
+                if token is None:
+                    break
+                yield stream.drained()
+                if fetch is None:
+                    fetch = self.get(
+                        callback, path, self.page_params(params, per_page, token))
+                token, items = yield fetch
+            stream.end()
+        except Exception as e:
+            stream.fail(e)
+
+    def __handle_request(self, callback, path, params, kwargs):
+        kwargs['validate_cert'] = self.verify
+        kwargs['ca_certs'] = self.ca
+        kwargs['client_cert'] = self.cert
+        kwargs['client_key'] = self.key
+        return self._fetch(callback, path, params, kwargs)
+
+    def _request(self, callback, method, path, params=None, data=None):
         kwargs = {
-            'method': 'POST',
-            'validate_cert': self.verify,
-            'body': data
+            'method': method,
         }
-        if self.token is not None:
-            kwargs['headers'] = {"X-Nomad-Token": self.token}
+        timeout = self.timeout(params)
+        if timeout is not None:
+            kwargs['request_timeout'] = timeout
+        kwargs.update(self._encoding())
+        if method in ('PUT', 'POST'):
+            kwargs['body'] = '' if data is None else data
+
+        return self.__handle_request(callback, path, params, kwargs)
+
+    @gen.coroutine
+    def _respond(self, callback, response):
+        raise gen.Return(callback(response))
 
-        return self.__handle_request(callback, uri, kwargs)
+    @gen.coroutine
+    def resolve(self, value):
+        raise gen.Return(value)
+
+    @gen.coroutine
+    def chain(self, call):
+        data = yield self.send(call)
+        while isinstance(data, base.Call):
+            data = yield self.send(data)
+        raise gen.Return(data)
+
+    def get(self, callback, path, params=None):
+        if self.cache is not None:
+            return self.cache.get(self, callback, path, params)
+        return self._request(callback, 'GET', path, params)
+
+    def put(self, callback, path, params=None, data=''):
+        if self.cache is not None:
+            callback = self.cache.invalidating(callback, path)
+        return self._request(callback, 'PUT', path, params, data)
+
+    def delete(self, callback, path, params=None):
+        if self.cache is not None:
+            callback = self.cache.invalidating(callback, path)
+        return self._request(callback, 'DELETE', path, params)
+
+    def post(self, callback, path, params=None, data=''):
+        if self.cache is not None:
+            callback = self.cache.invalidating(callback, path)
+        return self._request(callback, 'POST', path, params, data)
 
 
 class Nomad(base.Nomad):
@@ -0,0 +1,227 @@
+"""
+Waiting for evaluations and deployments to finish, with blocking queries
+rather than polling, see Evaluations.wait and Deployments.wait::
+
+    response = nomad.jobs.create(job)
+    waited = nomad.evaluations.wait(response['EvalID'], timeout=60)
+    print(waited.state['Status'], 'after', waited.elapsed, 'seconds')
+
+A waiter is a chain of Calls (see HTTPClient.chain): the callback of each
+blocking read decides whether to read again, from the index it was answered
+at, or to return, so the same waiter serves the blocking and the tornado and
+asyncio clients.
+"""
+import collections
+from timeit import default_timer
+
+import six
+
+from nomad_alt.base import CB, Call, Path, Result, blocking, seconds
+from nomad_alt.exceptions import NotFound, Timeout
+
+__all__ = ['DEPLOYMENT', 'EVALUATION', 'Kind', 'WaitMany', 'WaitOne',
+           'Waited']
+
+# what a wait returns: the terminal *state* of the last object of *chain*,
+# the IDs waited on (more than one when an evaluation was followed to the
+# next), the seconds and the number of blocking queries it took, and the
+# (seconds, ID, status) of each status seen along the way
+Waited = collections.namedtuple(
+    'Waited', ['state', 'chain', 'elapsed', 'requests', 'history'])
+
+
+class Kind(object):
+    """
+    How to wait on one kind of object: its read and list paths, the statuses
+    it ends in, with *follow* the field naming the object to carry on
+    waiting on once it has ended and with *parked* the statuses it can stay
+    in for as long as the cluster does not change, which a wait without a
+    timeout returns at.
+    """
+
+    def __init__(self, name, read, list, terminal, follow=(), parked=()):
+        self.name = name
+        self.read = read
+        self.list = list
+        self.terminal = frozenset(terminal)
+        self.follow = follow
+        self.parked = frozenset(parked)
+
+    def next(self, state):
+        """Returns the ID of the object following *state*, or None."""
+        for field in self.follow:
+            if state.get(field):
+                return state[field]
+        return None
+
+
+# a delayed reschedule is evaluated by NextEval, allocations that could not
+# be placed by BlockedEval, which stays blocked until the cluster has room
+EVALUATION = Kind(
+    'evaluation', '/v1/evaluation/%s', '/v1/evaluations',
+    ['complete', 'failed', 'canceled'], follow=('NextEval', 'BlockedEval'),
+    parked=['blocked'])
+
+DEPLOYMENT = Kind(
+    'deployment', '/v1/deployment/%s', '/v1/deployments',
+    ['successful', 'failed', 'cancelled'])
+
+
+class _Progress(object):
+    """The bookkeeping of waiting on one object (and those following it)."""
+
+    def __init__(self, id, started):
+        self.chain = [id]
+        self.started = started
+        self.history = []
+        self.requests = 0
+
+    @property
+    def id(self):
+        return self.chain[-1]
+
+    def seen(self, state, now):
+        self.requests += 1
+        entry = (state.get('ID'), state.get('Status'))
+        if not self.history or self.history[-1][1:] != entry:
+            self.history.append((now - self.started,) + entry)
+
+    def waited(self, state, now):
+        return Waited(state, list(self.chain), now - self.started,
+                      self.requests, list(self.history))
+
+
+class _Wait(object):
+    def __init__(self, kind, wait, timeout, follow):
+        self.kind = kind
+        self.wait = seconds(wait)
+        self.follow = follow
+        self.started = default_timer()
+        self.deadline = None if timeout is None else self.started + timeout
+        self.index = 0
+
+    def params(self):
+        wait = self.wait
+        if self.deadline is not None:
+            # block no longer than the deadline allows, but a little so that
+            # a deadline that has all but passed does not spin
+            remaining = max(self.deadline - default_timer(), 0.1)
+            wait = min(remaining, self.wait)
+        return blocking({}, self.index, wait)
+
+    def expired(self, now):
+        return self.deadline is not None and now >= self.deadline
+
+    def done(self, state):
+        """Returns whether waiting on *state* is over: it has ended or,
+        without a deadline, is parked."""
+        status = state.get('Status')
+        return status in self.kind.terminal or (
+            self.deadline is None and status in self.kind.parked)
+
+    def timeout(self, progress, state):
+        return Timeout('%s %s still %s after %.1fs' % (
+            self.kind.name, progress.id, state.get('Status'),
+            default_timer() - self.started))
+
+
+class WaitOne(_Wait):
+    """Waits on the object *id* of *kind*, following it to the next with
+    *follow*, see Evaluations.wait."""
+
+    def __init__(self, kind, id, wait=60, timeout=None, follow=True):
+        super(WaitOne, self).__init__(kind, wait, timeout, follow)
+        self.progress = _Progress(id, self.started)
+
+    def call(self):
+        """Returns the Call reading the object, for HTTPClient.chain."""
+        read = CB.json(index=self.index, allow_404=False)
+
+        def cb(response):
+            index, state = read(response)
+            return self.step(index, state)
+        return Call(self.progress.id, cb,
+                    Path(self.kind.read, self.progress.id), self.params())
+
+    def step(self, index, state):
+        now = default_timer()
+        progress = self.progress
+        progress.seen(state, now)
+        if self.done(state):
+            following = self.kind.next(state) if self.follow else None
+            if following is None or following in progress.chain:
+                return progress.waited(state, now)
+            progress.chain.append(following)
+            self.index = 0
+            return self.call()
+        if self.expired(now):
+            raise self.timeout(progress, state)
+        self.index = index
+        return self.call()
+
+
+class WaitMany(_Wait):
+    """
+    Waits on the objects *ids* of *kind* together, with a single blocking
+    query of their list, returning a Result per ID in the order of *ids*.
+    An object missing from the list fails with NotFound, one still going at
+    the deadline with Timeout.
+    """
+
+    def __init__(self, kind, ids, wait=60, timeout=None, follow=True,
+                 namespace=None):
+        super(WaitMany, self).__init__(kind, wait, timeout, follow)
+        self.ids = list(ids)
+        self.namespace = namespace
+        # waiting on, by the ID of the object currently followed
+        self.pending = dict((id, _Progress(id, self.started))
+                            for id in self.ids)
+        self.results = {}
+
+    def call(self):
+        """Returns the Call reading the list, for HTTPClient.chain."""
+        read = CB.json(index=self.index, allow_404=False)
+
+        def cb(response):
+            index, states = read(response)
+            return self.step(index, states or [])
+        params = self.params()
+        if self.namespace is not None:
+            params['namespace'] = self.namespace
+        return Call(None, cb, self.kind.list, params)
+
+    def step(self, index, states):
+        now = default_timer()
+        by_id = dict((state['ID'], state) for state in states)
+        work = list(six.iteritems(self.pending))
+        while work:
+            id, progress = work.pop()
+            state = by_id.get(id)
+            if state is None:
+                del self.pending[id]
+                self.results[progress.chain[0]] = Result(
+                    progress.chain[0], None,
+                    NotFound('%s %s not found' % (self.kind.name, id)))
+                continue
+            progress.seen(state, now)
+            if not self.done(state):
+                continue
+            del self.pending[id]
+            following = self.kind.next(state) if self.follow else None
+            if following is not None and following not in progress.chain:
+                progress.chain.append(following)
+                self.pending[following] = progress
+                work.append((following, progress))
+                continue
+            self.results[progress.chain[0]] = Result(
+                progress.chain[0], progress.waited(state, now), None)
+        if self.pending and self.expired(now):
+            for id, progress in six.iteritems(self.pending):
+                self.results[progress.chain[0]] = Result(
+                    progress.chain[0], None,
+                    self.timeout(progress, by_id.get(id) or {}))
+            self.pending = {}
+        if not self.pending:
+            return [self.results[id] for id in self.ids]
+        self.index = index
+        return self.call()
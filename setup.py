@@ -22,9 +22,9 @@ py_modules.extend([os.path.splitext(x)[0] for x in glob.glob('nomad_alt/api/*.py
 
 class Install(install):
     def run(self):
-        # Issue #123: skip installation of nomad.aio if python version < 3.4.2
-        # as this version or later is required by aiohttp
-        if sys.version_info < (3, 4, 2):
+        # skip installation of nomad_alt.aio if python version < 3.6 as it
+        # uses async/await, async generators and aiohttp
+        if sys.version_info < (3, 6):
             if 'nomad_alt/aio' in self.distribution.py_modules:
                 self.distribution.py_modules.remove('nomad_alt/aio')
         install.run(self)
@@ -58,6 +58,7 @@ setup(
         'tornado': ['tornado'],
         'asyncio': ['aiohttp'],
         'twisted': ['twisted', 'treq'],
+        'telemetry': ['numpy'],
     },
     tests_require=['pytest', 'pytest-twisted'],
     cmdclass={'test': PyTest,
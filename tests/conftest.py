@@ -16,9 +16,9 @@ import py
 
 collect_ignore = []
 
-# if sys.version_info[0] < 3:
-#     p = os.path.join(os.path.dirname(__file__), 'test_aio.py')
-#     collect_ignore.append(p)
+if sys.version_info < (3, 6):
+    p = os.path.join(os.path.dirname(__file__), 'test_aio.py')
+    collect_ignore.append(p)
 
 
 # if sys.version_info[0] == 2 and sys.version_info[1] < 7:
@@ -0,0 +1,209 @@
+import asyncio
+import itertools
+import json
+
+import pytest
+
+import nomad_alt.aio
+import tests.common as common
+from nomad_alt.base import CB
+from nomad_alt.decoders import JSONStreamDecoder
+from nomad_alt.exceptions import NotFound, Timeout
+from tests.test_streams import END, RETRY, frame, server  # noqa: F401
+
+
+def run(coro):
+    return asyncio.get_event_loop_policy().new_event_loop().run_until_complete(coro)
+
+
+def test_connection_pool():
+    async def main():
+        async with nomad_alt.aio.Nomad(
+                host='127.0.0.1', port=4646,
+                limit=8, limit_per_host=4, keepalive_timeout=30) as c:
+            connector = c.http.session.connector
+            assert connector.limit == 8
+            assert connector.limit_per_host == 4
+        assert c.http._session is None
+    run(main())
+
+
+def test_close_without_requests():
+    async def main():
+        c = nomad_alt.aio.Nomad(host='127.0.0.1', port=4646)
+        await c.close()
+    run(main())
+
+
+# integration tests requires nomad Vagrant VM or Binary running
+def test_jobs():
+    async def main():
+        async with nomad_alt.aio.Nomad(
+                host=common.IP, port=common.NOMAD_PORT,
+                token=common.NOMAD_TOKEN) as c:
+            with open(common.EXAMPLE_JOB_JSON) as fh:
+                await c.jobs.create(json.loads(fh.read()))
+            jobs = await c.jobs.list()
+            assert common.EXAMPLE_JOB_NAME in [j['ID'] for j in jobs]
+
+            index, jobs = await c.jobs.list(index=0)
+            assert index > 0
+
+            # many concurrent reads share the pooled connections
+            reads = await asyncio.gather(
+                *[c.jobs.read(common.EXAMPLE_JOB_NAME) for _ in range(50)])
+            assert all(j['ID'] == common.EXAMPLE_JOB_NAME for j in reads)
+
+            await c.jobs.stop(common.EXAMPLE_JOB_NAME, purge=True)
+    run(main())
+
+
+# against a local server streaming a script, see tests/test_streams.py
+def run_against(server, f):
+    """Runs *f* with an aio client of the local test *server*."""
+    async def main():
+        async with nomad_alt.aio.Nomad(
+                port=server.server_address[1]) as n:
+            return await f(n)
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(asyncio.wait_for(main(), 10))
+    finally:
+        loop.close()
+
+
+def test_request_timeout(server):
+    async def main():
+        async with nomad_alt.aio.Nomad(
+                port=server.server_address[1], request_timeout=0.3) as n:
+            # the server sends the headers of the response, then nothing
+            with pytest.raises(Timeout):
+                await n.status.leader()
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(asyncio.wait_for(main(), 10))
+    finally:
+        loop.close()
+
+
+def test_stream(server):
+    server.script = [[frame(5, 'a'), {}]]
+
+    async def main(n):
+        items = []
+        with pytest.raises(Timeout):
+            async for item in n.http.stream(
+                    CB.stream(decoder=JSONStreamDecoder),
+                    '/v1/event/stream', {'index': 5}, read_timeout=0.3):
+                items.append(item)
+        return items
+
+    assert run_against(server, main) == [frame(5, 'a'), {}]
+
+
+def test_follow_with_index(server):
+    server.script = [[frame(5, 'a')] + [0.1, {}] * 6 + [frame(6, 'b')]]
+
+    async def main(n):
+        n.http.timeout = lambda params, default=None: (
+            0.3 if 'index' in params else default)
+        keys = []
+        async for event in n.events.stream(
+                index=5, heartbeat=5, retry=RETRY):
+            keys.append(event['Key'])
+            if len(keys) == 2:
+                return keys
+
+    assert run_against(server, main) == ['a', 'b']
+    assert len(server.requests) == 1
+    assert 'index=5' in server.requests[0]
+
+
+def test_follow_resumes(server):
+    server.script = [[frame(5, 'a')], [frame(7, 'b')]]
+
+    async def main(n):
+        keys = []
+        async for event in n.events.stream(heartbeat=0.3, retry=RETRY):
+            keys.append(event['Key'])
+            if len(keys) == 2:
+                return keys
+
+    assert run_against(server, main) == ['a', 'b']
+    assert 'index=6' in server.requests[1]
+
+
+def test_follow_ends(server):
+    server.script = [[frame(5, 'a'), END]] + [[END]] * 3
+
+    async def main(n):
+        return [event['Key'] async for event in n.events.stream(retry=RETRY)]
+
+    assert run_against(server, main) == ['a']
+    assert len(server.requests) == 3
+
+
+def test_paginate(server):
+    async def main(n):
+        return [job['ID'] async for job in n.jobs.iterate(per_page=2)]
+
+    assert run_against(server, main) == ['job-%d' % i for i in range(5)]
+    assert len(server.requests) == 3
+    assert 'next_token=job-4' in server.requests[2]
+
+
+def test_many(server):
+    async def main(n):
+        return [result async for result in n.jobs.read_many(
+            ['job-3', 'missing', 'job-1'], concurrency=2)]
+
+    results = run_against(server, main)
+    assert [r.id for r in results] == ['job-3', 'missing', 'job-1']
+    assert results[0].data == {'ID': 'job-3'}
+    assert isinstance(results[1].error, NotFound)
+    assert results[2].error is None
+
+
+def test_contains(server):
+    async def main(n):
+        # `in` can not wait for the answer
+        with pytest.raises(TypeError):
+            'job-1' in n.jobs
+        return (await n.jobs.contains_many(['job-1', 'job-9']),
+                await n.jobs.contains_many(['job-2', 'api']),
+                await n.nodes.contains_many([]))
+
+    listed, grouped, empty = run_against(server, main)
+    assert listed == {'job-1': True, 'job-9': False}
+    assert grouped == {'job-2': True, 'api': False}
+    assert empty == {}
+    assert server.requests == [
+        '/v1/jobs?prefix=job-', '/v1/jobs?prefix=api', '/v1/jobs?prefix=job-2']
+
+
+def test_many_takes_calls_as_needed():
+    taken = []
+
+    def calls():
+        for i in itertools.count():
+            taken.append(i)
+            yield (i, None, '/v1/job/%d' % i, None)
+
+    async def main():
+        async with nomad_alt.aio.Nomad() as n:
+            async def chain(call):
+                await asyncio.sleep(0)
+                return call.id
+            n.http.chain = chain
+            results = []
+            many = n.http.many(calls(), concurrency=2)
+            async for result in many:
+                results.append(result.data)
+                await asyncio.sleep(0.01)
+                if len(results) == 5:
+                    await many.aclose()
+                    return results
+
+    assert run(main()) == [0, 1, 2, 3, 4]
+    # no more than twice concurrency calls beyond the Results handed out
+    assert len(taken) <= 5 + 4
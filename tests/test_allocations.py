@@ -36,3 +36,25 @@ def test_allocation_list(nomad_setup):
 
 # def test_allocation_read(nomad_setup):
 #     assert len(nomad_setup.allocations.read()) > 0
+
+def test_allocation_list_blocking(nomad_setup):
+    index, res = nomad_setup.allocations.list(index=0)
+    assert index > 0
+    assert common.EXAMPLE_JOB_NAME in [a['JobID'] for a in res]
+
+    # nothing changes, so the query should block for the wait and come back
+    # with the same index
+    new_index, res = nomad_setup.allocations.list(index=index, wait='100ms')
+    assert new_index >= index
+
+
+def test_allocation_list_stream(nomad_setup):
+    streamed = list(nomad_setup.allocations.list(stream=True))
+    assert [a['ID'] for a in streamed] == \
+        [a['ID'] for a in nomad_setup.allocations.list()]
+
+
+def test_allocation_iterate(nomad_setup):
+    paged = list(nomad_setup.allocations.iterate(per_page=1))
+    assert [a['ID'] for a in paged] == \
+        [a['ID'] for a in nomad_setup.allocations.list()]
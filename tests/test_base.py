@@ -1,7 +1,9 @@
 import collections
+import json
 
 import pytest
 
+from nomad_alt import base, std
 from nomad_alt.base import Nomad as nomad_base, Check
 
 
@@ -11,7 +13,7 @@ Request = collections.namedtuple(
 
 class HTTPClient(object):
     def __init__(self, host=None, port=None, scheme=None,
-                 verify=True, cert=None, token=None):
+                 verify=True, cert=None, token=None, key=None, ca=None):
         pass
 
     def get(self, callback, path, params=None):
@@ -25,13 +27,35 @@ class HTTPClient(object):
 
 
 class Nomad(nomad_base):
-    def connect(self, host, port, scheme, verify=True, cert=None, token=None):
+    def connect(self, host, port, scheme, verify=True, cert=None, token=None,
+                key=None, ca=None):
         return HTTPClient(host, port, scheme, verify=verify, cert=None, token=token)
 
 
 def _should_support(c):
     return (
+        c.acl_policies.list,
+        lambda **kw: c.acl_policies.read('anon', **kw),
+        c.acl_tokens.list,
+        lambda **kw: c.acl_tokens.read('self', **kw),
+        c.allocations.list,
+        lambda **kw: c.allocations.read('1', **kw),
+        c.deployments.list,
+        lambda **kw: c.deployments.read('1', **kw),
+        lambda **kw: c.deployments.allocations('1', **kw),
+        c.evaluations.list,
+        lambda **kw: c.evaluations.read('1', **kw),
+        lambda **kw: c.evaluations.allocations('1', **kw),
         c.jobs.list,
+        lambda **kw: c.jobs.read('example', **kw),
+        lambda **kw: c.jobs.versions('example', **kw),
+        lambda **kw: c.jobs.evaluations('example', **kw),
+        lambda **kw: c.jobs.deployments('example', **kw),
+        lambda **kw: c.jobs.most_recent_deployment('example', **kw),
+        lambda **kw: c.jobs.summary('example', **kw),
+        c.nodes.list,
+        lambda **kw: c.nodes.read('1', **kw),
+        lambda **kw: c.nodes.allocations('1', **kw),
     )
 
 
@@ -43,6 +67,68 @@ class TestIndex(object):
         c = Nomad()
         for r in _should_support(c):
             assert r().params == {}
+            assert r(index=5).params == {'index': 5}
+            assert r(index=5, wait='1m').params == {'index': 5, 'wait': '1m'}
+            assert r(index=5, wait=1.5).params == {'index': 5, 'wait': '1500ms'}
+            # wait is meaningless without an index
+            assert r(wait='1m').params == {}
+            assert r(stale=True).params == {'stale': True}
+            assert r(index=5, stale=False).params == {
+                'index': 5, 'stale': False}
+
+    @pytest.mark.parametrize('duration, want', [
+        (30, 30.0),
+        (0.25, 0.25),
+        ('5m', 300.0),
+        ('1m30s', 90.0),
+        ('150ms', 0.15),
+        ('1h', 3600.0),
+    ])
+    def test_seconds(self, duration, want):
+        assert base.seconds(duration) == pytest.approx(want)
+
+    def test_seconds_invalid(self):
+        with pytest.raises(ValueError):
+            base.seconds('5 minutes')
+
+    @pytest.mark.parametrize('last, header, want', [
+        (True, '10', 10),
+        (0, '10', 10),
+        (5, '10', 10),
+        # the index went backwards, the next read must not block
+        (20, '10', 0),
+        # an index below 1 would make a watch loop spin
+        (0, '0', 1),
+    ])
+    def test_json_index(self, last, header, want):
+        cb = base.CB.json(index=last)
+        response = base.Response(200, {'X-Nomad-Index': header}, '[]')
+        assert cb(response) == (want, [])
+
+    def test_json_index_staleness(self):
+        cb = base.CB.json(index=0)
+        headers = {'X-Nomad-Index': '10', 'X-Nomad-LastContact': '250',
+                   'X-Nomad-KnownLeader': 'true'}
+        index, data = cb(base.Response(200, headers, '[]'))
+        assert index == 10
+        assert index.last_contact == 0.25
+        assert index.known_leader is True
+        index, data = cb(base.Response(200, {'X-Nomad-Index': '10'}, '[]'))
+        assert index.last_contact is None and index.known_leader is None
+
+    def test_json_no_index(self):
+        for index in (None, False):
+            cb = base.CB.json(index=index)
+            response = base.Response(200, {'X-Nomad-Index': '10'}, '[]')
+            assert cb(response) == []
+
+    def test_timeout(self):
+        http = std.HTTPClient('127.0.0.1', 4646)
+        assert http.timeout({}) is None
+        assert http.timeout({}, default=3) == 3
+        # Nomad's default wait of five minutes plus its jitter
+        assert http.timeout({'index': 1}) > 300 + 300 / 16.0
+        assert http.timeout({'index': 1, 'wait': '16s'}) == 16 + 1 + 5
 
 
 class TestChecks(object):
@@ -143,3 +229,380 @@ class TestChecks(object):
     def test_ttl_check(self):
         ch = Check.ttl('1m')
         assert ch == {'ttl': '1m'}
+
+
+class RecordingHook(base.Hook):
+    def __init__(self):
+        self.before_calls = []
+        self.events = []
+
+    def before(self, method, path, template, bytes_out):
+        self.before_calls.append((method, path, template, bytes_out))
+
+    def after(self, event):
+        self.events.append(event)
+
+
+class TestHooks(object):
+    """
+    Instrumentation hooks see every request with its endpoint template.
+    """
+    def test_path_template(self):
+        path = base.Path('/v1/job/%s/allocations', 'example')
+        assert path == '/v1/job/example/allocations'
+        assert path.template == '/v1/job/%s/allocations'
+
+    def test_hook_events(self):
+        http = std.HTTPClient('127.0.0.1', 4646)
+        hook = RecordingHook()
+        http.add_hook(hook)
+
+        path = base.Path('/v1/job/%s', 'example')
+        request = http.before_request('POST', path, '{"Job": {}}')
+        response = base.Response(200, {}, '{"EvalID": "1"}')
+        data = http.after_request(
+            request, base.CB.json(), response, 15, {'first_byte': 0.01})
+        assert data == {'EvalID': '1'}
+
+        assert hook.before_calls == [('POST', path, '/v1/job/%s', 11)]
+        event, = hook.events
+        assert event.template == '/v1/job/%s'
+        assert event.status == 200
+        assert event.bytes_out == 11
+        assert event.bytes_in == 15
+        assert event.timings['connect'] is None
+        assert event.timings['first_byte'] == 0.01
+        assert event.timings['decode'] >= 0
+        assert event.timings['total'] >= event.timings['decode']
+
+    def test_hook_sees_failed_requests(self):
+        http = std.HTTPClient('127.0.0.1', 4646)
+        hook = RecordingHook()
+        http.add_hook(hook)
+
+        request = http.before_request('GET', '/v1/jobs')
+        response = base.Response(500, {}, 'boom')
+        with pytest.raises(base.NomadException):
+            http.after_request(request, base.CB.json(), response, 4, {})
+        assert hook.events[0].status == 500
+        assert hook.events[0].template == '/v1/jobs'
+
+        http.remove_hook(hook)
+        assert http.hooks == []
+
+
+class PagedHTTPClient(std.HTTPClient):
+    """
+    Serves a list of *n* items *per_page* at a time, without a server.
+    """
+    def __init__(self, n):
+        super(PagedHTTPClient, self).__init__('127.0.0.1', 4646)
+        self.items = [{'ID': str(i)} for i in range(n)]
+        self.requests = []
+
+    def _request(self, callback, method, path, params=None, data=None):
+        self.requests.append(dict(params))
+        start = int(params.get('next_token', 0))
+        stop = start + params['per_page']
+        headers = {'X-Nomad-Index': '10'}
+        if stop < len(self.items):
+            headers['X-Nomad-NextToken'] = str(stop)
+        return callback(base.Response(
+            200, headers, json.dumps(self.items[start:stop])))
+
+
+class TestPagination(object):
+    def test_page(self):
+        cb = base.CB.page(map=lambda item: item['ID'])
+        headers = {'X-Nomad-NextToken': 'b'}
+        assert cb(base.Response(200, headers, '[{"ID": "a"}]')) == ('b', ['a'])
+        assert cb(base.Response(200, {}, '[]')) == (None, [])
+        assert cb(base.Response(404, {}, '')) == (None, [])
+
+    @pytest.mark.parametrize('prefetch', [True, False])
+    def test_paginate(self, prefetch):
+        http = PagedHTTPClient(25)
+        items = http.paginate(
+            base.CB.page(), '/v1/evaluations', {'prefix': 'a'},
+            per_page=10, prefetch=prefetch)
+        assert [item['ID'] for item in items] == [str(i) for i in range(25)]
+        assert http.requests == [
+            {'prefix': 'a', 'per_page': 10},
+            {'prefix': 'a', 'per_page': 10, 'next_token': '10'},
+            {'prefix': 'a', 'per_page': 10, 'next_token': '20'},
+        ]
+
+    def test_paginate_lazily(self):
+        http = PagedHTTPClient(25)
+        items = http.paginate(
+            base.CB.page(), '/v1/evaluations', per_page=10, prefetch=False)
+        assert http.requests == []
+        next(items)
+        assert len(http.requests) == 1
+
+    def test_paginate_errors(self):
+        # the last page fails while it is being prefetched
+        page = base.CB.page()
+
+        def cb(response):
+            if 'X-Nomad-NextToken' not in response.headers:
+                raise base.NomadException('boom')
+            return page(response)
+
+        http = PagedHTTPClient(25)
+        items = http.paginate(cb, '/v1/evaluations', per_page=10)
+        for i in range(20):
+            next(items)
+        with pytest.raises(base.NomadException):
+            next(items)
+
+
+class TestCompression(object):
+    def test_default(self):
+        c = std.Nomad()
+        assert c.http.compression == 'gzip'
+        headers = c.http._kwargs(None)['headers']
+        assert headers['Accept-Encoding'] == 'gzip'
+
+    def test_uncompressed(self):
+        c = std.Nomad(compression=None)
+        assert c.http.accept_encoding == 'identity'
+
+    def test_unsupported(self):
+        with pytest.raises(ValueError):
+            std.Nomad(compression='br')
+
+
+class ReadHTTPClient(std.HTTPClient):
+    """
+    Answers reads of /v1/job/<id>, with a 404 for 'missing' and a 403 for
+    'secret', without a server.
+    """
+    def __init__(self):
+        super(ReadHTTPClient, self).__init__('127.0.0.1', 4646)
+
+    def _request(self, callback, method, path, params=None, data=None):
+        job_id = path.rsplit('/', 1)[1]
+        code = {'missing': 404, 'secret': 403}.get(job_id, 200)
+        return callback(base.Response(
+            code, {}, json.dumps({'ID': job_id})))
+
+
+class TestReadMany(object):
+    def test_read_many(self):
+        c = Nomad()
+        c.http = ReadHTTPClient()
+        ids = ['a', 'missing', 'b', 'secret'] + [str(i) for i in range(20)]
+        results = list(c.jobs.read_many(ids, concurrency=4))
+        assert [r.id for r in results] == ids
+        assert results[0] == base.Result('a', {'ID': 'a'}, None)
+        assert isinstance(results[1].error, base.NotFound)
+        assert isinstance(results[3].error, base.ACLPermissionDenied)
+        assert results[1].data is None
+
+    def test_read_many_as_completed(self):
+        c = Nomad()
+        c.http = ReadHTTPClient()
+        ids = [str(i) for i in range(20)]
+        results = c.nodes.read_many(ids, ordered=False)
+        assert sorted(r.id for r in results) == sorted(ids)
+
+
+class ListHTTPClient(std.HTTPClient):
+    """
+    Answers /v1/jobs and /v1/nodes with the stubs of *ids* matching the
+    prefix, and reads of one of them, or with *code*, recording the path and
+    params of each request.
+    """
+    def __init__(self, ids, code=200):
+        super(ListHTTPClient, self).__init__('127.0.0.1', 4646)
+        self.ids = ids
+        self.code = code
+        self.paths = []
+        self.params = []
+
+    def _request(self, callback, method, path, params=None, data=None):
+        self.paths.append(path)
+        self.params.append(params)
+        if path not in ('/v1/jobs', '/v1/nodes'):
+            id = path.split('/')[-1]
+            if id not in self.ids and self.code == 200:
+                return callback(base.Response(404, {}, 'not found'))
+            return callback(base.Response(self.code, {}, json.dumps(
+                {'ID': id, 'Spec': {'Large': True}})))
+        prefix = params.get('prefix', '')
+        body = [{'ID': id, 'Status': 'running', 'Spec': {'Large': True}}
+                for id in self.ids if id.startswith(prefix)]
+        return callback(base.Response(self.code, {}, json.dumps(body)))
+
+
+class TestContains(object):
+    def test_contains_many(self):
+        c = Nomad()
+        c.http = ListHTTPClient(['web-1', 'web-2', 'db'])
+        assert c.jobs.contains_many(['web-1', 'web-3']) == {
+            'web-1': True, 'web-3': False}
+        assert c.http.params[-1] == {'prefix': 'web-'}
+        assert 'db' in c.jobs
+        assert 'web' not in c.jobs
+        assert c.jobs.contains_many(['db', 'web-2'], stale=True) == {
+            'db': True, 'web-2': True}
+        assert c.http.params[-2:] == [{'prefix': 'db', 'stale': True},
+                                      {'prefix': 'web-2', 'stale': True}]
+
+    def test_node_prefix(self):
+        c = Nomad()
+        node = 'f9c3a1b2-0a5c-4b7e-9f1d-3e2b1c0d9a8f'
+        c.http = ListHTTPClient([node])
+        assert node in c.nodes
+        assert c.http.params[-1] == {'prefix': node}
+        assert c.nodes.contains_many([node, 'f9c3a1b9', 'f9c-x']) == {
+            node: True, 'f9c3a1b9': False, 'f9c-x': False}
+        # only whole bytes of hex are sent
+        assert c.http.params[-1] == {'prefix': 'f9'}
+        # with no prefix Nomad takes, the IDs of every node are listed
+        assert 'not-a-node' not in c.nodes
+        assert c.http.paths[-1] == '/v1/nodes'
+        assert c.http.params[-1] == {}
+
+    def test_no_common_prefix(self):
+        c = Nomad()
+        c.http = ListHTTPClient(['web-1', 'web-2', 'db', 'api'])
+        assert c.jobs.contains_many(
+            ['web-1', 'web-3', 'db', 'dns'], stale=True) == {
+            'web-1': True, 'web-3': False, 'db': True, 'dns': False}
+        # a list for each group of IDs starting alike, rather than a read
+        # of each ID
+        assert c.http.paths == ['/v1/jobs', '/v1/jobs']
+        assert c.http.params == [{'prefix': 'd', 'stale': True},
+                                 {'prefix': 'web-', 'stale': True}]
+        assert c.jobs.contains_many([]) == {}
+        assert c.nodes.contains_many(iter([])) == {}
+        assert len(c.http.paths) == 2
+
+    def test_too_many_prefixes(self):
+        c = Nomad()
+        c.http = ListHTTPClient(['a', 'b', 'c'])
+        ids = ['a', 'b', 'c', 'd', 'e']
+        assert c.jobs.contains_many(ids) == {
+            'a': True, 'b': True, 'c': True, 'd': False, 'e': False}
+        # one list of every ID
+        assert c.http.params == [{}]
+
+    def test_node_groups(self):
+        c = Nomad()
+        nodes = ['f9c3a1b2-0a5c', 'f9d0e1f2-1b6d', '0a1b2c3d-2c7e']
+        c.http = ListHTTPClient(nodes[1:])
+        assert c.nodes.contains_many(nodes) == {
+            nodes[0]: False, nodes[1]: True, nodes[2]: True}
+        assert c.http.params == [{'prefix': '0a1b2c3d-2c7e'},
+                                 {'prefix': 'f9'}]
+
+    def test_errors_are_not_absence(self):
+        c = Nomad()
+        c.http = ListHTTPClient(['web'], code=500)
+        with pytest.raises(base.NomadException):
+            'web' in c.jobs
+        with pytest.raises(base.NomadException):
+            c.nodes.contains_many(['a'])
+        c.http = ReadHTTPClient()
+        with pytest.raises(KeyError):
+            c.jobs['missing']
+        with pytest.raises(base.ACLPermissionDenied):
+            c.jobs['secret']
+
+
+class RegisterHTTPClient(std.HTTPClient):
+    """
+    Plans and registers jobs without a server: jobs named 'same-*' plan
+    without changes, and registering 'conflict' fails as a check-and-set
+    conflict would.
+    """
+    def __init__(self):
+        super(RegisterHTTPClient, self).__init__('127.0.0.1', 4646)
+        self.requests = []
+
+    def _request(self, callback, method, path, params=None, data=None):
+        body = json.loads(data)
+        job_id = body['Job']['ID']
+        self.requests.append((path, body))
+        if path.endswith('/plan'):
+            diff = 'None' if job_id.startswith('same') else 'Edited'
+            response = {'Diff': {'Type': diff}, 'JobModifyIndex': 5}
+        elif job_id == 'conflict':
+            return callback(base.Response(500, {}, 'index conflict'))
+        else:
+            response = {'EvalID': 'eval-' + job_id, 'Warnings': ''}
+        return callback(base.Response(200, {}, json.dumps(response)))
+
+
+class TestRegisterMany(object):
+    def test_register_many(self):
+        c = Nomad()
+        c.http = RegisterHTTPClient()
+        jobs = [{'Job': {'ID': 'a'}}, {'ID': 'b'}]
+        results = list(c.jobs.register_many(jobs, ordered=True))
+        assert results == [
+            base.Result('a', {'EvalID': 'eval-a', 'Warnings': ''}, None),
+            base.Result('b', {'EvalID': 'eval-b', 'Warnings': ''}, None)]
+        assert [body for _, body in c.http.requests] == [
+            {'Job': {'ID': 'a'}}, {'Job': {'ID': 'b'}}]
+
+    def test_plan_gating(self):
+        c = Nomad()
+        c.http = RegisterHTTPClient()
+        jobs = [{'Job': {'ID': id}} for id in ['a', 'same-1', 'conflict']]
+        results = dict(
+            (r.id, r) for r in c.jobs.register_many(
+                jobs, plan=True, PolicyOverride=True))
+        assert results['a'].data['EvalID'] == 'eval-a'
+        assert results['same-1'].data['Diff'] == {'Type': 'None'}
+        assert isinstance(results['conflict'].error, base.NomadException)
+        registered = [body for path, body in c.http.requests
+                      if path == '/v1/jobs']
+        assert sorted(body['Job']['ID'] for body in registered) == [
+            'a', 'conflict']
+        for body in registered:
+            assert body['EnforceIndex'] is True
+            assert body['JobModifyIndex'] == 5
+            assert body['PolicyOverride'] is True
+
+    def test_calls_are_consumed_lazily(self):
+        c = Nomad()
+        c.http = ReadHTTPClient()
+        taken = []
+
+        def calls():
+            for i in range(100):
+                taken.append(i)
+                yield (i, base.CB.json(), '/v1/job/%d' % i, None)
+        results = c.http.many(calls(), concurrency=4)
+        assert next(results).id == 0
+        assert len(taken) <= 9
+        assert [r.id for r in results] == list(range(1, 100))
+
+
+class NotFoundHTTPClient(std.HTTPClient):
+    """Answers every request, streamed or not, with a 404."""
+
+    def _request(self, callback, method, path, params=None, data=None):
+        return callback(base.Response(404, {}, 'not found'))
+
+    def stream(self, callback, path, params=None, read_timeout=None,
+               chunk_size=None):
+        callback(base.Response(404, {}, 'not found'))
+        return iter(())
+
+
+class TestListNotFound(object):
+    @pytest.mark.parametrize('kind', [
+        'jobs', 'nodes', 'allocations', 'evaluations', 'deployments'])
+    def test_list_raises(self, kind):
+        # a 404 is an error whether or not the list is streamed
+        nomad = std.Nomad()
+        nomad.http = NotFoundHTTPClient('127.0.0.1', 4646)
+        endpoint = getattr(nomad, kind)
+        with pytest.raises(base.NotFound):
+            endpoint.list()
+        with pytest.raises(base.NotFound):
+            endpoint.list(stream=True)
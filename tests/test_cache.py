@@ -0,0 +1,158 @@
+import time
+
+from nomad_alt import base
+from nomad_alt.cache import ResponseCache
+
+
+class HTTPClient(object):
+    """
+    Stands in for a transport, answering every request with the next queued
+    response and recording what was asked for.
+    """
+    token = 'secret'
+
+    def __init__(self, cache, *responses):
+        self.cache = cache
+        self.responses = list(responses)
+        self.requests = []
+
+    def _request(self, callback, method, path, params=None, data=None):
+        self.requests.append((method, path, params))
+        return callback(self.responses.pop(0))
+
+    def _respond(self, callback, response):
+        return callback(response)
+
+    def get(self, callback, path, params=None):
+        return self.cache.get(self, callback, path, params)
+
+    def post(self, callback, path, params=None, data=''):
+        callback = self.cache.invalidating(callback, path)
+        return self._request(callback, 'POST', path, params, data)
+
+
+def response(body, index=10, code=200):
+    return base.Response(code, {'X-Nomad-Index': str(index)}, body)
+
+
+def test_hit_within_ttl():
+    cache = ResponseCache(ttl=60)
+    http = HTTPClient(cache, response('{"ID": "example"}'))
+    path = base.Path('/v1/job/%s', 'example')
+    assert http.get(base.CB.json(), path) == {'ID': 'example'}
+    assert http.get(base.CB.json(), path) == {'ID': 'example'}
+    assert len(http.requests) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_key_includes_params():
+    cache = ResponseCache(ttl=60)
+    http = HTTPClient(cache, response('[1]'), response('[2]'))
+    assert http.get(base.CB.json(), '/v1/jobs', {'prefix': 'a'}) == [1]
+    assert http.get(base.CB.json(), '/v1/jobs', {'prefix': 'b'}) == [2]
+    assert http.get(base.CB.json(), '/v1/jobs', {'prefix': 'a'}) == [1]
+    assert len(http.requests) == 2
+
+
+def test_blocking_queries_bypass_cache():
+    cache = ResponseCache(ttl=60)
+    http = HTTPClient(cache, response('[]', 11), response('[]', 12))
+    assert http.get(base.CB.json(index=10), '/v1/jobs', {'index': 10}) == (11, [])
+    assert http.get(base.CB.json(index=10), '/v1/jobs', {'index': 10}) == (12, [])
+    assert len(cache) == 0
+
+
+def test_revalidate_unchanged():
+    cache = ResponseCache(ttl=0.01, revalidate_wait='1ms')
+    http = HTTPClient(cache, response('[1]', 10), response('[1]', 10))
+    http.get(base.CB.json(), '/v1/jobs')
+    time.sleep(0.02)
+    assert http.get(base.CB.json(), '/v1/jobs') == [1]
+    assert http.requests[1] == ('GET', '/v1/jobs', {'index': 10, 'wait': '1ms'})
+    assert cache.revalidations == 1
+    # the entry was renewed, so it is served from memory again
+    assert http.get(base.CB.json(), '/v1/jobs') == [1]
+    assert len(http.requests) == 2
+
+
+def test_revalidate_changed():
+    cache = ResponseCache(ttl=0.01)
+    http = HTTPClient(cache, response('[1]', 10), response('[1, 2]', 11))
+    http.get(base.CB.json(), '/v1/jobs')
+    time.sleep(0.02)
+    assert http.get(base.CB.json(), '/v1/jobs') == [1, 2]
+    assert cache.size == len('[1, 2]')
+
+
+def test_lru_eviction_by_size():
+    cache = ResponseCache(ttl=60, max_bytes=12)
+    http = HTTPClient(
+        cache, response('"aaaa"'), response('"bbbb"'), response('"cccc"'))
+    http.get(base.CB.json(), '/v1/job/a')
+    http.get(base.CB.json(), '/v1/job/b')
+    # touch a, so b is the least recently used
+    http.get(base.CB.json(), '/v1/job/a')
+    http.get(base.CB.json(), '/v1/job/c')
+    assert [k[0] for k in cache._entries] == ['/v1/job/a', '/v1/job/c']
+    assert cache.size == 12
+
+
+def test_max_entries():
+    cache = ResponseCache(ttl=60, max_entries=1)
+    http = HTTPClient(cache, response('1'), response('2'))
+    http.get(base.CB.json(), '/v1/job/a')
+    http.get(base.CB.json(), '/v1/job/b')
+    assert [k[0] for k in cache._entries] == ['/v1/job/b']
+
+
+def test_write_invalidates_affected_entries():
+    cache = ResponseCache(ttl=60)
+    http = HTTPClient(
+        cache,
+        response('[]'), response('{}'), response('[]'), response('[]'),
+        response('{"EvalID": "1"}'))
+    http.get(base.CB.json(), '/v1/jobs')
+    http.get(base.CB.json(), base.Path('/v1/job/%s', 'example'))
+    http.get(base.CB.json(), '/v1/allocations')
+    http.get(base.CB.json(), '/v1/acl/tokens')
+    http.post(base.CB.json(), base.Path('/v1/job/%s', 'example'), data='{}')
+    assert [k[0] for k in cache._entries] == ['/v1/acl/tokens']
+
+
+def test_write_during_read_is_not_overwritten():
+    cache = ResponseCache(ttl=60)
+
+    class Racing(HTTPClient):
+        def _request(self, callback, method, path, params=None, data=None):
+            if method == 'GET':
+                # a write lands while the read is in flight
+                cache.invalidate('/v1/job/example')
+            return super(Racing, self)._request(callback, method, path, params)
+
+    http = Racing(cache, response('{}'))
+    http.get(base.CB.json(), '/v1/job/example')
+    assert len(cache) == 0
+
+
+def test_errors_are_not_cached():
+    cache = ResponseCache(ttl=60)
+    http = HTTPClient(cache, response('missing', code=404), response('{}'))
+    assert http.get(base.CB.json(), '/v1/job/a') is None
+    assert http.get(base.CB.json(), '/v1/job/a') == {}
+
+
+def test_stats_across_threads():
+    import threading
+    cache = ResponseCache(ttl=60)
+    http = HTTPClient(cache, response('[]'))
+
+    def read():
+        for _ in range(2000):
+            http.get(base.CB.json(), '/v1/jobs')
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.hits + cache.misses + cache.revalidations == 8 * 2000
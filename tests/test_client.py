@@ -54,3 +54,31 @@ def test_stats(nomad_setup):
             alloc_stats = nomad_setup.client.allocation(alloc['ID'])
             # logging.warn("Allocations:\n%s", pformat(alloc_stats))
             assert isinstance(alloc_stats, dict)
+
+
+def test_frame():
+    from nomad_alt.api.client import Frame, frame
+    assert frame({}) is None
+    assert frame({'File': 'alloc/logs/web.stdout.0', 'Offset': 5,
+                  'Data': 'aGVsbG8='}) == Frame(
+        'alloc/logs/web.stdout.0', 5, b'hello', None)
+    assert frame({'File': 'f', 'FileEvent': 'file truncated'}).event == \
+        'file truncated'
+
+
+def test_copy():
+    import io
+    from nomad_alt.api.client import Frame, copy
+    frames = [Frame('f', 3, b'abc', None), Frame('f', 3, b'', 'file truncated'),
+              Frame('f', 2, b'de', None)]
+    out = io.BytesIO()
+    assert copy(iter(frames), out) == 5
+    assert out.getvalue() == b'abcde'
+
+    def chunks():
+        yield b'abc'
+        yield b'def'
+        raise AssertionError('read past the end of the buffer')
+    buf = bytearray(4)
+    assert copy(chunks(), buf) == 4
+    assert buf == bytearray(b'abcd')
@@ -0,0 +1,62 @@
+import pytest
+
+from nomad_alt import base, codec
+from nomad_alt.codec import JSONCodec, STDLIB, json_codec
+from nomad_alt.decoders import JSONStreamDecoder
+
+BODY = u'{"ID": "café", "Count": 3, "Tags": [null, true, 1.5]}'
+VALUE = {'ID': u'café', 'Count': 3, 'Tags': [None, True, 1.5]}
+
+
+@pytest.mark.parametrize('name', codec.available())
+def test_backends(name):
+    c = json_codec(name)
+    assert c.name == name
+    assert c.loads(BODY.encode('utf-8')) == VALUE
+    assert c.loads(BODY) == VALUE
+    assert STDLIB.loads(c.dumps(VALUE)) == VALUE
+    with pytest.raises(ValueError):
+        c.loads(b'{"ID": ')
+
+
+def test_json_codec():
+    # the faster backends are opt in
+    assert json_codec() is STDLIB
+    assert json_codec('auto').name == codec.available()[0]
+    assert json_codec('json').name == 'json'
+    custom = JSONCodec('custom', STDLIB.loads, STDLIB.dumps)
+    assert json_codec(custom) is custom
+    with pytest.raises(ValueError):
+        json_codec('yaml')
+
+
+def test_response():
+    response = base.Response(200, {}, BODY.encode('utf-8'))
+    assert response.text == BODY
+    assert response.json() == VALUE
+    loads = []
+    custom = JSONCodec('custom', lambda s: loads.append(s) or {}, None)
+    response = base.Response(200, {}, b'[]', custom)
+    assert base.CB.json()(response) == {}
+    assert loads == [b'[]']
+
+
+def test_stream_decoder_codec():
+    lines = []
+
+    def loads(line):
+        lines.append(line)
+        return STDLIB.loads(line)
+    decoder = JSONStreamDecoder(codec=JSONCodec('custom', loads, None))
+    assert decoder.feed(b'{"Index": 1}\n\n{}') == [{'Index': 1}]
+    assert decoder.close() == [{}]
+    assert lines == [b'{"Index": 1}', b'{}']
+
+
+def test_nomad_codec():
+    from nomad_alt import Nomad
+    assert Nomad().http.codec is STDLIB
+    assert Nomad(codec='json').http.codec.name == 'json'
+    assert Nomad(codec='auto').http.codec.name == codec.available()[0]
+    with pytest.raises(ValueError):
+        Nomad(codec='yaml')
@@ -0,0 +1,137 @@
+import json
+
+import pytest
+
+from nomad_alt.decoders import BytesDecoder, JSONArrayDecoder, JSONSequenceDecoder, JSONStreamDecoder
+
+
+def decode(chunks, transform=None):
+    decoder = JSONArrayDecoder(transform)
+    items = []
+    for chunk in chunks:
+        items.extend(decoder.feed(chunk))
+    items.extend(decoder.close())
+    return items
+
+
+def split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+ALLOCATIONS = [
+    {'ID': '%08d' % i, 'JobID': 'example', 'ClientStatus': 'running',
+     'Name': u'café[%d]' % i, 'Nested': {'A': [1, 2, {'B': None}]}}
+    for i in range(50)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 100000])
+def test_any_chunking(size):
+    body = json.dumps(ALLOCATIONS).encode('utf-8')
+    assert decode(split(body, size)) == ALLOCATIONS
+
+
+def test_items_are_yielded_as_they_complete():
+    decoder = JSONArrayDecoder()
+    assert decoder.feed(b'[{"ID": "a"}, {"ID"') == [{'ID': 'a'}]
+    assert decoder.feed(b': "b"}') == [{'ID': 'b'}]
+    assert decoder.feed(b']') == []
+    assert decoder.close() == []
+
+
+def test_numbers_split_across_chunks():
+    assert decode([b'[12', b'34, 5', b'6]']) == [1234, 56]
+
+
+@pytest.mark.parametrize('body', [b'[]', b' [ ] ', b'[\n]\n'])
+def test_empty(body):
+    assert decode([body]) == []
+
+
+def test_transform():
+    assert decode([b'[1, 2, 3]'], lambda x: x * 2) == [2, 4, 6]
+
+
+@pytest.mark.parametrize('body', [
+    b'{"ID": "a"}',
+    b'[{"ID": "a"}',
+    b'[{"ID": "a"},',
+    b'[{"ID": "a"} {"ID": "b"}]',
+    b'[1] 2',
+])
+def test_invalid(body):
+    with pytest.raises(ValueError):
+        decode([body])
+
+
+def decode_stream(chunks):
+    decoder = JSONStreamDecoder()
+    values = []
+    for chunk in chunks:
+        values.extend(decoder.feed(chunk))
+    values.extend(decoder.close())
+    return values
+
+
+FRAMES = [{'Index': i, 'Events': [{'Topic': 'Job', 'Key': u'café-%d' % i}]}
+          for i in range(1, 20)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 100000])
+def test_stream_any_chunking(size):
+    body = b''.join(
+        json.dumps(frame).encode('utf-8') + b'\n{}\n' for frame in FRAMES)
+    assert [value for value in decode_stream(split(body, size))
+            if value] == FRAMES
+
+
+def test_stream_values_are_yielded_as_they_complete():
+    decoder = JSONStreamDecoder()
+    assert decoder.feed(b'{"Index": 1}\n{"Ind') == [{'Index': 1}]
+    assert decoder.feed(b'ex": 2}') == []
+    assert decoder.feed(b'\n\n') == [{'Index': 2}]
+    assert decoder.close() == []
+
+
+def test_stream_last_value_without_newline():
+    assert decode_stream([b'{}\n', b'[1]']) == [{}, [1]]
+
+
+def test_stream_truncated():
+    with pytest.raises(ValueError):
+        decode_stream([b'{}\n{"Index": '])
+
+
+def decode_sequence(chunks, transform=None):
+    decoder = JSONSequenceDecoder(transform)
+    values = []
+    for chunk in chunks:
+        values.extend(decoder.feed(chunk))
+    values.extend(decoder.close())
+    return values
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 100000])
+@pytest.mark.parametrize('separator', [b'', b'\n', b' \r\n'])
+def test_sequence_any_chunking(size, separator):
+    body = separator.join(
+        json.dumps(frame).encode('utf-8') for frame in FRAMES)
+    assert decode_sequence(split(body, size)) == FRAMES
+
+
+def test_sequence_transform_drops_none():
+    assert decode_sequence(
+        [b'{"A": 1}{}{"A": 2}'], lambda value: value or None) == [
+        {'A': 1}, {'A': 2}]
+
+
+@pytest.mark.parametrize('body', [b'{"A": 1}{"A"', b'[1]', b'{"A": 1} 2'])
+def test_sequence_invalid(body):
+    with pytest.raises(ValueError):
+        decode_sequence([body])
+
+
+def test_bytes():
+    decoder = BytesDecoder()
+    assert decoder.feed(b'ab') == [b'ab']
+    assert decoder.feed(b'') == []
+    assert decoder.close() == []
@@ -0,0 +1,179 @@
+import json
+import threading
+
+from nomad_alt import std
+from nomad_alt.base import Response
+from nomad_alt.drain import DrainOrchestrator
+from nomad_alt.exceptions import NomadException
+
+
+class Cluster(object):
+    """
+    Stands in for nomad.nodes and nomad.allocations: each read of a draining
+    node's allocations moves one allocation off it, and once it has none
+    left its drain ends *lag* reads of the node later. Every read answers at
+    an index of its own, so is a change.
+    """
+
+    def __init__(self, nodes, lag=0):
+        self.nodes = dict(
+            (id, {'ID': id, 'Name': id, 'Drain': False, 'Status': 'ready',
+                  'NodeClass': node_class})
+            for id, node_class, _ in nodes)
+        self.allocs = []
+        for id, _, count in nodes:
+            for i in range(count):
+                self.allocs.append({
+                    'ID': '%s-%d' % (id, i), 'NodeID': id,
+                    'JobType': 'system' if i == 0 else 'service',
+                    'ClientStatus': 'running'})
+        self.lag = lag
+        self.index = 1
+        self.drained = []
+        self.max_draining = 0
+        self.refuse = set()
+        # the stale parameter of each read of a node or its allocations
+        self.stale = []
+        self.lock = threading.Lock()
+
+    def _next(self):
+        self.index += 1
+        return self.index
+
+    def _live(self, node_id):
+        return [a for a in self.allocs if a['NodeID'] == node_id and
+                a['ClientStatus'] == 'running' and a['JobType'] != 'system']
+
+    # nomad.nodes
+
+    def list(self, fields=None):
+        return [dict(node) for node in self.nodes.values()]
+
+    def drain(self, node_id, deadline=None, ignore_system_jobs=False):
+        if node_id in self.refuse:
+            raise NomadException('500 no')
+        with self.lock:
+            self.drained.append((node_id, deadline, ignore_system_jobs))
+            self.nodes[node_id]['Drain'] = True
+            self.nodes[node_id]['Lag'] = self.lag
+            self.max_draining = max(self.max_draining, sum(
+                node['Drain'] for node in self.nodes.values()))
+
+    def read(self, node_id, index=None, wait=None, stale=None, fields=None):
+        with self.lock:
+            self.stale.append(stale)
+            node = self.nodes[node_id]
+            if node['Drain'] and index and not self._live(node_id):
+                if node['Lag']:
+                    node['Lag'] -= 1
+                else:
+                    node['Drain'] = False
+            return self._next(), dict(
+                (field, node[field]) for field in fields)
+
+    def allocations(self, node_id, index=None, wait=None, stale=None,
+                    fields=None):
+        with self.lock:
+            self.stale.append(stale)
+            live = self._live(node_id)
+            if index and self.nodes[node_id]['Drain'] and live:
+                live[0]['ClientStatus'] = 'complete'
+            return self._next(), [dict(a) for a in self.allocs
+                                  if a['NodeID'] == node_id]
+
+    # nomad.allocations
+
+    def list_allocations(self, index=None, wait=None, fields=None):
+        with self.lock:
+            return self._next(), [dict(a) for a in self.allocs]
+
+
+class Nomad(object):
+    def __init__(self, cluster):
+        self.nodes = cluster
+
+        class Allocations(object):
+            list = staticmethod(cluster.list_allocations)
+        self.allocations = Allocations()
+
+
+def test_drain():
+    cluster = Cluster([('n1', 'batch', 3), ('n2', 'batch', 2),
+                       ('n3', 'web', 4), ('n4', 'batch', 1)])
+    seen = []
+    progress = DrainOrchestrator(
+        Nomad(cluster), {'NodeClass': 'batch'}, max_parallel=2,
+        deadline='30m', ignore_system_jobs=True, wait=0,
+        on_progress=seen.append).run()
+    assert [d[0] for d in cluster.drained] == ['n1', 'n2', 'n4']
+    assert cluster.drained[0][1:] == ('30m', True)
+    assert cluster.max_draining == 2
+    assert progress.total == 3 and progress.done == 3
+    assert progress.draining == progress.queued == progress.failed == 0
+    # system allocations stay where they are
+    assert progress.allocs_moved == 3 and progress.allocs_left == 0
+    assert seen[0].queued == 3 and seen[0].allocs_left == 3
+    assert seen[-1] == progress[:7] + seen[-1][7:]
+    assert progress.node_rate > 0 and progress.eta == 0
+    # only the leader is asked
+    assert cluster.stale and set(cluster.stale) == set([False])
+
+
+def test_done_once_the_leader_says():
+    # only a system job, so nothing to move
+    cluster = Cluster([('n1', 'batch', 1)], lag=3)
+    seen = []
+
+    def on_progress(progress):
+        seen.append((progress, cluster.nodes['n1']['Drain']))
+    progress = DrainOrchestrator(
+        Nomad(cluster), ['n1'], ignore_system_jobs=True, wait=0,
+        on_progress=on_progress).run()
+    assert progress.done == 1
+    # with no allocations left the node still drains, until the leader
+    # reports its drain over
+    assert [(p.draining, p.done, p.allocs_left) for p, _ in seen] == [
+        (0, 0, 0), (1, 0, 0), (0, 1, 0)]
+    assert not seen[-1][1]
+    assert cluster.nodes['n1']['Lag'] == 0
+
+
+def test_failures():
+    cluster = Cluster([('n1', 'batch', 2), ('n2', 'batch', 2)])
+    cluster.refuse.add('n1')
+    progress = DrainOrchestrator(Nomad(cluster), ['n1', 'n2'], wait=0).run()
+    assert progress.failed == 1 and progress.done == 1
+    assert progress.allocs_moved == 1
+
+
+class RecordingHTTPClient(std.HTTPClient):
+    def __init__(self):
+        super(RecordingHTTPClient, self).__init__('127.0.0.1', 4646)
+        self.requests = []
+
+    def _request(self, callback, method, path, params=None, data=None):
+        self.requests.append((method, path, json.loads(data)))
+        return callback(Response(200, {}, '{}'))
+
+
+def test_drain_spec():
+    nomad = std.Nomad()
+    nomad.http = RecordingHTTPClient()
+    nomad.nodes.drain('n1', deadline='1h', ignore_system_jobs=True)
+    nomad.nodes.drain('n1', deadline=-1)
+    nomad.nodes.drain('n1', enabled=False)
+    nomad.nodes.drain('n1', enabled=False, mark_eligible=False)
+    assert nomad.http.requests == [
+        ('POST', '/v1/node/n1/drain', {
+            'DrainSpec': {'Deadline': 3600 * 10 ** 9,
+                          'IgnoreSystemJobs': True},
+            'MarkEligible': False}),
+        ('POST', '/v1/node/n1/drain', {
+            'DrainSpec': {'Deadline': -1, 'IgnoreSystemJobs': False},
+            'MarkEligible': False}),
+        # disabling the drain makes the node eligible unless told otherwise
+        ('POST', '/v1/node/n1/drain', {
+            'DrainSpec': None, 'MarkEligible': True}),
+        ('POST', '/v1/node/n1/drain', {
+            'DrainSpec': None, 'MarkEligible': False}),
+    ]
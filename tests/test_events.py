@@ -0,0 +1,87 @@
+import pytest
+import requests
+
+from nomad_alt import std
+from nomad_alt.api.events import topic_params
+from nomad_alt.exceptions import ACLPermissionDenied
+from nomad_alt.servers import Retry
+
+
+class HTTPClient(std.HTTPClient):
+    """
+    Plays back *script*, one entry per stream request: a list of frames, each
+    possibly followed by an exception to interrupt the stream with.
+    """
+    def __init__(self, script):
+        super(HTTPClient, self).__init__('10.0.0.1', 4646)
+        self.script = list(script)
+        self.requests = []
+
+    def stream(self, callback, path, params=None, read_timeout=None,
+               chunk_size=64 * 1024):
+        self.requests.append(dict(params))
+        for frame in self.script.pop(0):
+            if isinstance(frame, Exception):
+                raise frame
+            yield frame
+
+
+def frame(index, *keys):
+    return {'Index': index, 'Events': [{'Key': key} for key in keys]}
+
+
+RETRY = Retry(attempts=3, backoff=0, max_backoff=0)
+
+
+def test_topic_params():
+    assert topic_params(['Job', 'Node']) == ['Job:*', 'Node:*']
+    assert topic_params({'Job': ['a', 'b'], 'Node': None}) == [
+        'Job:a', 'Job:b', 'Node:*']
+
+
+def test_resume_after_last_index():
+    http = HTTPClient([
+        [frame(5, 'a', 'b'), {}, requests.ConnectionError()],
+        [requests.ReadTimeout()],
+        [frame(9, 'c'), frame(12, 'd')],
+        [frame(13, 'e')],
+    ])
+    events = http.events(None, '/v1/event/stream', {'topic': ['Job:*']},
+                         retry=RETRY)
+    assert [next(events)['Key'] for _ in range(5)] == ['a', 'b', 'c', 'd', 'e']
+    assert http.requests == [
+        {'topic': ['Job:*']},
+        {'topic': ['Job:*'], 'index': 6},
+        {'topic': ['Job:*'], 'index': 6},
+        {'topic': ['Job:*'], 'index': 13},
+    ]
+
+
+def test_consecutive_failures_are_bounded():
+    http = HTTPClient([[requests.ConnectionError()]] * 2 + [
+        [frame(1, 'a'), requests.ConnectionError()]] + [
+        [requests.ConnectionError()]] * 3)
+    events = http.events(None, '/v1/event/stream', retry=RETRY)
+    assert next(events)['Key'] == 'a'
+    with pytest.raises(requests.ConnectionError):
+        next(events)
+    assert len(http.requests) == 5
+
+
+def test_ended_streams_are_bounded():
+    http = HTTPClient([[frame(1, 'a')]] + [[]] * 3)
+    events = http.events(None, '/v1/event/stream', retry=RETRY)
+    assert [event['Key'] for event in events] == ['a']
+    assert len(http.requests) == 3
+
+
+def test_not_resumable():
+    http = HTTPClient([[ACLPermissionDenied('denied')]])
+    with pytest.raises(ACLPermissionDenied):
+        next(http.events(None, '/v1/event/stream', retry=RETRY))
+
+
+def test_frames():
+    http = HTTPClient([[frame(3, 'a', 'b'), {}, frame(4, 'c')]])
+    frames = http.events(None, '/v1/event/stream', retry=RETRY, frames=True)
+    assert [f['Index'] for f in (next(frames), next(frames))] == [3, 4]
@@ -0,0 +1,48 @@
+import subprocess
+import sys
+
+import pytest
+
+import nomad_alt.base
+
+# modules import nomad_alt must leave to the first client or endpoint used
+HEAVY = ('requests', 'tornado', 'aiohttp', 'concurrent.futures',
+         'nomad_alt.std', 'nomad_alt.api.jobs')
+
+
+def run(code, *options):
+    return subprocess.check_output(
+        [sys.executable] + list(options) + ['-c', code],
+        stderr=subprocess.STDOUT, universal_newlines=True)
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7),
+                    reason='the client is imported eagerly before 3.7')
+def test_import_is_light():
+    loaded = run('import sys, nomad_alt; print(" ".join(sys.modules))').split()
+    for module in HEAVY:
+        assert module not in loaded
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7),
+                    reason='-X importtime is new in 3.7')
+def test_import_time():
+    # how long the import takes is measured by benchmarks/bench_import.py,
+    # here only what it imports, which does not depend on the machine
+    lines = run('import nomad_alt', '-X', 'importtime').splitlines()
+    # import time: self [us] | cumulative | imported package
+    imported = set(line.split('|')[-1].strip() for line in lines
+                   if line.startswith('import time:'))
+    assert 'nomad_alt' in imported, lines
+    for module in HEAVY:
+        assert module not in imported
+
+
+def test_endpoints_are_lazy():
+    from nomad_alt import Nomad
+    nomad = Nomad()
+    assert 'jobs' not in vars(nomad)
+    jobs = nomad.jobs
+    assert vars(nomad)['jobs'] is jobs is nomad.jobs
+    assert jobs.agent is nomad
+    assert isinstance(type(nomad).jobs, nomad_alt.base.Endpoint)
@@ -0,0 +1,170 @@
+import threading
+import time
+
+import pytest
+
+from nomad_alt.mirror import ClusterMirror, Table
+
+
+def alloc(id, job='example', node='n1', status='running', index=1, **fields):
+    obj = {'ID': id, 'JobID': job, 'NodeID': node, 'TaskGroup': 'web',
+           'ClientStatus': status, 'ModifyIndex': index}
+    obj.update(fields)
+    return obj
+
+
+def ids(objects):
+    return sorted(obj['ID'] for obj in objects)
+
+
+def table(*objects):
+    return Table(ClusterMirror.KINDS['allocations'][1], objects)
+
+
+def test_find():
+    t = table(alloc('a'), alloc('b', node='n2'),
+              alloc('c', status='pending'), alloc('d', job='other'))
+    assert ids(t.find(job='example', node='n1', status='running')) == ['a']
+    assert ids(t.find(job='example')) == ['a', 'b', 'c']
+    assert ids(t.find(status=('pending', 'running'), node='n1')) == [
+        'a', 'c', 'd']
+    assert t.find(job='missing', node='n1') == []
+    assert ids(t.find()) == ['a', 'b', 'c', 'd']
+    with pytest.raises(ValueError):
+        t.find(colour='red')
+
+
+def test_put_reindexes():
+    t = table(alloc('a'))
+    assert t.put(alloc('a', status='complete', index=2))
+    assert t.find(status='running') == []
+    assert ids(t.find(status='complete')) == ['a']
+    # an older version is ignored
+    assert not t.put(alloc('a', status='running', index=1))
+    assert t.get('a')['ClientStatus'] == 'complete'
+    assert t.remove('a')['ID'] == 'a'
+    assert t.remove('a') is None
+    assert len(t) == 0 and t.find(job='example') == []
+
+
+def test_views_are_isolated():
+    t = table(alloc('a'), alloc('b'))
+    view = t.view()
+    t.put(alloc('a', status='failed', index=2))
+    t.put(alloc('c'))
+    t.remove('b')
+    assert ids(view.find(status='running')) == ['a', 'b']
+    assert ids(view) == ['a', 'b']
+    assert ids(t.find(status='running')) == ['c']
+    assert ids(t.find(status='failed')) == ['a']
+    # a second view after more changes only sees those before it
+    second = t.view()
+    t.put(alloc('d'))
+    assert ids(second.find(job='example')) == ['a', 'c']
+    assert ids(view.find(job='example')) == ['a', 'b']
+
+
+class Endpoint(object):
+    def __init__(self, index, objects):
+        self.index = index
+        self.objects = objects
+
+    def list(self, index=None, wait=None, model=False):
+        return self.index, self.objects
+
+
+class Nomad(object):
+    def __init__(self):
+        self.jobs = Endpoint(5, [{'ID': 'example', 'Status': 'running'}])
+        self.allocations = Endpoint(7, [alloc('a'), alloc('b', node='n2')])
+
+
+def test_mirror():
+    mirror = ClusterMirror(Nomad(), kinds=['allocations', 'jobs'])
+    mirror.sync()
+    assert mirror.indexes == {'allocations': 7, 'jobs': 5}
+    snapshot = mirror.snapshot()
+    assert mirror.apply({'Index': 9, 'Events': [
+        {'Topic': 'Allocation', 'Type': 'AllocationUpdated', 'Key': 'b',
+         'Payload': {'Allocation': alloc('b', node='n2', status='failed',
+                                         index=9)}},
+        {'Topic': 'Node', 'Type': 'NodeDeregistration', 'Key': 'n2',
+         'Payload': {'Node': {'ID': 'n2'}}},
+        {'Topic': 'Job', 'Type': 'JobRegistered', 'Key': 'other',
+         'Payload': {'Job': {'ID': 'other', 'Status': 'pending'}}},
+    ]}) == 2
+    assert mirror.index == 9
+    assert ids(mirror.find('allocations', job='example', status='running')) == [
+        'a']
+    assert mirror.get('jobs', 'other')['Status'] == 'pending'
+    assert snapshot.index == 7
+    assert ids(snapshot.allocations.find(status='running')) == ['a', 'b']
+    assert snapshot.get('jobs', 'other') is None
+    with pytest.raises(AttributeError):
+        snapshot.nodes
+
+
+def job_event(type, job, index, **fields):
+    payload = dict({'ID': job, 'Status': 'dead', 'ModifyIndex': index},
+                   **fields)
+    return {'Topic': 'Job', 'Type': type, 'Key': job,
+            'Payload': {'Job': payload}}
+
+
+def test_job_deregistered():
+    mirror = ClusterMirror(Nomad(), kinds=['jobs'])
+    mirror.sync()
+    mirror.apply({'Index': 6, 'Events': [
+        job_event('JobRegistered', 'batch', 6, Status='running')]})
+    # stopped, the job is still listed
+    assert mirror.apply({'Index': 8, 'Events': [
+        job_event('JobDeregistered', 'example', 8, Stop=True)]}) == 1
+    assert mirror.get('jobs', 'example')['Status'] == 'dead'
+    # purged, it is gone
+    assert mirror.apply({'Index': 9, 'Events': [
+        job_event('JobDeregistered', 'batch', 9, Stop=False)]}) == 1
+    assert mirror.get('jobs', 'batch') is None
+    # purged once stopped, it is gone too: the job reported is the one
+    # stopped at 8
+    assert mirror.apply({'Index': 10, 'Events': [
+        job_event('JobDeregistered', 'example', 10, Stop=True,
+                  ModifyIndex=8)]}) == 1
+    assert len(mirror.tables['jobs']) == 0
+    mirror.apply({'Index': 11, 'Events': [
+        job_event('JobRegistered', 'example', 11, Status='running')]})
+    assert mirror.apply({'Index': 12, 'Events': [
+        {'Topic': 'Job', 'Type': 'JobDeregistered', 'Key': 'example',
+         'Payload': {}}]}) == 1
+    assert len(mirror.tables['jobs']) == 0
+
+
+def test_prune():
+    nomad = Nomad()
+    mirror = ClusterMirror(nomad, kinds=['allocations'])
+    mirror.sync()
+    mirror.apply({'Index': 9, 'Events': [
+        {'Topic': 'Allocation', 'Type': 'AllocationUpdated', 'Key': 'c',
+         'Payload': {'Allocation': alloc('c', index=9)}}]})
+    # a was garbage collected, c was placed after the list was made
+    assert mirror.prune('allocations', 8, [alloc('b', node='n2')]) == 1
+    assert ids(mirror.find('allocations')) == ['b', 'c']
+
+
+def test_reconcile():
+    nomad = Nomad()
+    mirror = ClusterMirror(nomad, kinds=['allocations', 'jobs'],
+                           reconcile=0.01)
+    mirror.sync()
+    nomad.allocations.objects = [alloc('b', node='n2')]
+    nomad.jobs.objects = []
+    # the thread start runs alongside the event stream
+    thread = threading.Thread(target=mirror._reconcile)
+    thread.start()
+    deadline = time.time() + 2
+    while (len(mirror.tables['allocations']) > 1 or
+           len(mirror.tables['jobs'])) and time.time() < deadline:
+        time.sleep(0.01)
+    mirror.stop()
+    thread.join()
+    assert ids(mirror.find('allocations')) == ['b']
+    assert len(mirror.tables['jobs']) == 0
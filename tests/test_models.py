@@ -0,0 +1,77 @@
+import pytest
+
+from nomad_alt.mirror import ClusterMirror, Table
+from nomad_alt.models import AllocationStub, Evaluation, JobStub
+
+
+def alloc(i, node='n1', status='running'):
+    return {
+        'ID': 'alloc-%d' % i, 'EvalID': 'eval-%d' % i, 'NodeID': node,
+        'JobID': 'example', 'TaskGroup': 'web', 'ClientStatus': status,
+        'ModifyIndex': i, 'AllocModifyIndex': i,
+        'TaskStates': {'server': {'State': 'running', 'Restarts': i}},
+    }
+
+
+def test_mapping():
+    data = alloc(1)
+    model = AllocationStub(data)
+    assert model == data
+    assert dict(model) == model.to_dict() == data
+    assert len(model) == len(data)
+    assert set(model) == set(data)
+    assert model['ClientStatus'] == model.ClientStatus == 'running'
+    assert model.get('FollowupEvalID') is None
+    assert 'TaskGroup' in model and 'Job' not in model
+    with pytest.raises(KeyError):
+        model['NodeName']
+    with pytest.raises(AttributeError):
+        model.NodeName
+    with pytest.raises(AttributeError):
+        model.Missing
+
+
+def test_rest_is_expanded_on_access():
+    model = AllocationStub(alloc(1))
+    assert isinstance(model._rest, bytes)
+    assert model.TaskStates['server']['Restarts'] == 1
+    assert model['AllocModifyIndex'] == 1
+    assert isinstance(model._rest, dict)
+    # a stub with nothing beyond its declared fields keeps nothing more
+    assert JobStub({'ID': 'example', 'Status': 'running'})._rest is None
+
+
+def test_strings_are_interned():
+    # built at run time so that they are distinct objects to begin with
+    a = Evaluation({'ID': 'a', 'JobID': ''.join(['exa', 'mple'])})
+    b = Evaluation({'ID': 'b', 'JobID': ''.join(['examp', 'le'])})
+    assert a.JobID is b.JobID
+
+
+def test_from_list():
+    models = AllocationStub.from_list([alloc(1), alloc(2)])
+    assert [m.ID for m in models] == ['alloc-1', 'alloc-2']
+    assert AllocationStub.from_list(None) is None
+
+
+def test_table_of_models():
+    t = Table(ClusterMirror.KINDS['allocations'][1], AllocationStub.from_list(
+        [alloc(1), alloc(2, node='n2'), alloc(3, status='pending')]))
+    assert sorted(m.ID for m in t.find(node='n1', status='running')) == [
+        'alloc-1']
+    assert t.put(AllocationStub(alloc(2, node='n2', status='failed')))
+    assert t.find(node='n2', status='running') == []
+
+
+def test_mirror_applies_events_as_models():
+    mirror = ClusterMirror(None, kinds=['allocations'], model=True)
+    mirror.apply({'Index': 3, 'Events': [
+        {'Topic': 'Allocation', 'Type': 'AllocationUpdated', 'Key': 'alloc-3',
+         'Payload': {'Allocation': alloc(3)}}]})
+    obj = mirror.get('allocations', 'alloc-3')
+    assert isinstance(obj, AllocationStub)
+    assert obj == alloc(3)
+
+
+def test_models_are_slotted():
+    assert not hasattr(AllocationStub(alloc(1)), '__dict__')
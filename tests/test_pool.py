@@ -0,0 +1,109 @@
+import threading
+import time
+
+import pytest
+from six.moves import BaseHTTPServer, socketserver
+
+from nomad_alt import std
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.connections.add(self.client_address)
+        if self.path.startswith('/v1/slow'):
+            time.sleep(0.1)
+        body = b'"127.0.0.1:4647"'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if self.headers.get('Connection') == 'close':
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def server():
+    s = Server(('127.0.0.1', 0), Handler)
+    s.connections = set()
+    thread = threading.Thread(target=s.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield s
+    s.shutdown()
+    s.server_close()
+
+
+def nomad(server, **kwargs):
+    return std.Nomad(port=server.server_address[1], **kwargs)
+
+
+def slow(n, count):
+    from nomad_alt.base import CB
+    threads = [threading.Thread(target=n.http.get, args=(
+        CB.json(), '/v1/slow')) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_prewarm(server):
+    n = nomad(server, pool_maxsize=3, prewarm=True)
+    stats = n.http.pool_stats()
+    assert (stats.pools, stats.maxsize) == (1, 3)
+    assert (stats.opened, stats.idle, stats.in_use) == (3, 3, 0)
+    assert len(server.connections) == 3
+    # the connections opened up front are the ones used
+    n.status.leader()
+    assert n.http.pool_stats().opened == 3
+    assert len(server.connections) == 3
+    by_server = n.http.pool_stats(by_server=True)
+    assert list(by_server) == [n.http.base_uri]
+
+
+def test_block(server):
+    n = nomad(server, pool_maxsize=2, pool_block=True)
+    slow(n, 6)
+    stats = n.http.pool_stats()
+    assert stats.opened == 2 and stats.idle == 2 and stats.in_use == 0
+    assert stats.waits >= 1 and stats.wait_time > 0
+    assert stats.overflows == stats.discarded == 0
+
+
+def test_discard(server):
+    n = nomad(server, pool_maxsize=1)
+    slow(n, 4)
+    stats = n.http.pool_stats()
+    assert stats.opened == 4 and stats.idle == 1 and stats.in_use == 0
+    assert stats.overflows == 3 and stats.discarded == 3
+
+
+def test_keepalive(server):
+    n = nomad(server, keepalive=False)
+    n.status.leader()
+    n.status.leader()
+    stats = n.http.pool_stats()
+    assert stats.opened == 2 and stats.idle == 0
+    assert len(server.connections) == 2
+
+
+def test_timeouts():
+    http = std.Nomad(connect_timeout=2, read_timeout=10).http
+    assert http._kwargs({})['timeout'] == (2, 10)
+    # a blocking query may take as long as its wait
+    assert http._kwargs({'index': 1, 'wait': '60s'})['timeout'] == (
+        2, 60 + 60 / 16.0 + 5)
+    assert std.Nomad().http._kwargs({})['timeout'] is None
+    assert std.Nomad(read_timeout=3).http._kwargs({})['timeout'] == 3
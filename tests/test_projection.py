@@ -0,0 +1,65 @@
+import pytest
+
+from nomad_alt import base, codec
+from nomad_alt.codec import json_codec
+from nomad_alt.decoders import JSONArrayDecoder
+from nomad_alt.projection import Projection
+
+ALLOC = {
+    'ID': 'a1', 'NodeID': 'n1', 'ClientStatus': 'running', 'ModifyIndex': 7,
+    'DeploymentStatus': None,
+    'TaskStates': {
+        'web': {'State': 'running', 'Restarts': 2, 'Events': [{}]},
+        'log': {'State': 'dead', 'Restarts': 0, 'Events': []},
+    },
+    'TaskGroups': [{'Name': 'web', 'Count': 3}, {'Name': 'log', 'Count': 1}],
+}
+FIELDS = ['ID', 'ClientStatus', 'Missing', 'TaskStates.*.State',
+          'TaskGroups.Name', 'DeploymentStatus.Healthy']
+PROJECTED = {
+    'ID': 'a1', 'ClientStatus': 'running', 'DeploymentStatus': None,
+    'TaskStates': {'web': {'State': 'running'}, 'log': {'State': 'dead'}},
+    'TaskGroups': [{'Name': 'web'}, {'Name': 'log'}],
+}
+
+
+def test_projection():
+    projection = Projection(FIELDS)
+    assert projection(ALLOC) == PROJECTED
+    assert projection([ALLOC, {'ID': 'a2'}]) == [PROJECTED, {'ID': 'a2'}]
+    # a field selects the whole of its value, whatever else is asked of it
+    assert Projection(['TaskGroups.Name', 'TaskGroups'])(ALLOC) == {
+        'TaskGroups': ALLOC['TaskGroups']}
+    assert Projection(['TaskStates.*'])(ALLOC) == {
+        'TaskStates': ALLOC['TaskStates']}
+    assert Projection.of(FIELDS) is Projection.of(tuple(FIELDS))
+
+
+@pytest.mark.parametrize('name', codec.available())
+def test_loads(name):
+    c = json_codec(name)
+    body = codec.STDLIB.dumps([ALLOC, {'ID': 'a2', 'TaskStates': None}])
+    if not isinstance(body, bytes):
+        body = body.encode('utf-8')
+    projection = Projection(FIELDS)
+    assert projection.loads(body, c) == [
+        PROJECTED, {'ID': 'a2', 'TaskStates': None}]
+    assert projection.loads(codec.STDLIB.dumps(ALLOC).encode('utf-8'), c) == \
+        PROJECTED
+    # values shaped other than the fields expect are kept as they are
+    assert projection.loads(b'{"ID": "a3", "TaskStates": "none"}', c) == {
+        'ID': 'a3', 'TaskStates': 'none'}
+    with pytest.raises(ValueError):
+        projection.loads(b'[{"ID": ', c)
+
+
+def test_callbacks():
+    body = codec.STDLIB.dumps([ALLOC]).encode('utf-8')
+    response = base.Response(200, {'X-Nomad-Index': '9'}, body, codec.STDLIB)
+    assert base.CB.json(fields=FIELDS, index=True)(response) == (
+        9, [PROJECTED])
+    assert base.CB.page(fields=['ID'])(response) == (None, [{'ID': 'a1'}])
+    decoder = base.CB.stream(fields=['ID', 'NodeID'])(
+        base.Response(200, {}, None, codec.STDLIB))
+    assert isinstance(decoder, JSONArrayDecoder)
+    assert decoder.feed(body) + decoder.close() == [{'ID': 'a1', 'NodeID': 'n1'}]
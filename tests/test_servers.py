@@ -0,0 +1,171 @@
+import time
+
+import pytest
+import requests
+
+from nomad_alt import base, std
+from nomad_alt.servers import Retry, Servers
+
+
+class Session(object):
+    """
+    Stands in for a requests session. Connections to a host in *down* are
+    refused, the others answer with the next of *codes*.
+    """
+    def __init__(self, down=(), codes=()):
+        self.down = down
+        self.codes = list(codes)
+        self.uris = []
+
+    def request(self, method, uri, **kwargs):
+        self.uris.append(uri)
+        if any(host in uri for host in self.down):
+            raise requests.ConnectTimeout(uri)
+        response = requests.Response()
+        response.status_code = self.codes.pop(0) if self.codes else 200
+        response._content = b'{}'
+        response._content_consumed = True
+        return response
+
+
+def client(session, servers=(), retry=None):
+    http = std.HTTPClient('10.0.0.1', 4646)
+    http.servers.add(servers)
+    http.session = session
+    http.retry = retry
+    return http
+
+
+def test_uri():
+    servers = Servers([], scheme='https', port=4000)
+    assert servers.uri('10.0.0.1') == 'https://10.0.0.1:4000'
+    assert servers.uri('10.0.0.1:4646') == 'https://10.0.0.1:4646'
+    assert servers.uri('http://nomad.local') == 'http://nomad.local:4000'
+
+
+def test_seed():
+    servers = Servers(['10.0.0.1'])
+    assert servers.seed(['10.0.0.1:4647', '10.0.0.2:4647']) == [
+        'http://10.0.0.1:4646', 'http://10.0.0.2:4646']
+
+
+def test_ordered():
+    servers = Servers(['a', 'b', 'c'], cooldown=0.05)
+    servers.failed('http://a:4646')
+    servers.failed('http://b:4646')
+    servers.failed('http://b:4646')
+    assert servers.ordered() == [
+        'http://c:4646', 'http://a:4646', 'http://b:4646']
+    time.sleep(0.06)
+    # a is due back, b's cooldown doubled
+    assert servers.ordered() == [
+        'http://a:4646', 'http://c:4646', 'http://b:4646']
+    servers.succeeded('http://b:4646')
+    assert servers.healthy('http://b:4646')
+
+
+def test_delay():
+    retry = Retry(backoff=0.1, max_backoff=0.3)
+    assert retry.delay(0) == 0
+    for round in range(1, 6):
+        assert 0 <= retry.delay(round) <= min(0.3, 0.1 * 2 ** (round - 1))
+
+
+def test_attempts():
+    http = std.HTTPClient('10.0.0.1', 4646)
+    http.servers.add(['10.0.0.2'])
+    assert http.attempts('GET') == [
+        ('http://10.0.0.1:4646', 0), ('http://10.0.0.2:4646', 0)]
+    http.retry = Retry(attempts=5)
+    attempts = http.attempts('GET')
+    assert [server for server, _ in attempts] == [
+        'http://10.0.0.1:4646', 'http://10.0.0.2:4646'] * 2 + [
+        'http://10.0.0.1:4646']
+    assert [delay for _, delay in attempts[:2]] == [0, 0]
+
+
+def test_retryable():
+    http = std.HTTPClient('10.0.0.1', 4646)
+    assert http.retryable('POST', sent=False)
+    assert not http.retryable('GET')
+    http.retry = Retry()
+    assert http.retryable('GET', status=503)
+    assert not http.retryable('GET', status=501)
+    assert not http.retryable('POST', status=503)
+
+
+def test_failover():
+    session = Session(down=['10.0.0.1'])
+    http = client(session, ['10.0.0.2'])
+    assert http.get(base.CB.json(), '/v1/jobs') == {}
+    assert [uri.split('/')[2] for uri in session.uris] == [
+        '10.0.0.1:4646', '10.0.0.2:4646']
+    # the next request goes straight to the healthy server
+    http.post(base.CB.json(), '/v1/jobs')
+    assert session.uris[-1].split('/')[2] == '10.0.0.2:4646'
+
+
+def test_all_down():
+    http = client(Session(down=['10.0.0']), ['10.0.0.2'])
+    with pytest.raises(requests.ConnectionError):
+        http.get(base.CB.json(), '/v1/jobs')
+
+
+def test_retry_status():
+    session = Session(codes=[503, 503, 200])
+    http = client(session, retry=Retry(backoff=0.001))
+    assert http.get(base.CB.json(), '/v1/jobs') == {}
+    assert len(session.uris) == 3
+
+
+def test_unsafe_methods_not_retried():
+    session = Session(codes=[503, 200])
+    http = client(session, retry=Retry(backoff=0.001))
+    with pytest.raises(base.NomadException):
+        http.post(base.CB.json(), '/v1/jobs')
+    assert len(session.uris) == 1
+
+
+def test_spread():
+    servers = Servers(['a', 'b', 'c'])
+    servers.observe('http://a:4646', 0.1)
+    servers.observe('http://b:4646', 0.001)
+    servers.observe('http://c:4646', 0.05)
+    firsts = set(servers.spread()[0] for _ in range(50))
+    # the slowest server never wins a choice between two
+    assert firsts == {'http://b:4646', 'http://c:4646'}
+    servers.failed('http://b:4646')
+    assert servers.spread()[-1] == 'http://b:4646'
+
+
+def test_observe():
+    servers = Servers(['a'], alpha=0.5)
+    servers.observe('http://a:4646', 1.0)
+    servers.observe('http://a:4646', 0.0)
+    assert servers.latency['http://a:4646'] == 0.5
+
+
+def test_query():
+    http = std.HTTPClient('10.0.0.1', 4646)
+    assert http.query('GET', {'prefix': 'a'}) == ({'prefix': 'a'}, False)
+    assert http.query('GET', {'stale': True}) == ({'stale': ''}, True)
+    http.stale = True
+    assert http.query('GET', None) == ({'stale': ''}, True)
+    assert http.query('GET', {'stale': False}) == ({}, False)
+    assert http.query('PUT', None) == (None, False)
+
+
+def test_stale_reads_spread():
+    session = Session()
+    http = client(session, ['10.0.0.2', '10.0.0.3'])
+    http.stale = True
+    for _ in range(30):
+        http.get(base.CB.json(), '/v1/jobs')
+    hosts = set(uri.split('/')[2] for uri in session.uris)
+    assert len(hosts) > 1
+    assert all(uri.endswith('?stale=') for uri in session.uris)
+    # consistent reads and writes stay on the first server
+    session.uris = []
+    http.get(base.CB.json(), '/v1/jobs', {'stale': False})
+    http.post(base.CB.json(), '/v1/jobs')
+    assert [uri.split('/')[2] for uri in session.uris] == ['10.0.0.1:4646'] * 2
@@ -0,0 +1,248 @@
+import itertools
+import json
+import threading
+import time
+
+import pytest
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib.parse import parse_qs, urlparse
+
+from nomad_alt.servers import Retry
+
+RETRY = Retry(attempts=3, backoff=0, max_backoff=0)
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Streams the next entry of the server's script to each request: frames,
+    seconds to pause for, and END to end the stream. A stream not ended is
+    held open, as a half open connection would be, until the client closes
+    it. The server's jobs are listed a page at a time from /v1/jobs, and
+    read from /v1/job/<id>.
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        url = urlparse(self.path)
+        if url.path == '/v1/jobs':
+            self.page(parse_qs(url.query))
+        elif url.path.startswith('/v1/job/'):
+            job = self.server.jobs.get(url.path.split('/')[-1])
+            if job is None:
+                self.respond(404, b'job not found', {})
+            else:
+                self.respond(200, json.dumps(job).encode('utf-8'), {})
+        else:
+            self.stream()
+
+    def page(self, query):
+        prefix = query.get('prefix', [''])[0]
+        ids = sorted(id for id in self.server.jobs if id.startswith(prefix))
+        start = query.get('next_token', [''])[0]
+        per_page = int(query.get('per_page', [len(ids)])[0])
+        ids = [id for id in ids if id >= start]
+        headers = {}
+        if len(ids) > per_page:
+            headers['X-Nomad-NextToken'] = ids[per_page]
+        self.respond(200, json.dumps(
+            [self.server.jobs[id] for id in ids[:per_page]]).encode('utf-8'),
+            headers)
+
+    def respond(self, code, body, headers):
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream(self):
+        script = self.server.script.pop(0) if self.server.script else []
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for entry in script:
+            if entry is END:
+                self.wfile.write(b'0\r\n\r\n')
+                return
+            if isinstance(entry, (int, float)):
+                time.sleep(entry)
+                continue
+            body = json.dumps(entry).encode('utf-8') + b'\n'
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(body), body))
+            self.wfile.flush()
+        # the client sends nothing more, so this returns once it has closed
+        # the connection
+        self.rfile.read(1)
+        self.server.closed.append(self.path)
+        self.close_connection = True
+
+
+END = object()
+
+
+class Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def server():
+    s = Server(('127.0.0.1', 0), Handler)
+    s.script = []
+    s.jobs = dict(('job-%d' % i, {'ID': 'job-%d' % i}) for i in range(5))
+    s.requests = []
+    s.closed = []
+    thread = threading.Thread(target=s.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield s
+    s.shutdown()
+    s.server_close()
+
+
+def frame(index, *keys):
+    return {'Index': index, 'Events': [{'Key': key} for key in keys]}
+
+
+class TestTornado(object):
+    def run(self, f):
+        from tornado import ioloop
+        loop = ioloop.IOLoop()
+        try:
+            return loop.run_sync(f, timeout=10)
+        finally:
+            loop.close(all_fds=True)
+
+    def test_follow_with_index(self, server):
+        from tornado import gen
+        import nomad_alt.tornado
+
+        # heartbeats for longer than a blocking query with the index could
+        # take, all over the one connection
+        server.script = [[frame(5, 'a')] + [0.1, {}] * 6 + [frame(6, 'b')]]
+
+        @gen.coroutine
+        def main():
+            n = nomad_alt.tornado.Nomad(port=server.server_address[1])
+            n.http.timeout = lambda params, default=None: (
+                0.3 if 'index' in params else default)
+            events = n.events.stream(index=5, heartbeat=5, retry=RETRY)
+            keys = []
+            for _ in range(2):
+                event = yield events.read()
+                keys.append(event['Key'])
+            raise gen.Return(keys)
+
+        assert self.run(main) == ['a', 'b']
+        assert len(server.requests) == 1
+        assert 'index=5' in server.requests[0]
+
+    def test_watchdog_closes_connection(self, server):
+        from tornado import gen
+        import nomad_alt.tornado
+
+        server.script = [[frame(5, 'a')], [frame(7, 'b')]]
+
+        @gen.coroutine
+        def main():
+            n = nomad_alt.tornado.Nomad(port=server.server_address[1])
+            events = n.events.stream(heartbeat=0.3, retry=RETRY)
+            keys = []
+            for _ in range(2):
+                event = yield events.read()
+                keys.append(event['Key'])
+            # the connection is closed by the client while it still runs
+            deadline = time.time() + 2
+            while not server.closed and time.time() < deadline:
+                yield gen.sleep(0.01)
+            raise gen.Return((keys, list(server.closed)))
+
+        keys, closed = self.run(main)
+        assert keys == ['a', 'b']
+        # the stream that went quiet was resumed past the last index, and
+        # its connection closed rather than left with the server
+        assert 'index=6' in server.requests[1]
+        assert closed == server.requests[:1]
+
+    def test_follow_ends(self, server):
+        from tornado import gen
+        import nomad_alt.tornado
+
+        server.script = [[frame(5, 'a'), END]] + [[END]] * 3
+
+        @gen.coroutine
+        def main():
+            n = nomad_alt.tornado.Nomad(port=server.server_address[1])
+            events = n.events.stream(retry=RETRY)
+            keys = []
+            event = yield events.read()
+            while event is not None:
+                keys.append(event['Key'])
+                event = yield events.read()
+            raise gen.Return(keys)
+
+        assert self.run(main) == ['a']
+        assert len(server.requests) == 3
+
+    def test_close_stops_follow(self, server):
+        from tornado import gen
+        import nomad_alt.tornado
+
+        server.script = [[frame(5, 'a')], [frame(7, 'b')]]
+
+        @gen.coroutine
+        def main():
+            n = nomad_alt.tornado.Nomad(port=server.server_address[1])
+            events = n.events.stream(heartbeat=5, retry=RETRY)
+            event = yield events.read()
+            events.close()
+            after = yield events.read()
+            # the connection is closed, and the stream not resumed
+            deadline = time.time() + 2
+            while not server.closed and time.time() < deadline:
+                yield gen.sleep(0.01)
+            yield gen.sleep(0.1)
+            raise gen.Return((event['Key'], after))
+
+        assert self.run(main) == ('a', None)
+        assert server.closed == server.requests
+        assert len(server.requests) == 1
+
+    def test_many_takes_calls_as_needed(self):
+        from tornado import gen
+        import nomad_alt.tornado
+
+        taken = []
+
+        def calls():
+            for i in itertools.count():
+                taken.append(i)
+                yield (i, None, '/v1/job/%d' % i, None)
+
+        @gen.coroutine
+        def main():
+            n = nomad_alt.tornado.Nomad()
+
+            @gen.coroutine
+            def chain(call):
+                yield gen.moment
+                raise gen.Return(call.id)
+            n.http.chain = chain
+            results = n.http.many(calls(), concurrency=2)
+            data = []
+            for _ in range(5):
+                result = yield results.read()
+                data.append(result.data)
+                yield gen.sleep(0.01)
+            raise gen.Return(data)
+
+        assert self.run(main) == [0, 1, 2, 3, 4]
+        # no more than twice concurrency calls beyond the Results read
+        assert len(taken) <= 5 + 4
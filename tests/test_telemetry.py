@@ -0,0 +1,317 @@
+import json
+import math
+import time
+
+import pytest
+
+from nomad_alt import std
+from nomad_alt.base import Response
+from nomad_alt.telemetry import Frame, Parser
+
+PROMETHEUS = '''\
+# HELP nomad_nomad_broker_total_ready nomad_nomad_broker_total_ready
+# TYPE nomad_nomad_broker_total_ready gauge
+nomad_nomad_broker_total_ready{host="server-1"} 3
+# TYPE nomad_client_allocs_cpu_total_ticks gauge
+nomad_client_allocs_cpu_total_ticks{alloc_id="a1",host="c1",task="web"} 1250.5
+nomad_client_allocs_cpu_total_ticks{task="db",alloc_id="a2",host="c1"} 10
+nomad_runtime_alloc_bytes 1.2e+07 1700000000000
+nomad_weird{path="C:\\\\tmp",quote="say \\"hi\\"",nl="a\\nb"} NaN
+nomad_upper{le="+Inf"} +Inf
+'''
+
+
+def test_prometheus():
+    frame = Parser().prometheus(PROMETHEUS.encode('utf-8'))
+    assert len(frame) == 6
+    assert frame.types['nomad_nomad_broker_total_ready'] == 'gauge'
+    assert frame.get('nomad_nomad_broker_total_ready',
+                     {'host': 'server-1'}) == 3
+    assert frame.get('nomad_runtime_alloc_bytes') == 1.2e7
+    ticks = frame.select('nomad_client_allocs_cpu_total_ticks')
+    assert [value for _, value in ticks] == [1250.5, 10]
+    # label sets are sorted by name whatever order they were written in
+    assert ticks[1][0] == (('alloc_id', 'a2'), ('host', 'c1'),
+                           ('task', 'db'))
+    labels = dict(frame.labels[4])
+    assert labels == {'path': 'C:\\tmp', 'quote': 'say "hi"', 'nl': 'a\nb'}
+    assert math.isnan(frame.values[4]) and frame.values[5] == float('inf')
+
+
+def test_shared_labels():
+    parser = Parser()
+    first = parser.prometheus(PROMETHEUS)
+    second = parser.prometheus(PROMETHEUS)
+    assert all(a is b for a, b in zip(first.names, second.names))
+    assert all(a is b for a, b in zip(first.labels, second.labels))
+    frame = parser.json({'Gauges': [
+        {'Name': 'nomad.broker', 'Value': 1, 'Labels': {'host': 'server-1'}},
+        {'Name': 'nomad.broker', 'Value': 2, 'Labels': {'host': 'server-1'}},
+    ]})
+    assert frame.labels[0] is frame.labels[1]
+
+
+def test_json():
+    frame = Parser().json({
+        'Timestamp': '2024-01-01 00:00:00 +0000 UTC',
+        'Gauges': [{'Name': 'nomad.runtime.num_goroutines', 'Value': 52,
+                    'Labels': {}}],
+        'Counters': [{'Name': 'nomad.rpc.request', 'Count': 4, 'Sum': 4,
+                      'Min': 1, 'Max': 1, 'Mean': 1, 'Labels': {}}],
+        'Samples': [{'Name': 'nomad.plan.evaluate', 'Count': 2, 'Sum': 3.5,
+                     'Min': 1.5, 'Max': 2, 'Mean': 1.75,
+                     'Labels': {'host': 's1'}}],
+        'Points': [],
+    })
+    assert len(frame) == 11
+    assert frame.get('nomad.runtime.num_goroutines') == 52
+    assert frame.get('nomad.rpc.request.count') == 4
+    assert frame.get('nomad.plan.evaluate.mean', {'host': 's1'}) == 1.75
+    assert frame.types['nomad.plan.evaluate.max'] == 'sample'
+
+
+class MetricsHTTPClient(std.HTTPClient):
+    def __init__(self, bodies):
+        super(MetricsHTTPClient, self).__init__('127.0.0.1', 4646)
+        self.bodies = bodies
+        self.requests = []
+
+    def _request(self, callback, method, path, params=None, data=None):
+        self.requests.append((path, dict(params or {})))
+        body = self.bodies.pop(0) if len(self.bodies) > 1 else self.bodies[0]
+        return callback(Response(200, {}, body))
+
+
+def nomad(*bodies):
+    n = std.Nomad()
+    n.http = MetricsHTTPClient(list(bodies))
+    return n
+
+
+def test_fetch():
+    n = nomad(PROMETHEUS, json.dumps({'Gauges': [
+        {'Name': 'nomad.runtime.num_goroutines', 'Value': 52}]}))
+    frame = n.metrics.fetch('prometheus')
+    assert isinstance(frame, Frame) and len(frame) == 6
+    assert n.http.requests[0] == ('/v1/metrics', {'format': 'prometheus'})
+    assert n.metrics.fetch()['Gauges'][0]['Value'] == 52
+    frame = n.metrics.fetch(columnar=True)
+    assert frame.get('nomad.runtime.num_goroutines') == 52
+
+
+def counter(value, alloc='a1'):
+    return 'ticks{alloc_id="%s"} %s\nready 3\n' % (alloc, value)
+
+
+def test_sampler():
+    pytest.importorskip('numpy')
+    from nomad_alt.telemetry import Sampler
+
+    agents = {'c1': nomad(counter(100), counter(110), counter(5),
+                          counter(25) + counter(1, 'a2')),
+              'c2': nomad('ready 7\n')}
+    sampler = Sampler(agents, size=3)
+    for t in (0, 10, 20):
+        sampler.record(dict(
+            (agent, n.metrics.fetch('prometheus', parser=sampler._parsers[agent]))
+            for agent, n in agents.items()), timestamp=t)
+    ticks, = sampler.select('ticks')
+    assert sampler.keys[ticks] == ('c1', 'ticks', (('alloc_id', 'a1'),))
+    assert sorted(sampler.keys[c] for c in sampler.select('ready')) == [
+        ('c1', 'ready', ()), ('c2', 'ready', ())]
+    assert list(sampler.deltas()[:, ticks]) == [10, -105]
+    # the drop from 110 to 5 is a counter reset, so 15 over 20 seconds
+    assert sampler.rates()[ticks] == (10 + 5) / 20.0
+    assert sampler.rates(counter=False)[ticks] == -95 / 20.0
+    assert sampler.rates(window=10)[ticks] == 5 / 10.0
+
+    # the buffer wraps around, a new series is added as a column
+    sampler.record({'c1': agents['c1'].metrics.fetch(
+        'prometheus', parser=sampler._parsers['c1'])}, timestamp=30)
+    times, values = sampler.values()
+    assert list(times) == [10, 20, 30]
+    a2, = sampler.select('ticks', alloc_id='a2')
+    assert list(values[:, ticks]) == [110, 5, 25]
+    assert math.isnan(values[0, a2]) and values[2, a2] == 1
+    assert math.isnan(sampler.rates()[a2])
+    c2, = sampler.select('ready', agent='c2')
+    assert math.isnan(sampler.latest()[c2])
+
+
+def test_sampler_scrapes():
+    pytest.importorskip('numpy')
+    from nomad_alt.telemetry import Sampler
+
+    n = nomad('ready 3\n')
+    sampler = Sampler(n, interval=0)
+    sampler.sample()
+    sampler.sample()
+    assert sampler.keys == [('127.0.0.1:4646', 'ready', ())]
+    assert list(sampler.latest()) == [3]
+    assert sampler.rates()[0] == 0
+
+
+def test_sampler_survives_failures(caplog):
+    pytest.importorskip('numpy')
+    from nomad_alt.telemetry import Sampler
+
+    sampler = Sampler(nomad('ready 3\n'), interval=0)
+    rounds = []
+    sample = sampler.sample
+
+    def flaky():
+        rounds.append(len(rounds))
+        if len(rounds) == 1:
+            raise RuntimeError('boom')
+        sample()
+        sampler.stop()
+    sampler.sample = flaky
+    sampler.run()
+    assert rounds == [0, 1]
+    assert list(sampler.latest()) == [3]
+    assert 'sampling the metrics failed' in caplog.text
+
+
+def test_rollup():
+    np = pytest.importorskip('numpy')
+    from nomad_alt.telemetry import rollup
+
+    codes = np.array([1, 0, 1, 1, 0, 2, 1])
+    values = np.array([4.0, 10.0, 1.0, 3.0, np.nan, np.nan, 2.0])
+    r = rollup(codes, values, ['a', 'b', 'c'])
+    assert r.groups == ['a', 'b']
+    assert list(r.count) == [1, 4]
+    assert list(r.p50) == [10.0, np.percentile([1, 2, 3, 4], 50)]
+    assert r.p95[1] == np.percentile([1, 2, 3, 4], 95)
+    assert list(r.max) == [10.0, 4.0]
+
+
+def allocation(id, node, job, group='web', status='running'):
+    return {'ID': id, 'NodeID': node, 'JobID': job, 'TaskGroup': group,
+            'Namespace': 'default', 'ClientStatus': status}
+
+
+def usage(cpu, rss):
+    return {'ResourceUsage': {
+        'CpuStats': {'Percent': cpu, 'TotalTicks': cpu * 10},
+        'MemoryStats': {'RSS': rss, 'Usage': rss}},
+        'Tasks': {'web': {}}, 'Timestamp': 1}
+
+
+class StatsHTTPClient(std.HTTPClient):
+    def __init__(self, allocations, stats):
+        super(StatsHTTPClient, self).__init__('127.0.0.1', 4646)
+        self.allocations = allocations
+        self.stats = stats
+        self.requests = []
+
+    def _request(self, callback, method, path, params=None, data=None):
+        self.requests.append((path, time.time()))
+        if path == '/v1/allocations':
+            body = self.allocations
+        else:
+            body = self.stats.get(path.split('/')[-2])
+        if body is None:
+            return callback(Response(404, {}, 'alloc not found'))
+        return callback(Response(200, {}, json.dumps(body)))
+
+
+def test_allocation_sampler():
+    pytest.importorskip('numpy')
+    from nomad_alt.exceptions import NotFound
+    from nomad_alt.telemetry import AllocationSampler
+
+    allocations = [allocation('a1', 'n1', 'web'),
+                   allocation('a2', 'n1', 'web'),
+                   allocation('a3', 'n2', 'web', 'api'),
+                   allocation('a4', 'n2', 'db'),
+                   allocation('a5', 'n3', 'db'),
+                   allocation('a6', 'n2', 'db', status='complete')]
+    n = std.Nomad()
+    n.http = StatsHTTPClient(allocations, {
+        'a1': usage(10, 100), 'a2': usage(20, 200), 'a3': usage(30, 300),
+        'a4': usage(80, 800)})
+    sampler = AllocationSampler(n, nodes=['n1', 'n2', 'n3'], node_rate=20)
+    sampler.sample()
+    assert sorted(sampler.keys) == ['a1', 'a2', 'a3', 'a4', 'a5']
+    assert list(sampler.errors) == ['a5']
+    assert isinstance(sampler.errors['a5'], NotFound)
+    # the allocation no longer running is not queried
+    stats = [(path, at) for path, at in n.http.requests
+             if path != '/v1/allocations']
+    assert len(stats) == 5
+    # a node's allocations are queried 1 / node_rate seconds apart
+    n1 = sorted(at for path, at in stats if '/a1/' in path or '/a2/' in path)
+    assert n1[1] - n1[0] >= 0.04
+
+    cpu = sampler.rollup('cpu_percent', by='job')
+    assert cpu.groups == [('default', 'web'), ('default', 'db')]
+    assert list(cpu.count) == [3, 1]
+    assert list(cpu.p50) == [20, 80] and list(cpu.max) == [30, 80]
+    memory = sampler.rollup('memory_rss', by='node')
+    assert dict(zip(memory.groups, memory.max)) == {
+        ('n1',): 200, ('n2',): 800}
+    groups = sampler.rollup(by='task_group').groups
+    assert ('default', 'web', 'api') in groups
+
+    # a second round, the mean over a window
+    n.http.stats['a1'] = usage(30, 100)
+    sampler.record(allocations[:1], {'a1': n.http.stats['a1']},
+                   timestamp=time.time() + 1)
+    a1 = sampler.columns['a1']
+    assert sampler.latest('cpu_percent')[a1] == 30
+    times, values = sampler.values('cpu_ticks')
+    assert list(values[:, a1]) == [100, 300]
+    cpu = sampler.rollup('cpu_percent', by='node', window=60)
+    assert dict(zip(cpu.groups, cpu.p50))[('n1',)] == 20
+    assert math.isnan(sampler.latest('cpu_percent')[sampler.columns['a2']])
+
+
+def test_allocation_sampler_given():
+    pytest.importorskip('numpy')
+    from nomad_alt.telemetry import AllocationSampler
+
+    n = std.Nomad()
+    n.http = StatsHTTPClient([], {'a1': usage(10, 100)})
+    sampler = AllocationSampler(n, [allocation('a1', 'n1', 'web')])
+    sampler.sample()
+    # stubs are sampled as given, with no list
+    assert [path for path, _ in n.http.requests] == [
+        '/v1/client/allocation/a1/stats']
+    assert list(sampler.latest('memory_usage')) == [100]
+    results = list(n.client.allocation_many(
+        ['a1', 'a2'], fields=['ResourceUsage.CpuStats.Percent']))
+    assert sorted(r.id for r in results) == ['a1', 'a2']
+    data = dict((r.id, r.data) for r in results)
+    assert data['a1'] == {'ResourceUsage': {'CpuStats': {'Percent': 10}}}
+
+
+def test_allocation_sampler_survives_failures(caplog):
+    pytest.importorskip('numpy')
+    import requests
+    from nomad_alt.telemetry import AllocationSampler
+
+    n = std.Nomad()
+    n.http = StatsHTTPClient([allocation('a1', 'n1', 'web')],
+                             {'a1': usage(10, 100)})
+    request = n.http._request
+
+    def flaky(callback, method, path, params=None, data=None):
+        if len(n.http.requests) == 0:
+            n.http.requests.append((path, time.time()))
+            raise requests.ConnectionError('agent unreachable')
+        return request(callback, method, path, params, data)
+    n.http._request = flaky
+    sampler = AllocationSampler(n, interval=0)
+    record = sampler.record
+
+    def recorded(*args, **kwargs):
+        record(*args, **kwargs)
+        sampler.stop()
+    sampler.record = recorded
+    # the first round fails to list the allocations, the second samples
+    sampler.run()
+    assert [path for path, _ in n.http.requests].count(
+        '/v1/allocations') == 2
+    assert list(sampler.latest('memory_usage')) == [100]
+    assert 'sampling the allocations failed' in caplog.text
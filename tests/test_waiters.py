@@ -0,0 +1,128 @@
+import json
+
+import pytest
+
+from nomad_alt import std
+from nomad_alt.base import Response
+from nomad_alt.exceptions import NotFound, Timeout
+
+
+class ScriptedHTTPClient(std.HTTPClient):
+    """
+    Answers each GET of a path with the next of the bodies scripted for it,
+    the last one over and over, at an index counting up, recording the
+    params of each request.
+    """
+    def __init__(self, script):
+        super(ScriptedHTTPClient, self).__init__('127.0.0.1', 4646)
+        self.script = dict((path, list(bodies))
+                           for path, bodies in script.items())
+        self.requests = []
+        self.index = 10
+
+    def _request(self, callback, method, path, params=None, data=None):
+        self.requests.append((path, dict(params or {})))
+        bodies = self.script.get(path)
+        if not bodies:
+            return callback(Response(404, {}, 'not found'))
+        body = bodies.pop(0) if len(bodies) > 1 else bodies[0]
+        self.index += 1
+        return callback(Response(
+            200, {'X-Nomad-Index': str(self.index)}, json.dumps(body)))
+
+
+def nomad(script):
+    n = std.Nomad()
+    n.http = ScriptedHTTPClient(script)
+    return n
+
+
+def evaluation(id, status, **fields):
+    fields.update(ID=id, Status=status)
+    return fields
+
+
+def test_wait_evaluation():
+    n = nomad({'/v1/evaluation/e1': [
+        evaluation('e1', 'pending'), evaluation('e1', 'pending'),
+        evaluation('e1', 'complete')]})
+    waited = n.evaluations.wait('e1')
+    assert waited.state['Status'] == 'complete'
+    assert waited.chain == ['e1']
+    assert waited.requests == 3
+    assert [status for _, _, status in waited.history] == [
+        'pending', 'complete']
+    # the first read does not block, the others from the index last seen
+    params = [params for _, params in n.http.requests]
+    assert params[0]['index'] == 0
+    assert params[1]['index'] == 11 and params[1]['wait'] == '60000ms'
+    assert params[2]['index'] == 12
+
+
+def test_wait_follows_chain():
+    n = nomad({
+        '/v1/evaluation/e1': [evaluation('e1', 'complete', BlockedEval='e2')],
+        '/v1/evaluation/e2': [evaluation('e2', 'blocked'),
+                              evaluation('e2', 'complete')],
+    })
+    waited = n.evaluations.wait('e1', timeout=10)
+    assert waited.chain == ['e1', 'e2']
+    assert waited.state['ID'] == 'e2'
+    assert [entry[1:] for entry in waited.history] == [
+        ('e1', 'complete'), ('e2', 'blocked'), ('e2', 'complete')]
+    assert n.evaluations.wait('e1', follow=False).chain == ['e1']
+
+
+def test_wait_returns_at_blocked_without_timeout():
+    n = nomad({
+        '/v1/evaluation/e1': [evaluation('e1', 'complete', BlockedEval='e2')],
+        '/v1/evaluation/e2': [evaluation('e2', 'blocked')],
+    })
+    # the cluster may never have room, so the wait does not block on it
+    waited = n.evaluations.wait('e1')
+    assert waited.chain == ['e1', 'e2']
+    assert waited.state['Status'] == 'blocked'
+    assert len(n.http.requests) == 2
+
+    n = nomad({'/v1/evaluations': [
+        [evaluation('e1', 'complete', BlockedEval='e2'),
+         evaluation('e2', 'blocked')]]})
+    results = n.evaluations.wait_many(['e1'])
+    assert results[0].data.state['Status'] == 'blocked'
+    assert len(n.http.requests) == 1
+
+
+def test_wait_timeout():
+    n = nomad({'/v1/deployment/d1': [{'ID': 'd1', 'Status': 'running'}]})
+    with pytest.raises(Timeout):
+        n.deployments.wait('d1', timeout=0.05)
+    # blocking queries never outlast the deadline
+    assert all(params.get('wait', '0ms') == '100ms'
+               for _, params in n.http.requests)
+    with pytest.raises(NotFound):
+        n.deployments.wait('missing')
+
+
+def test_wait_many():
+    running = {'ID': 'd1', 'Status': 'running'}
+    n = nomad({'/v1/deployments': [
+        [running, {'ID': 'd2', 'Status': 'paused'}],
+        [running, {'ID': 'd2', 'Status': 'successful'}],
+        [{'ID': 'd1', 'Status': 'failed'},
+         {'ID': 'd2', 'Status': 'successful'}],
+    ]})
+    results = n.deployments.wait_many(['d2', 'd1', 'missing'])
+    assert [r.id for r in results] == ['d2', 'd1', 'missing']
+    assert results[0].data.state['Status'] == 'successful'
+    assert results[0].data.history[0][2] == 'paused'
+    assert results[1].data.state['Status'] == 'failed'
+    assert isinstance(results[2].error, NotFound)
+    # one request in flight however many deployments are waited on
+    assert [path for path, _ in n.http.requests] == ['/v1/deployments'] * 3
+
+    n = nomad({'/v1/evaluations': [
+        [evaluation('e1', 'complete', NextEval='e2'),
+         evaluation('e2', 'pending')]]})
+    results = n.evaluations.wait_many(['e1'], timeout=0.05)
+    assert isinstance(results[0].error, Timeout)
+    assert 'e2' in str(results[0].error)